@@ -0,0 +1,78 @@
+"""
+API диагностики работающего сервиса: профилирование и выполняющиеся корутины
+"""
+
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.services.profiler import ProfilerBusy, describe_tasks, describe_threads, sampling_profiler
+from app.services.task_service import task_service
+
+logger = logging.getLogger("speech_service.api")
+router = APIRouter()
+
+
+def check_debug_token(token: Optional[str]) -> None:
+    """Эндпоинты доступны только с DEBUG_TOKEN; без настройки их как будто нет"""
+    if not settings.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), settings.DEBUG_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Неверный или отсутствующий X-Debug-Token")
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(default=10.0, gt=0, description="Длительность профилирования"),
+    interval_ms: Optional[float] = Query(
+        default=None, ge=1.0, le=1000.0, description="Период выборки (по умолчанию DEBUG_PROFILE_INTERVAL_MS)"
+    ),
+    debug_token: Optional[str] = Header(default=None, alias="X-Debug-Token")
+):
+    """
+    Профилирует все потоки процесса seconds секунд
+
+    Ответ — свернутые стеки (flamegraph.pl, speedscope, inferno): строка
+    "поток;функция;...;функция число_выборок". Корень стека — event-loop
+    или имя потока (потоки одного пула объединены).
+    """
+    check_debug_token(debug_token)
+    if seconds > settings.DEBUG_PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не дольше {settings.DEBUG_PROFILE_MAX_SECONDS:g} сек (DEBUG_PROFILE_MAX_SECONDS)"
+        )
+    interval = (interval_ms or settings.DEBUG_PROFILE_INTERVAL_MS) / 1000
+    logger.info(f"Профилирование {seconds:g} сек, период {interval * 1000:g} мс")
+    try:
+        result = await sampling_profiler.profile(seconds, interval)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": str(int(seconds))})
+    return PlainTextResponse(
+        result.collapsed(),
+        headers={
+            "X-Profile-Samples": str(result.samples),
+            "X-Profile-Seconds": f"{result.seconds:.3f}",
+            "X-Profile-Overhead-Seconds": f"{result.overhead:.3f}",
+        }
+    )
+
+
+@router.get("/tasks")
+async def tasks(debug_token: Optional[str] = Header(default=None, alias="X-Debug-Token")):
+    """
+    Выполняющиеся корутины и этап, на котором находится каждая
+
+    Для задач распознавания добавляются ID, клиент, полоса и время обработки;
+    threads — где сейчас находится каждый поток (пул исполнителей и другие).
+    """
+    check_debug_token(debug_token)
+    return {
+        "scheduler": task_service.scheduler.stats(),
+        "coroutines": describe_tasks(task_service.scheduler.running),
+        "threads": describe_threads(),
+    }
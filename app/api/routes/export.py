@@ -0,0 +1,75 @@
+"""
+API выгрузки готовых транскриптов за период
+"""
+
+import hmac
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.api.routes.transcribe import get_tenant
+from app.core.config import settings
+from app.services.export_sink import export_sink
+from app.services.rate_limiter import rate_limiter
+
+logger = logging.getLogger("speech_service.api")
+router = APIRouter()
+
+
+@router.get("/export")
+async def export_transcripts(
+    request: Request,
+    since: datetime = Query(..., description="Начало периода по времени завершения (ISO 8601 или unix-время)"),
+    until: Optional[datetime] = Query(None, description="Конец периода, не включительно (по умолчанию — сейчас)"),
+    client_id: Optional[str] = Query(None, description="Только задачи клиента (без API-ключей)"),
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key"),
+    export_token: Optional[str] = Header(default=None, alias="X-Export-Token")
+):
+    """
+    Выгружает завершенные задачи за период одним потоком NDJSON
+
+    Строка — задача: ID, язык, длительность, времена, текст и фрагменты со словами.
+    При настроенных API-ключах клиент получает только свои задачи; без
+    ключей задачи всех клиентов выгружаются только с EXPORT_TOKEN.
+    """
+    if not export_sink.enabled:
+        raise HTTPException(status_code=404, detail="Выгрузка отключена (EXPORT_ENABLED)")
+
+    tenant = get_tenant(request, api_key)
+    if rate_limiter.requires_key:
+        client_id = tenant.name
+    elif client_id is None:
+        check_export_token(export_token)
+
+    start = _timestamp(since)
+    end = _timestamp(until) if until else time.time()
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Начало периода должно быть раньше конца")
+
+    # В выгрузку попадают и задачи, еще не записанные фоновой пачкой
+    await export_sink.flush_for_export(start, end)
+    logger.info(f"Выгрузка транскриптов за {start:.0f}–{end:.0f} для {tenant.name}")
+
+    return StreamingResponse(
+        export_sink.iter_range(start, end, client_id),
+        media_type="application/x-ndjson"
+    )
+
+
+def check_export_token(token: Optional[str]) -> None:
+    """Выгрузка без client_id при отключенных API-ключах — только с EXPORT_TOKEN"""
+    if not settings.EXPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="Укажите client_id: выгрузка всех клиентов требует EXPORT_TOKEN")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), settings.EXPORT_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Неверный или отсутствующий X-Export-Token")
+
+
+def _timestamp(value: datetime) -> float:
+    """unix-время (время без зоны считается UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
@@ -3,26 +3,39 @@ API роуты для распознавания речи
 """
 
 import os
+import json
+import hashlib
 import logging
 from pathlib import Path
-from typing import Optional
+from functools import partial
+from typing import Awaitable, Callable, Optional, Tuple
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from app.models.schemas import (
     TranscribeResponse, 
     TaskStatusResponse, 
     ErrorResponse,
     Language,
-    TaskStatus
+    Priority,
+    TaskStatus,
+    TranscribeUrlRequest,
+    TranscriptFormat
 )
-from app.services.task_service import task_service
+from app.services.rate_limiter import RateLimitExceeded, Tenant, rate_limiter
+from app.services.remote_source import RemoteSourceError
+from app.services.scheduler import AdmissionRejected
+from app.services.task_service import DuplicateRequest, IdempotencyConflict, ServiceDraining, task_service
+from app.services.transcript_renderers import RENDERERS
+from app.services.transcript_store import transcript_store, parse_range_header
 from app.core.config import settings
 
 logger = logging.getLogger("speech_service.api")
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 def validate_file(file: UploadFile) -> None:
     """Валидация загружаемого файла"""
@@ -43,58 +56,408 @@ def validate_file(file: UploadFile) -> None:
         )
 
 
+def get_tenant(request: Request, api_key: Optional[str]) -> Tenant:
+    """Определяет клиента по API-ключу (или по адресу, если ключи не настроены)"""
+    host = request.client.host if request.client else "unknown"
+    tenant = rate_limiter.resolve(api_key, host)
+    if tenant is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Неверный или отсутствующий API-ключ",
+            headers={"WWW-Authenticate": "ApiKey"}
+        )
+    return tenant
+
+
+async def admit_request(
+    request: Request,
+    response: Response,
+    api_key: Optional[str],
+    priority: Optional[Priority]
+) -> Tuple[Tenant, Priority]:
+    """
+    Проверяет ключ, полосу приоритета и лимиты клиента до разбора файла
+    
+    Returns:
+        Клиент и выбранная полоса приоритета
+    """
+    tenant = get_tenant(request, api_key)
+    priority = priority or tenant.priority
+    if not tenant.allows(priority):
+        raise HTTPException(
+            status_code=403,
+            detail=f"Полоса {priority.value} недоступна, максимальная: {tenant.max_priority.value}"
+        )
+    try:
+        response.headers.update(await rate_limiter.check_request(tenant))
+    except RateLimitExceeded as e:
+        logger.warning(f"Клиент {tenant.name}: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
+    return tenant, priority
+
+
+class Submission:
+    """Ресурсы, занятые запросом на создание задачи до ее создания"""
+    
+    def __init__(self, tenant: Tenant):
+        self.tenant = tenant
+        self.file_path: Optional[str] = None
+        self.charged = 0.0
+        self.task_id: Optional[str] = None
+        
+    async def close(self) -> None:
+        """Задача не создана: возвращаем место и квоту, удаляем файл"""
+        if self.task_id is not None:
+            return
+        await rate_limiter.release(self.tenant.name)
+        if self.charged:
+            await rate_limiter.refund_audio(self.tenant, self.charged)
+        if self.file_path and os.path.exists(self.file_path):
+            os.unlink(self.file_path)
+
+
+async def enqueue_task(
+    submission: Submission,
+    response: Response,
+    source_name: str,
+    language: str,
+    trim_silence: bool,
+    split_channels: bool,
+    priority: Priority,
+    audio_duration: float,
+    fingerprint: str,
+    idempotency_key: Optional[str],
+    source_url: Optional[str] = None,
+    content_hash: Optional[str] = None
+) -> TranscribeResponse:
+    """
+    Списывает квоту и создает задачу (или присоединяет к такой же)
+    
+    Args:
+        submission: Ресурсы запроса (файл в UPLOAD_DIR или путь для загрузки по ссылке)
+        response: Ответ (для заголовков)
+        source_name: Имя файла или ссылка (для логов)
+        language: Язык распознавания
+        trim_silence: Вырезать тишину
+        split_channels: Распознавать каналы раздельно
+        priority: Полоса приоритета
+        audio_duration: Длительность аудио в секундах
+        fingerprint: Отпечаток содержимого и параметров
+        idempotency_key: Ключ идемпотентности
+        source_url: Ссылка, если файл будет загружен при обработке
+        content_hash: Хеш содержимого файла (ключ кэша конвертации)
+        
+    Returns:
+        Ответ API
+    """
+    tenant = submission.tenant
+    try:
+        await rate_limiter.charge_audio(tenant, audio_duration)
+    except RateLimitExceeded as e:
+        logger.warning(f"Клиент {tenant.name}: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
+    submission.charged = audio_duration
+    
+    try:
+        task_id = task_service.create_task(
+            submission.file_path,
+            language,
+            trim_silence=trim_silence,
+            split_channels=split_channels,
+            client_id=tenant.name,
+            audio_duration=audio_duration,
+            priority=priority,
+            rate_limited=rate_limiter.enabled,
+            fingerprint=fingerprint,
+            idempotency_key=idempotency_key,
+            source_url=source_url,
+            content_hash=content_hash
+        )
+    except DuplicateRequest as e:
+        return replay_response(e.task_id, response)
+    except AdmissionRejected as e:
+        logger.warning(f"Задача для {source_name} отклонена: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ServiceDraining as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    submission.task_id = task_id
+    
+    task = task_service.get_task_status(task_id)
+    if task.leader_id:
+        # Распознается файл задачи, с которой объединили: копия не нужна, квота не списывается
+        if os.path.exists(submission.file_path):
+            os.unlink(submission.file_path)
+        await rate_limiter.refund_audio(tenant, audio_duration)
+        logger.info(f"Задача {task_id} для {source_name} объединена с {task.leader_id}")
+        return TranscribeResponse(
+            task_id=task_id,
+            status=task.status,
+            message="Такой же файл уже обрабатывается, задача получит его результат"
+        )
+    
+    logger.info(f"Создана задача распознавания {task_id} для {source_name}")
+    
+    return TranscribeResponse(
+        task_id=task_id,
+        status=TaskStatus.PENDING,
+        message="Задача создана и поставлена в очередь на обработку"
+    )
+
+
 @router.post("/transcribe", response_model=TranscribeResponse)
 async def transcribe_audio(
+    request: Request,
+    response: Response,
     file: UploadFile = File(..., description="Аудиофайл для распознавания"),
-    language: Language = Form(default=Language.RU, description="Язык аудио")
+    language: Language = Form(default=Language.RU, description="Язык аудио"),
+    trim_silence: Optional[bool] = Form(
+        default=None,
+        description="Вырезать тишину перед отправкой (по умолчанию VAD_ENABLED)"
+    ),
+    split_channels: bool = Form(
+        default=False,
+        description="Распознать каналы стерео-записи раздельно и собрать диалог"
+    ),
+    priority: Optional[Priority] = Form(
+        default=None,
+        description="Полоса приоритета: realtime, interactive или bulk (по умолчанию — из настроек ключа)"
+    ),
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key"),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
 ):
     """
     Загружает аудиофайл и создает задачу на распознавание речи
+    
+    Повтор запроса с тем же Idempotency-Key возвращает уже созданную задачу.
+    Одинаковые файлы с одинаковыми параметрами, пока первый обрабатывается,
+    получают свои ID задач, но распознаются один раз.
     """
+    tenant, priority = await admit_request(request, response, api_key, priority)
+    submission = Submission(tenant)
     try:
         # Валидируем файл
         validate_file(file)
         
         # Сохраняем файл
-        file_path = await save_uploaded_file(file)
+        submission.file_path, content_hash = await save_uploaded_file(file)
         
-        # Создаем задачу
-        task_id = task_service.create_task(file_path, language.value)
+        if trim_silence is None:
+            trim_silence = settings.VAD_ENABLED
+        fingerprint = task_service.fingerprint(content_hash, language.value, trim_silence, split_channels)
         
-        logger.info(f"Создана задача распознавания {task_id} для файла {file.filename}")
+        # Повтор по Idempotency-Key: не тратим время на разбор файла
+        if idempotency_key:
+            existing = task_service.find_idempotent(tenant.name, idempotency_key, fingerprint)
+            if existing:
+                return replay_response(existing, response)
         
-        return TranscribeResponse(
-            task_id=task_id,
-            status=TaskStatus.PENDING,
-            message="Задача создана и поставлена в очередь на обработку"
+        # Длительность аудио — стоимость задачи для планировщика и квоты
+        audio_duration = await task_service.probe_duration(submission.file_path)
+        
+        return await enqueue_task(
+            submission,
+            response,
+            f"файла {file.filename}",
+            language.value,
+            trim_silence,
+            split_channels,
+            priority,
+            audio_duration,
+            fingerprint,
+            idempotency_key,
+            content_hash=content_hash
         )
         
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка создания задачи: {e}")
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
+    finally:
+        await submission.close()
+
+
+@router.post("/transcribe/url", response_model=TranscribeResponse)
+async def transcribe_url(
+    body: TranscribeUrlRequest,
+    request: Request,
+    response: Response,
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key"),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
+    """
+    Создает задачу для файла по ссылке (HTTP(S) или s3://)
+    
+    Сейчас читается только начало файла (размер, формат, длительность);
+    сам файл при обработке задачи потоком передается в конвертацию.
+    """
+    tenant, priority = await admit_request(request, response, api_key, body.priority)
+    submission = Submission(tenant)
+    try:
+        try:
+            remote = await task_service.probe_remote(body.url)
+        except RemoteSourceError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        trim_silence = settings.VAD_ENABLED if body.trim_silence is None else body.trim_silence
+        fingerprint = task_service.fingerprint(
+            remote.content_id, body.language.value, trim_silence, body.split_channels
+        )
+        
+        if idempotency_key:
+            existing = task_service.find_idempotent(tenant.name, idempotency_key, fingerprint)
+            if existing:
+                return replay_response(existing, response)
+        
+        # Сюда файл будет декодирован при обработке задачи
+        submission.file_path = str(new_upload_path(".wav"))
+        
+        return await enqueue_task(
+            submission,
+            response,
+            f"ссылки {body.url}",
+            body.language.value,
+            trim_silence,
+            body.split_channels,
+            priority,
+            remote.duration,
+            fingerprint,
+            idempotency_key,
+            source_url=remote.url,
+            # Без ETag содержимое по ссылке может измениться при том же размере: в кэш не попадает
+            content_hash=remote.content_id if remote.etag else None
+        )
+        
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка создания задачи по ссылке: {e}")
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
+    finally:
+        await submission.close()
+
+
+@router.get("/transcribe/follow")
+async def follow_recording(
+    request: Request,
+    response: Response,
+    path: str = Query(..., description="Файл записи относительно FOLLOW_DIR"),
+    language: Language = Query(default=Language.RU, description="Язык аудио"),
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key")
+):
+    """
+    Распознает файл, который еще записывается, по репликам (NDJSON)
+
+    Каждая строка ответа — фрагмент, распознанный сразу после закрытия
+    реплики; ответ заканчивается вместе с записью. Задача не создается:
+    запрос занимает место клиента, пока идет запись, а квота списывается
+    по мере распознавания.
+    """
+    if not settings.FOLLOW_DIR:
+        raise HTTPException(status_code=404, detail="Распознавание записываемых файлов выключено")
+    root = os.path.realpath(settings.FOLLOW_DIR)
+    audio_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, audio_path]) != root:
+        raise HTTPException(status_code=400, detail="Файл вне папки записей")
+    if not os.path.isfile(audio_path):
+        raise HTTPException(status_code=404, detail="Файл записи не найден")
+
+    tenant, _ = await admit_request(request, response, api_key, None)
+
+    async def stream():
+        from app.speechkit.tail import follow_file
+
+        charged = 0.0
+        try:
+            client = task_service.speech_service.client
+            async for transcript in follow_file(client, audio_path, language.value):
+                for segment in transcript:
+                    yield (json.dumps(segment.to_dict(), ensure_ascii=False) + "\n").encode("utf-8")
+                # Квота — по длительности записи до конца распознанной реплики
+                end = max((segment.end for segment in transcript), default=charged)
+                if end > charged:
+                    await rate_limiter.charge_audio(tenant, end - charged)
+                    charged = end
+        except RateLimitExceeded as e:
+            logger.warning(f"Клиент {tenant.name}: {e}")
+            yield (json.dumps({"error": str(e)}, ensure_ascii=False) + "\n").encode("utf-8")
+        except Exception as e:
+            logger.error(f"Ошибка распознавания записи {audio_path}: {e}")
+            yield (json.dumps({"error": str(e)}, ensure_ascii=False) + "\n").encode("utf-8")
+
+    logger.info(f"Клиент {tenant.name}: распознавание записи {audio_path}")
+    # Заголовки лимитов из admit_request: ответ создается здесь, а не из response
+    headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return ReleasingStreamingResponse(
+        stream(), partial(rate_limiter.release, tenant.name), media_type="application/x-ndjson", headers=headers
+    )
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    Потоковый ответ, который освобождает место клиента при любом завершении
+
+    finally генератора не выполняется, если ответ так и не начался (клиент
+    отключился до тела, ошибка отправки заголовков), а фоновая задача
+    ответа при отключении клиента не запускается.
+    """
+
+    def __init__(self, content, release: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                # Останавливает и генератор, прерванный на середине (follow_file)
+                await self.body_iterator.aclose()
+            finally:
+                await self.release()
+
+
+def replay_response(task_id: str, response: Response) -> TranscribeResponse:
+    """Ответ на повтор запроса с тем же Idempotency-Key"""
+    task = task_service.get_task_status(task_id)
+    response.headers["Idempotent-Replayed"] = "true"
+    return TranscribeResponse(
+        task_id=task_id,
+        status=task.status,
+        message="Задача уже создана по этому Idempotency-Key"
+    )
 
 
 @router.get("/transcribe/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str):
+async def get_task_status(
+    task_id: str,
+    format: Optional[TranscriptFormat] = Query(
+        default=None,
+        description="Выгрузить результат в формате text/srt/vtt/json вместо статуса"
+    )
+):
     """
-    Получает статус задачи распознавания
+    Получает статус задачи распознавания или ее результат в нужном формате
     """
     try:
-        task = task_service.get_task_status(task_id)
+        if format is not None:
+            return render_transcript(task_id, format)
         
-        if not task:
+        payload = task_service.get_status_payload(task_id)
+        
+        if payload is None:
             raise HTTPException(status_code=404, detail="Задача не найдена")
         
-        return TaskStatusResponse(
-            task_id=task["id"],
-            status=task["status"],
-            created_at=task["created_at"],
-            completed_at=task["completed_at"],
-            result=task["result"],
-            error=task["error"]
-        )
+        # Ответ уже сериализован в формате TaskStatusResponse
+        return Response(content=payload, media_type="application/json")
         
     except HTTPException:
         raise
@@ -103,6 +466,108 @@ async def get_task_status(task_id: str):
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
+def render_transcript(task_id: str, transcript_format: TranscriptFormat) -> StreamingResponse:
+    """
+    Отдает результат задачи потоково в запрошенном формате
+    
+    Args:
+        task_id: ID задачи
+        transcript_format: Формат выгрузки
+        
+    Returns:
+        Потоковый ответ с транскриптом
+    """
+    task = get_completed_task(task_id)
+    
+    renderer, media_type, extension = RENDERERS[transcript_format]
+    return StreamingResponse(
+        renderer(task_id, task.iter_segments()),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{task_id}.{extension}"'}
+    )
+
+
+def get_completed_task(task_id: str):
+    """Возвращает завершенную задачу или HTTP-ошибку"""
+    task = task_service.get_task_status(task_id)
+    
+    if not task:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if task.status != TaskStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Результат недоступен, статус задачи: {task.status.value}")
+    return task
+
+
+@router.get("/transcribe/{task_id}/text")
+async def get_transcript_text(task_id: str, range_header: Optional[str] = Header(default=None, alias="Range")):
+    """
+    Отдает текст транскрипта (одна фраза на строку) с поддержкой HTTP Range
+    """
+    get_completed_task(task_id)
+    
+    size = transcript_store.text_size(task_id)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{task_id}.txt"'
+    }
+    
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        raise HTTPException(
+            status_code=416,
+            detail="Запрошенный диапазон недоступен",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    return StreamingResponse(
+        transcript_store.iter_text_range(task_id, start, end),
+        status_code=status_code,
+        media_type="text/plain; charset=utf-8",
+        headers=headers
+    )
+
+
+@router.get("/transcribe/{task_id}/segments")
+async def get_transcript_segments(
+    task_id: str,
+    offset: int = Query(default=0, ge=0, description="Номер первого фрагмента"),
+    limit: int = Query(default=100, ge=1, le=1000, description="Количество фрагментов")
+):
+    """
+    Постраничная выдача фрагментов транскрипта по индексу
+    """
+    get_completed_task(task_id)
+    
+    total = transcript_store.count(task_id)
+    
+    def page():
+        yield f'{{"task_id":"{task_id}","total":{total},"offset":{offset},"segments":['.encode("utf-8")
+        separator = b""
+        for raw in transcript_store.iter_segments_raw(task_id, offset, offset + limit):
+            yield separator + raw
+            separator = b","
+        yield b"]}"
+    
+    return StreamingResponse(page(), media_type="application/json")
+
+
+@router.get("/queue")
+async def get_queue_stats():
+    """
+    Состояние очереди задач: число задач, секунды аудио, оценка ожидания
+    """
+    return task_service.scheduler.stats()
+
+
 @router.get("/tasks")
 async def get_all_tasks():
     """
@@ -110,38 +575,44 @@ async def get_all_tasks():
     """
     try:
         tasks = task_service.get_all_tasks()
-        return {"tasks": list(tasks.values())}
+        return {"tasks": [task.to_dict() for task in tasks.values()]}
         
     except Exception as e:
         logger.error(f"Ошибка получения списка задач: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
-async def save_uploaded_file(file: UploadFile) -> str:
+def new_upload_path(extension: str) -> Path:
+    """Уникальный путь для файла в UPLOAD_DIR"""
+    import uuid
+    from datetime import datetime
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    unique_id = str(uuid.uuid4())[:8]
+    return Path(settings.UPLOAD_DIR) / f"{timestamp}_{unique_id}{extension}"
+
+
+async def save_uploaded_file(file: UploadFile) -> Tuple[str, str]:
     """
-    Сохраняет загруженный файл
+    Сохраняет загруженный файл, попутно считая хеш содержимого
     
     Args:
         file: Загруженный файл
         
     Returns:
-        Путь к сохраненному файлу
+        Путь к сохраненному файлу и SHA-256 содержимого
     """
-    # Создаем уникальное имя файла
-    import uuid
-    from datetime import datetime
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]
-    file_ext = Path(file.filename).suffix
-    
-    filename = f"{timestamp}_{unique_id}{file_ext}"
-    file_path = Path(settings.UPLOAD_DIR) / filename
+    file_path = new_upload_path(Path(file.filename).suffix)
     
-    # Сохраняем файл
+    # Сохраняем файл по частям
+    digest = hashlib.sha256()
     with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            buffer.write(chunk)
     
     logger.info(f"Файл сохранен: {file_path}")
-    return str(file_path)
\ No newline at end of file
+    return str(file_path), digest.hexdigest()
@@ -0,0 +1,231 @@
+"""
+API возобновляемой загрузки больших файлов частями
+
+    POST   /uploads                  — создать загрузку (ответ: Location и смещение 0)
+    PATCH  /uploads/{id}             — дописать часть с Upload-Offset
+    HEAD   /uploads/{id}             — узнать принятое смещение после обрыва
+    POST   /uploads/{id}/finalize    — проверить файл и создать задачу распознавания
+    DELETE /uploads/{id}             — отменить загрузку
+
+Заголовки Upload-Offset, Upload-Length и Upload-Checksum совместимы с tus.
+"""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import Response
+from starlette.requests import ClientDisconnect
+
+from app.api.routes.transcribe import (
+    Submission, admit_request, enqueue_task, get_tenant, new_upload_path, replay_response
+)
+from app.models.schemas import Priority, TranscribeResponse, UploadCreateRequest, UploadStatusResponse
+from app.services.resumable_upload import ResumableUpload, UploadError, resumable_uploads
+from app.services.task_service import IdempotencyConflict, task_service
+from app.core.config import settings
+
+logger = logging.getLogger("speech_service.api")
+router = APIRouter()
+
+
+def status_response(upload: ResumableUpload) -> UploadStatusResponse:
+    return UploadStatusResponse(
+        upload_id=upload.id,
+        offset=upload.offset,
+        size=upload.size,
+        chunk_size=settings.UPLOAD_CHUNK_MAX_BYTES,
+        expires_at=datetime.fromtimestamp(upload.expires_at)
+    )
+
+
+def offset_headers(upload: ResumableUpload) -> dict:
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.size),
+        "Cache-Control": "no-store"
+    }
+
+
+def get_upload(request: Request, upload_id: str, api_key: Optional[str]) -> ResumableUpload:
+    """Загрузка клиента или 404"""
+    tenant = get_tenant(request, api_key)
+    upload = resumable_uploads.get(upload_id, tenant.name)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Загрузка не найдена или истек срок ее хранения")
+    return upload
+
+
+@router.post("/uploads", response_model=UploadStatusResponse, status_code=201)
+async def create_upload(
+    body: UploadCreateRequest,
+    request: Request,
+    response: Response,
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key")
+):
+    """
+    Создает возобновляемую загрузку
+
+    Файл затем передается частями PATCH-запросами (не больше chunk_size
+    байт каждая). Параметры распознавания задаются сейчас и используются
+    при завершении загрузки.
+    """
+    tenant = get_tenant(request, api_key)
+    extension = Path(body.filename).suffix.lower()
+    if extension not in settings.ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неподдерживаемый формат файла. Поддерживаются: {', '.join(settings.ALLOWED_EXTENSIONS)}"
+        )
+    try:
+        upload = resumable_uploads.create(
+            tenant.name,
+            Path(body.filename).name,
+            body.size,
+            body.sha256,
+            {
+                "language": body.language.value,
+                "trim_silence": body.trim_silence,
+                "split_channels": body.split_channels,
+                "priority": body.priority.value if body.priority else None,
+            }
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+    response.headers["Location"] = str(request.url_for("upload_status", upload_id=upload.id))
+    response.headers.update(offset_headers(upload))
+    return status_response(upload)
+
+
+@router.head("/uploads/{upload_id}", name="upload_offset")
+async def upload_offset(
+    upload_id: str,
+    request: Request,
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key")
+):
+    """Принятое смещение: с него клиент продолжает после обрыва"""
+    upload = get_upload(request, upload_id, api_key)
+    return Response(status_code=200, headers=offset_headers(upload))
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatusResponse, name="upload_status")
+async def upload_status(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key")
+):
+    """Состояние загрузки"""
+    upload = get_upload(request, upload_id, api_key)
+    response.headers.update(offset_headers(upload))
+    return status_response(upload)
+
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    upload_checksum: Optional[str] = Header(default=None, alias="Upload-Checksum"),
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key")
+):
+    """
+    Дописывает часть файла
+
+    Часть должна начинаться с принятого смещения (иначе 409 с текущим
+    смещением в Upload-Offset). С заголовком Upload-Checksum: sha256 <base64>
+    часть принимается только целиком и при совпадении суммы (иначе 460);
+    без него при обрыве сохраняются уже принятые байты.
+    """
+    upload = get_upload(request, upload_id, api_key)
+    try:
+        await resumable_uploads.append(upload, upload_offset, request.stream(), upload_checksum)
+    except ClientDisconnect:
+        # Ответ уже некому отправить: клиент узнает принятое смещение через HEAD
+        logger.info(f"Обрыв при загрузке части {upload_id}, принято {upload.offset} из {upload.size} байт")
+        return Response(status_code=204, headers=offset_headers(upload))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e), headers=offset_headers(upload))
+    return Response(status_code=204, headers=offset_headers(upload))
+
+
+@router.post("/uploads/{upload_id}/finalize", response_model=TranscribeResponse)
+async def finalize_upload(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key"),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
+    """
+    Завершает загрузку и создает задачу распознавания
+
+    Проверяет, что файл получен целиком и совпадает с SHA-256, указанным
+    при создании. Если задачу создать не удалось (лимиты, очередь),
+    загрузка сохраняется и завершение можно повторить.
+    """
+    upload = get_upload(request, upload_id, api_key)
+    params = upload.params
+    tenant, priority = await admit_request(
+        request, response, api_key, Priority(params["priority"]) if params["priority"] else None
+    )
+    submission = Submission(tenant)
+    try:
+        try:
+            submission.file_path, content_hash = await resumable_uploads.complete(upload, new_upload_path(""))
+        except UploadError as e:
+            raise HTTPException(status_code=e.status, detail=str(e))
+
+        trim_silence = settings.VAD_ENABLED if params["trim_silence"] is None else params["trim_silence"]
+        fingerprint = task_service.fingerprint(
+            content_hash, params["language"], trim_silence, params["split_channels"]
+        )
+
+        if idempotency_key:
+            existing = task_service.find_idempotent(tenant.name, idempotency_key, fingerprint)
+            if existing:
+                resumable_uploads.discard(upload)
+                return replay_response(existing, response)
+
+        audio_duration = await task_service.probe_duration(submission.file_path)
+
+        result = await enqueue_task(
+            submission,
+            response,
+            f"загрузки {upload.filename}",
+            params["language"],
+            trim_silence,
+            params["split_channels"],
+            priority,
+            audio_duration,
+            fingerprint,
+            idempotency_key,
+            content_hash=content_hash
+        )
+        resumable_uploads.discard(upload)
+        return result
+
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка завершения загрузки {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
+    finally:
+        await submission.close()
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(
+    upload_id: str,
+    request: Request,
+    api_key: Optional[str] = Header(default=None, alias="X-API-Key")
+):
+    """Отменяет загрузку и удаляет принятые части"""
+    upload = get_upload(request, upload_id, api_key)
+    resumable_uploads.discard(upload)
+    return Response(status_code=204)
@@ -19,6 +19,7 @@ class Settings(BaseSettings):
     # Yandex Cloud настройки
     YANDEX_CLOUD_IAM_TOKEN: str = ""
     YANDEX_FOLDER_ID: str = ""
+    YANDEX_STT_URL: str = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
     
     # Настройки файлов
     UPLOAD_DIR: str = "temp/uploads"
@@ -30,7 +31,110 @@ class Settings(BaseSettings):
     DEFAULT_LANGUAGE: str = "ru-RU"
     CLEANUP_INTERVAL: int = 3600  # Очистка временных файлов каждый час
     FILE_TTL: int = 1800  # Время жизни файлов 30 минут
+    RESULT_INLINE_LIMIT: int = 4096  # Более длинные транскрипты не держим в памяти
+    STATUS_CACHE_SIZE: int = 10000  # Число готовых ответов о статусе в кэше
+    STATUS_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Суммарный размер ответов в кэше
     
+    # Предобработка: вырезание тишины (VAD)
+    VAD_ENABLED: bool = False  # Значение по умолчанию, если клиент не указал trim_silence
+    VAD_FRAME_MS: int = 30  # Длина кадра анализа
+    VAD_THRESHOLD_DB: float = 12.0  # Превышение над уровнем шума для речи
+    VAD_MIN_SPEECH_MS: int = 150  # Более короткие всплески считаются шумом
+    VAD_MIN_SILENCE_MS: int = 600  # Более короткие паузы сохраняются
+    VAD_PADDING_MS: int = 200  # Запас тишины вокруг речи
+    
+    # Конвертация в OGG Opus
+    CONVERT_PROCESSES: bool = True  # Конвертировать в отдельных процессах (иначе — в пуле потоков)
+    CONVERT_WORKERS: int = 0  # Процессов конвертации (0 — по числу ядер)
+    STT_MAX_REQUEST_BYTES: int = 1024 * 1024  # Лимит синхронного распознавания SpeechKit на запрос
+    # Ступени кодирования [битрейт, частота] от лучшей: берется первая, при которой файл помещается в лимит
+    OPUS_LADDER: list = [
+        [64000, 48000], [48000, 48000], [32000, 16000], [24000, 16000], [16000, 16000], [12000, 16000], [8000, 8000]
+    ]
+    OPUS_SIZE_MARGIN: float = 0.9  # Доля лимита, на которую рассчитывается оценка размера (Opus — VBR)
+    STREAM_WINDOW_SECONDS: float = 10.0  # Окно потокового декодирования (память не зависит от длительности)
+    CONVERT_CACHE_ENABLED: bool = True  # Переиспользовать конвертацию того же файла (повторы, другой язык)
+    CONVERT_CACHE_DIR: str = "temp/convert_cache"
+    CONVERT_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 2GB, давно не использованные вытесняются
+    
+    # Раздельное распознавание каналов (стерео-записи звонков)
+    CHANNEL_LABELS: list = ["1", "2"]  # Метки говорящих по номеру канала
+    UTTERANCE_MAX_SECONDS: float = 25.0  # Максимальная длина реплики в одном запросе
+    
+    # Планировщик: очередность по длительности аудио
+    SCHED_WORKERS: int = 4  # Сколько задач обрабатывается одновременно
+    SCHED_AGING_RATE: float = 1.0  # На сколько секунд аудио "дешевеет" задача за секунду ожидания
+    SCHED_MAX_WAIT_SECONDS: float = 600.0  # Отклонять задачи с большим ожиданием (0 = без ограничения)
+    SCHED_INITIAL_RATIO: float = 0.3  # Начальная оценка секунд обработки на секунду аудио
+    SCHED_TASK_OVERHEAD: float = 1.0  # Постоянная часть времени обработки задачи, сек
+    SCHED_FALLBACK_BITRATE: int = 64000  # Для оценки длительности по размеру, бит/с
+    
+    # Полосы приоритета: realtime, interactive, bulk
+    DEFAULT_PRIORITY: str = "interactive"  # Если не указан в запросе и у ключа
+    MAX_PRIORITY: str = "interactive"  # Самая высокая полоса, доступная без настройки ключа
+    PRIORITY_RESERVED_WORKERS: dict = {"realtime": 1, "interactive": 1, "bulk": 0}  # Резерв мест
+    PRIORITY_MAX_WAIT_SECONDS: dict = {"realtime": 60.0, "bulk": 0.0}  # Иначе SCHED_MAX_WAIT_SECONDS
+    
+    # Доступ и лимиты клиентов
+    API_KEYS: dict = {}  # {"ключ": {"name": ..., "rps": ..., "burst": ..., ...}}; пусто — без ключей, по IP
+    CORS_ORIGINS: list = ["*"]  # Разрешенные источники для браузерных клиентов
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_RPS: float = 2.0  # Загрузок в секунду на клиента (пополнение корзины)
+    RATE_LIMIT_BURST: int = 10  # Емкость корзины
+    RATE_LIMIT_MAX_CONCURRENT: int = 20  # Задач в очереди и обработке на клиента (0 = без лимита)
+    RATE_LIMIT_DAILY_AUDIO_SECONDS: float = 0.0  # Суточная квота секунд аудио (0 = без квоты)
+    RATE_LIMIT_CONCURRENCY_RETRY: float = 5.0  # Retry-After при лимите одновременных задач
+    RATE_LIMIT_REDIS_URL: str = ""  # Общие лимиты для нескольких воркеров (нужен пакет redis)
+    
+    # Распознавание по ссылке (HTTP(S) и s3://)
+    REMOTE_POOL_SIZE: int = 32  # Соединений на хост в пуле
+    REMOTE_WORKERS: int = 4  # Одновременных проверок и загрузок ссылок (свой пул потоков)
+    REMOTE_TIMEOUT: int = 30  # Таймаут соединения и чтения, сек
+    REMOTE_MAX_FILE_SIZE: int = 500 * 1024 * 1024  # 500MB
+    REMOTE_ALLOWED_HOSTS: list = []  # Пусто — любые публичные хосты
+    REMOTE_ALLOW_PRIVATE: bool = False  # Разрешить локальные и внутренние адреса
+    S3_ENDPOINT_URL: str = "https://storage.yandexcloud.net"
+    S3_REGION: str = "ru-central1"
+    S3_ACCESS_KEY_ID: str = ""  # Пусто — запросы к хранилищу без подписи
+    S3_SECRET_ACCESS_KEY: str = ""
+    
+    # Возобновляемая загрузка частями
+    UPLOAD_RESUMABLE_DIR: str = "temp/resumable"
+    UPLOAD_RESUMABLE_MAX_SIZE: int = 500 * 1024 * 1024  # 500MB
+    UPLOAD_RESUMABLE_TTL: int = 24 * 3600  # Незавершенная загрузка удаляется через сутки без активности
+    UPLOAD_CHUNK_MAX_BYTES: int = 8 * 1024 * 1024  # Максимальный размер одной части
+    UPLOAD_EARLY_DECODE: bool = True  # Декодировать файл в WAV, пока он загружается
+    
+    # Распознавание файлов, которые еще записываются
+    FOLLOW_DIR: str = ""  # Папка записей, доступная через API (пусто — режим API выключен)
+    FOLLOW_IDLE_SECONDS: float = 10.0  # Файл не растет столько секунд — запись закончилась
+    FOLLOW_SAMPLE_RATE: int = 16000  # Частота декодирования реплик
+    
+    # Выгрузка готовых транскриптов для аналитики
+    EXPORT_ENABLED: bool = True
+    EXPORT_DIR: str = "temp/exports"
+    EXPORT_FORMAT: str = "ndjson"  # ndjson или parquet (нужен пакет pyarrow)
+    EXPORT_BATCH_SIZE: int = 200  # Записей в пачке (запись в файл без ожидания таймера)
+    EXPORT_FLUSH_SECONDS: float = 5.0  # Максимальная задержка записи
+    EXPORT_ROTATE_BYTES: int = 256 * 1024 * 1024  # Новый файл после 256MB
+    EXPORT_ROTATE_SECONDS: int = 3600  # Новый файл не реже раза в час
+    EXPORT_RETENTION_DAYS: int = 7  # Удалять закрытые файлы старше (0 = хранить всегда)
+    EXPORT_TOKEN: str = ""  # X-Export-Token для выгрузки всех клиентов без API-ключей (пусто — только с client_id)
+    
+    # Остановка и перезапуск
+    SHUTDOWN_DRAIN_SECONDS: float = 25.0  # Сколько ждать выполняющиеся задачи при остановке
+    CHECKPOINT_DIR: str = "temp/checkpoints"  # Незавершенные задачи для продолжения после запуска
+    
+    # Запуск
+    STARTUP_WARMUP: bool = True  # Заранее создавать пулы, соединение с SpeechKit и проверять ffmpeg
+    STARTUP_WARMUP_TIMEOUT: float = 10.0  # Сколько ждать прогрева до приема запросов (дальше — в фоне)
+
+    # Диагностика работающего сервиса (/debug/profile, /debug/tasks)
+    DEBUG_TOKEN: str = ""  # Значение заголовка X-Debug-Token (пусто — эндпоинты выключены)
+    DEBUG_PROFILE_MAX_SECONDS: float = 60.0  # Самое долгое профилирование за запрос
+    DEBUG_PROFILE_INTERVAL_MS: float = 10.0  # Период выборки стеков (10 мс — 100 Гц)
+    DEBUG_PROFILE_MAX_DEPTH: int = 128  # Глубже стек обрезается
+
     # Настройки API
     API_TIMEOUT: int = 120  # Таймаут для Yandex API
     MAX_CONCURRENT_REQUESTS: int = 10
@@ -58,6 +162,8 @@ load_env_file()
 # Создаем экземпляр настроек
 settings = Settings()
 
-# Создаем необходимые директории
-Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
-Path(settings.OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+
+def create_directories():
+    """Создает рабочие директории (вызывается при запуске сервиса, а не при импорте)"""
+    Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+    Path(settings.OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
@@ -6,12 +6,17 @@ FastAPI приложение для микросервиса распознав
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-import os
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
-from app.api.routes import transcribe
-from app.core.config import settings
+from app.api.routes import debug, export, transcribe, uploads
+from app.core.config import create_directories, settings
 from app.core.logging_config import setup_logging
+from app.services.export_sink import export_sink
+from app.services.task_service import task_service
+
+logger = logging.getLogger("speech_service")
 
 
 @asynccontextmanager
@@ -26,9 +31,24 @@ async def lifespan(app: FastAPI):
     if not settings.YANDEX_FOLDER_ID:
         raise RuntimeError("YANDEX_FOLDER_ID не настроен")
     
+    create_directories()
+    # Прогрев идет параллельно с остальной подготовкой
+    warmup = asyncio.create_task(task_service.warmup()) if settings.STARTUP_WARMUP else None
+    
+    export_sink.start()
+    # Задачи, не завершенные при прошлой остановке
+    task_service.restore()
+    
+    if warmup is not None:
+        done, _ = await asyncio.wait({warmup}, timeout=settings.STARTUP_WARMUP_TIMEOUT)
+        if not done:
+            logger.warning("Прогрев не завершился вовремя, продолжается в фоне")
+    
     print("🚀 Speech-to-Text микросервис запущен")
     yield
-    # Shutdown
+    # Shutdown: дожидаемся задач, незавершенные сохраняем для следующего запуска
+    await task_service.shutdown(settings.SHUTDOWN_DRAIN_SECONDS)
+    await export_sink.stop()
     print("🛑 Speech-to-Text микросервис остановлен")
 
 
@@ -43,14 +63,18 @@ app = FastAPI(
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # В продакшене ограничить конкретными доменами
-    allow_credentials=True,
+    allow_origins=settings.CORS_ORIGINS,
+    # С "*" браузеры не передают учетные данные, поэтому они разрешаются только для явного списка
+    allow_credentials="*" not in settings.CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 # Подключаем роуты
 app.include_router(transcribe.router, prefix="/api/v1", tags=["transcribe"])
+app.include_router(uploads.router, prefix="/api/v1", tags=["uploads"])
+app.include_router(export.router, prefix="/api/v1", tags=["export"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"], include_in_schema=False)
 
 
 @app.get("/")
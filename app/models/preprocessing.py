@@ -0,0 +1,86 @@
+"""
+Результаты предобработки аудио: соответствие времени и статистика
+
+Вынесены из app.services.audio_preprocess, чтобы модели задач и
+контрольных точек не тянули NumPy и pydub при импорте.
+"""
+
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+
+class OffsetMap:
+    """Соответствие времени в обрезанном аудио времени в исходном"""
+    
+    __slots__ = ("_processed", "_original")
+    
+    def __init__(self):
+        self._processed: List[float] = []
+        self._original: List[float] = []
+        
+    def add(self, processed_start: float, original_start: float) -> None:
+        """Добавляет начало сохраненного участка (в секундах)"""
+        self._processed.append(processed_start)
+        self._original.append(original_start)
+        
+    def to_original(self, seconds: float) -> float:
+        """Переводит время из обрезанного аудио в исходное"""
+        if not self._processed:
+            return seconds
+        i = max(bisect_right(self._processed, seconds) - 1, 0)
+        return self._original[i] + (seconds - self._processed[i])
+        
+    def __len__(self) -> int:
+        return len(self._processed)
+        
+    def to_list(self) -> List[Tuple[float, float]]:
+        """Пары (время в обрезанном, время в исходном) для сохранения"""
+        return list(zip(self._processed, self._original))
+        
+    @classmethod
+    def from_list(cls, pairs: List[Tuple[float, float]]) -> "OffsetMap":
+        """Восстанавливает соответствие из пар to_list"""
+        offset_map = cls()
+        for processed, original in pairs:
+            offset_map.add(processed, original)
+        return offset_map
+
+
+class TrimStats:
+    """Сколько удалось сэкономить на предобработке"""
+    
+    __slots__ = ("original_seconds", "processed_seconds", "pcm_bytes_saved", "upload_bytes_saved")
+    
+    def __init__(self, original_seconds: float, processed_seconds: float, pcm_bytes_saved: int):
+        self.original_seconds = original_seconds
+        self.processed_seconds = processed_seconds
+        self.pcm_bytes_saved = pcm_bytes_saved
+        self.upload_bytes_saved: Optional[int] = None
+        
+    @property
+    def audio_seconds_saved(self) -> float:
+        """Сколько секунд аудио не пришлось отправлять"""
+        return self.original_seconds - self.processed_seconds
+        
+    def estimate_upload_savings(self, uploaded_bytes: int) -> None:
+        """Оценивает сэкономленный трафик по фактическому битрейту отправленного файла"""
+        if self.processed_seconds > 0:
+            bytes_per_second = uploaded_bytes / self.processed_seconds
+            self.upload_bytes_saved = int(bytes_per_second * self.audio_seconds_saved)
+            
+    def to_dict(self) -> Dict:
+        """Представление для ответа API"""
+        return {
+            "original_seconds": round(self.original_seconds, 3),
+            "processed_seconds": round(self.processed_seconds, 3),
+            "audio_seconds_saved": round(self.audio_seconds_saved, 3),
+            "pcm_bytes_saved": self.pcm_bytes_saved,
+            "upload_bytes_saved": self.upload_bytes_saved,
+        }
+        
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TrimStats":
+        """Восстанавливает статистику из to_dict"""
+        stats = cls(data["original_seconds"], data["processed_seconds"], data["pcm_bytes_saved"])
+        stats.upload_bytes_saved = data.get("upload_bytes_saved")
+        return stats
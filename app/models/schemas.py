@@ -24,6 +24,21 @@ class Language(str, Enum):
     UK = "uk-UA"
 
 
+class Priority(str, Enum):
+    """Полосы приоритета задач (в порядке убывания)"""
+    REALTIME = "realtime"
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+class TranscriptFormat(str, Enum):
+    """Форматы выгрузки транскрипта"""
+    TEXT = "text"
+    SRT = "srt"
+    VTT = "vtt"
+    JSON = "json"
+
+
 class TranscribeRequest(BaseModel):
     """Запрос на распознавание речи"""
     language: Language = Field(default=Language.RU, description="Язык аудио")
@@ -36,6 +51,55 @@ class TranscribeRequest(BaseModel):
         }
 
 
+class TranscribeUrlRequest(BaseModel):
+    """Запрос распознавания файла по ссылке"""
+    url: str = Field(..., description="Ссылка HTTP(S) или s3://bucket/key")
+    language: Language = Field(Language.RU, description="Язык аудио")
+    trim_silence: Optional[bool] = Field(None, description="Вырезать тишину (по умолчанию VAD_ENABLED)")
+    split_channels: bool = Field(False, description="Распознать каналы раздельно")
+    priority: Optional[Priority] = Field(None, description="Полоса приоритета")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "url": "s3://my-bucket/calls/2024-01-15/call.ogg",
+                "language": "ru-RU",
+                "split_channels": True
+            }
+        }
+
+
+class UploadCreateRequest(BaseModel):
+    """Создание возобновляемой загрузки"""
+    filename: str = Field(..., description="Имя файла (по расширению определяется формат)")
+    size: int = Field(..., gt=0, description="Размер файла, байт")
+    sha256: Optional[str] = Field(
+        None, pattern="^[0-9a-fA-F]{64}$", description="SHA-256 всего файла для проверки при завершении"
+    )
+    language: Language = Field(Language.RU, description="Язык аудио")
+    trim_silence: Optional[bool] = Field(None, description="Вырезать тишину (по умолчанию VAD_ENABLED)")
+    split_channels: bool = Field(False, description="Распознать каналы раздельно")
+    priority: Optional[Priority] = Field(None, description="Полоса приоритета")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "filename": "meeting.mp3",
+                "size": 73400320,
+                "language": "ru-RU"
+            }
+        }
+
+
+class UploadStatusResponse(BaseModel):
+    """Состояние возобновляемой загрузки"""
+    upload_id: str = Field(..., description="ID загрузки")
+    offset: int = Field(..., description="Принято байт: следующая часть начинается с этого смещения")
+    size: int = Field(..., description="Размер файла, байт")
+    chunk_size: int = Field(..., description="Максимальный размер части, байт")
+    expires_at: datetime = Field(..., description="Когда незавершенная загрузка будет удалена")
+
+
 class TranscribeResponse(BaseModel):
     """Ответ на запрос распознавания"""
     task_id: str = Field(..., description="ID задачи")
@@ -52,14 +116,29 @@ class TranscribeResponse(BaseModel):
         }
 
 
+class PreprocessingInfo(BaseModel):
+    """Статистика предобработки аудио (вырезания тишины)"""
+    original_seconds: float = Field(..., description="Длительность исходного аудио")
+    processed_seconds: float = Field(..., description="Длительность отправленного аудио")
+    audio_seconds_saved: float = Field(..., description="Сэкономлено секунд аудио")
+    pcm_bytes_saved: int = Field(..., description="Сэкономлено байт несжатого PCM")
+    upload_bytes_saved: Optional[int] = Field(None, description="Оценка сэкономленного трафика к API")
+
+
 class TaskStatusResponse(BaseModel):
     """Ответ со статусом задачи"""
     task_id: str = Field(..., description="ID задачи")
     status: TaskStatus = Field(..., description="Статус задачи")
     created_at: datetime = Field(..., description="Время создания")
     completed_at: Optional[datetime] = Field(None, description="Время завершения")
-    result: Optional[str] = Field(None, description="Результат распознавания")
+    audio_duration: Optional[float] = Field(None, description="Длительность аудио, сек")
+    priority: Optional[Priority] = Field(None, description="Полоса приоритета")
+    result: Optional[str] = Field(None, description="Результат распознавания (для длинных — начало)")
+    result_truncated: bool = Field(False, description="Текст обрезан: полный — по text_url")
+    text_url: Optional[str] = Field(None, description="Полный текст (если result обрезан)")
+    segments_url: Optional[str] = Field(None, description="Фрагменты с временем (если result обрезан)")
     error: Optional[str] = Field(None, description="Ошибка если есть")
+    preprocessing: Optional[PreprocessingInfo] = Field(None, description="Статистика вырезания тишины")
     
     class Config:
         json_schema_extra = {
@@ -68,8 +147,14 @@ class TaskStatusResponse(BaseModel):
                 "status": "completed",
                 "created_at": "2025-01-08T10:00:00Z",
                 "completed_at": "2025-01-08T10:00:30Z",
+                "audio_duration": 3.2,
+                "priority": "interactive",
                 "result": "Привет, это тестовое сообщение",
-                "error": None
+                "result_truncated": False,
+                "text_url": None,
+                "segments_url": None,
+                "error": None,
+                "preprocessing": None
             }
         }
 
@@ -0,0 +1,289 @@
+"""
+Компактное представление задач распознавания
+"""
+
+import json
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterator, Tuple
+
+from app.core.config import settings
+from app.models.schemas import Priority, TaskStatus
+from app.models.transcript import Segment, Transcript
+
+
+FINISHED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED)
+# Адрес результата задачи в API (для ссылок в ответе о статусе)
+RESULT_URL = "/api/v1/transcribe/{task_id}"
+
+
+def _format_timestamp(value: Optional[float]) -> Optional[str]:
+    """Переводит unix-время в ISO-строку (UTC, как раньше отдавал pydantic)"""
+    if value is None:
+        return None
+    return datetime.utcfromtimestamp(value).isoformat()
+
+
+class TaskRecord:
+    """
+    Запись о задаче распознавания
+    
+    Хранится в памяти всё время жизни задачи, поэтому вместо словаря
+    используется класс со __slots__, а время — unix-timestamp вместо datetime.
+    Результат всегда лежит в хранилище транскриптов (result_path), в памяти
+    остаются только короткие тексты.
+    """
+    
+    __slots__ = (
+        "id",
+        "status",
+        "audio_path",
+        "language",
+        "trim_silence",
+        "split_channels",
+        "client_id",
+        "audio_duration",
+        "priority",
+        "rate_limited",
+        "fingerprint",
+        "content_hash",
+        "leader_id",
+        "source_url",
+        "created_at",
+        "started_at",
+        "completed_at",
+        "error",
+        "result_path",
+        "segments_path",
+        "preprocessing",
+        "stages",
+        "_transcript",
+    )
+    
+    def __init__(
+        self,
+        task_id: str,
+        audio_path: str,
+        language: str,
+        created_at: float,
+        trim_silence: bool = False,
+        split_channels: bool = False,
+        client_id: str = "",
+        audio_duration: Optional[float] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        rate_limited: bool = False,
+        fingerprint: Optional[str] = None,
+        source_url: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ):
+        self.id = task_id
+        self.status = TaskStatus.PENDING
+        self.audio_path = audio_path
+        self.language = language
+        self.trim_silence = trim_silence
+        self.split_channels = split_channels
+        self.client_id = client_id
+        self.audio_duration = audio_duration
+        self.priority = priority
+        # Задача занимает место в лимите одновременных задач клиента
+        self.rate_limited = rate_limited
+        # Хеш содержимого и параметров: одинаковые задачи объединяются
+        self.fingerprint = fingerprint
+        # Хеш только содержимого: ключ кэша конвертации (не зависит от языка)
+        self.content_hash = content_hash
+        # ID задачи, результат которой получит эта (если объединена)
+        self.leader_id: Optional[str] = None
+        # Ссылка на файл: он загружается в audio_path при обработке
+        self.source_url = source_url
+        self.created_at = created_at
+        self.started_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.result_path: Optional[str] = None
+        self.segments_path: Optional[str] = None
+        # Статистика предобработки (TrimStats), если она включена
+        self.preprocessing = None
+        # Результаты выполненных этапов (сконвертированный файл) для продолжения после прерывания
+        self.stages: Dict[str, Any] = {}
+        self._transcript: Optional[Transcript] = None
+        
+    @property
+    def is_finished(self) -> bool:
+        """Задача завершена (успешно или с ошибкой) и больше не меняется"""
+        return self.status in FINISHED_STATUSES
+        
+    @property
+    def result(self) -> Optional[str]:
+        """Текст распознавания (при необходимости читается с диска)"""
+        if self._transcript is not None:
+            return self._transcript.text
+        if self.result_path is None:
+            return None
+        with open(self.result_path, "r", encoding="utf-8") as f:
+            return " ".join(line.rstrip("\n") for line in f if line.strip())
+            
+    def result_preview(self, limit: int) -> Tuple[Optional[str], bool]:
+        """
+        Начало текста распознавания не длиннее limit символов
+        
+        Текст с диска читается построчно только до limit.
+        
+        Returns:
+            Начало текста и признак того, что текст обрезан
+        """
+        if self._transcript is not None or self.result_path is None:
+            text = self.result
+            if text is None:
+                return None, False
+            return text[:limit], len(text) > limit
+        phrases = []
+        length = 0
+        more = False
+        with open(self.result_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if length > limit:
+                    more = True
+                    break
+                phrases.append(line.rstrip("\n"))
+                length += len(phrases[-1]) + 1
+        text = " ".join(phrases)
+        return text[:limit], more or len(text) > limit
+            
+    def iter_segments(self) -> Iterator[Segment]:
+        """Фрагменты результата по одному (вынесенные читаются построчно)"""
+        if self._transcript is not None:
+            yield from self._transcript
+            return
+        if self.segments_path is None:
+            return
+        with open(self.segments_path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield Segment.from_compact(line)
+                
+    def set_result(
+        self,
+        transcript: Transcript,
+        result_path: str,
+        segments_path: str,
+        keep_inline: bool
+    ) -> None:
+        """
+        Сохраняет результат распознавания
+        
+        Args:
+            transcript: Структурированный результат
+            result_path: Путь к сохраненному тексту (одна фраза на строку)
+            segments_path: Путь к сохраненным фрагментам (JSON lines)
+            keep_inline: Держать ли результат в памяти (для коротких текстов)
+        """
+        self.result_path = result_path
+        self.segments_path = segments_path
+        self._transcript = transcript if keep_inline else None
+        
+    def copy_result(self, leader: "TaskRecord", result_path: Optional[str], segments_path: Optional[str]) -> None:
+        """
+        Переносит итог задачи, с которой объединена эта
+        
+        Короткий результат в памяти не копируется, а разделяется.
+        
+        Args:
+            leader: Выполненная задача
+            result_path: Путь к копии текста для этой задачи
+            segments_path: Путь к копии фрагментов для этой задачи
+        """
+        self.result_path = result_path
+        self.segments_path = segments_path
+        self._transcript = leader._transcript
+        self.preprocessing = leader.preprocessing
+        self.error = leader.error
+        self.started_at = leader.started_at
+        self.completed_at = leader.completed_at
+        self.status = leader.status
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Представление задачи в формате ответа API
+        
+        Длинный текст не читается целиком: в ответе его начало
+        (RESULT_INLINE_LIMIT символов) и ссылки на полный текст и фрагменты.
+        """
+        result, truncated = self.result_preview(settings.RESULT_INLINE_LIMIT)
+        url = RESULT_URL.format(task_id=self.id)
+        return {
+            "task_id": self.id,
+            "status": self.status.value,
+            "created_at": _format_timestamp(self.created_at),
+            "completed_at": _format_timestamp(self.completed_at),
+            "audio_duration": self.audio_duration,
+            "priority": self.priority.value,
+            "result": result,
+            "result_truncated": truncated,
+            "text_url": f"{url}/text" if truncated else None,
+            "segments_url": f"{url}/segments" if truncated else None,
+            "error": self.error,
+            "preprocessing": self.preprocessing.to_dict() if self.preprocessing else None,
+        }
+        
+    def to_checkpoint(self) -> Dict[str, Any]:
+        """Поля для восстановления задачи после перезапуска (кроме результатов этапов)"""
+        return {
+            "task_id": self.id,
+            "status": self.status.value,
+            "audio_path": self.audio_path,
+            "language": self.language,
+            "created_at": self.created_at,
+            "trim_silence": self.trim_silence,
+            "split_channels": self.split_channels,
+            "client_id": self.client_id,
+            "audio_duration": self.audio_duration,
+            "priority": self.priority.value,
+            "rate_limited": self.rate_limited,
+            "fingerprint": self.fingerprint,
+            "source_url": self.source_url,
+            "content_hash": self.content_hash,
+            "leader_id": self.leader_id,
+            "started_at": self.started_at,
+            "completed_at": self.completed_at,
+            "error": self.error,
+            "result_path": self.result_path,
+            "segments_path": self.segments_path,
+        }
+        
+    @classmethod
+    def from_checkpoint(cls, data: Dict[str, Any]) -> "TaskRecord":
+        """
+        Восстанавливает задачу из to_checkpoint
+        
+        Завершенная задача сохраняет статус и ссылки на результат,
+        незавершенная возвращается в статус pending.
+        """
+        task = cls(
+            data["task_id"],
+            data["audio_path"],
+            data["language"],
+            data["created_at"],
+            trim_silence=data["trim_silence"],
+            split_channels=data["split_channels"],
+            client_id=data["client_id"],
+            audio_duration=data["audio_duration"],
+            priority=Priority(data["priority"]),
+            rate_limited=data["rate_limited"],
+            fingerprint=data["fingerprint"],
+            source_url=data["source_url"],
+            content_hash=data["content_hash"]
+        )
+        task.leader_id = data["leader_id"]
+        status = TaskStatus(data["status"])
+        if status in FINISHED_STATUSES:
+            task.status = status
+            task.started_at = data["started_at"]
+            task.completed_at = data["completed_at"]
+            task.error = data["error"]
+            task.result_path = data["result_path"]
+            task.segments_path = data["segments_path"]
+        return task
+        
+    def to_json(self) -> bytes:
+        """Сериализует задачу в JSON (совместим с TaskStatusResponse)"""
+        return json.dumps(self.to_dict(), ensure_ascii=False).encode("utf-8")
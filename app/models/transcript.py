@@ -0,0 +1,204 @@
+"""
+Структурированный результат распознавания
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def _parse_seconds(value: Any) -> float:
+    """Переводит время из ответа API ("1.5s" или число) в секунды"""
+    if value is None:
+        return 0.0
+    if isinstance(value, str):
+        value = value.rstrip("s")
+    return float(value)
+
+
+class Word:
+    """Слово с временными метками и уверенностью"""
+    
+    __slots__ = ("start", "end", "text", "confidence")
+    
+    def __init__(self, start: float, end: float, text: str, confidence: Optional[float] = None):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.confidence = confidence
+
+
+class Segment:
+    """Фрагмент (фраза) распознанной речи"""
+    
+    __slots__ = ("start", "end", "text", "confidence", "channel", "words", "alternatives")
+    
+    def __init__(
+        self,
+        start: float,
+        end: float,
+        text: str,
+        confidence: Optional[float] = None,
+        channel: Optional[str] = None,
+        words: Tuple[Word, ...] = (),
+        alternatives: Tuple[Tuple[str, Optional[float]], ...] = ()
+    ):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.confidence = confidence
+        self.channel = channel
+        self.words = words
+        self.alternatives = alternatives
+        
+    def to_compact(self) -> str:
+        """Компактная JSON-строка для хранения"""
+        data: Dict[str, Any] = {"s": self.start, "e": self.end, "t": self.text}
+        if self.confidence is not None:
+            data["c"] = self.confidence
+        if self.channel is not None:
+            data["ch"] = self.channel
+        if self.words:
+            data["w"] = [[w.start, w.end, w.text, w.confidence] for w in self.words]
+        if self.alternatives:
+            data["alt"] = [list(alt) for alt in self.alternatives]
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        
+    @classmethod
+    def from_compact(cls, line: str) -> "Segment":
+        """Восстанавливает фрагмент из компактной JSON-строки"""
+        data = json.loads(line)
+        return cls(
+            start=data["s"],
+            end=data["e"],
+            text=data["t"],
+            confidence=data.get("c"),
+            channel=data.get("ch"),
+            words=tuple(Word(*w) for w in data.get("w", ())),
+            alternatives=tuple(tuple(alt) for alt in data.get("alt", ()))
+        )
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """Развернутое представление для экспорта в JSON"""
+        return {
+            "start": self.start,
+            "end": self.end,
+            "text": self.text,
+            "confidence": self.confidence,
+            "channel": self.channel,
+            "words": [
+                {"start": w.start, "end": w.end, "word": w.text, "confidence": w.confidence}
+                for w in self.words
+            ],
+            "alternatives": [
+                {"text": text, "confidence": confidence}
+                for text, confidence in self.alternatives
+            ],
+        }
+
+
+class Transcript:
+    """Результат распознавания: упорядоченный список фрагментов"""
+    
+    __slots__ = ("segments",)
+    
+    def __init__(self, segments: Iterable[Segment] = ()):
+        self.segments: List[Segment] = list(segments)
+        
+    @property
+    def text(self) -> str:
+        """Полный текст (фрагменты через пробел, как раньше)"""
+        return " ".join(segment.text for segment in self.segments if segment.text)
+        
+    def remap_times(self, to_original: Callable[[float], float]) -> None:
+        """Переводит все временные метки (фраз и слов) функцией to_original"""
+        for segment in self.segments:
+            segment.start = to_original(segment.start)
+            segment.end = to_original(segment.end)
+            for word in segment.words:
+                word.start = to_original(word.start)
+                word.end = to_original(word.end)
+                
+    def __iter__(self) -> Iterator[Segment]:
+        return iter(self.segments)
+        
+    def __bool__(self) -> bool:
+        return any(segment.text for segment in self.segments)
+
+
+def _parse_alternative(
+    chunk: Dict[str, Any],
+    offset: float,
+    channel: Optional[str]
+) -> Optional[Segment]:
+    """Разбирает один chunk ответа API в Segment"""
+    alternatives = chunk.get("alternatives") or []
+    if not alternatives:
+        return None
+        
+    best = alternatives[0]
+    words = tuple(
+        Word(
+            start=_parse_seconds(w.get("startTime")) + offset,
+            end=_parse_seconds(w.get("endTime")) + offset,
+            text=w.get("word", ""),
+            confidence=w.get("confidence")
+        )
+        for w in best.get("words") or []
+    )
+    
+    if words:
+        start, end = words[0].start, words[-1].end
+    else:
+        start = _parse_seconds(chunk.get("startTime")) + offset
+        end = _parse_seconds(chunk.get("endTime")) + offset
+        
+    return Segment(
+        start=start,
+        end=end,
+        text=best.get("text", ""),
+        confidence=best.get("confidence"),
+        channel=chunk.get("channelTag", channel),
+        words=words,
+        alternatives=tuple(
+            (alt.get("text", ""), alt.get("confidence"))
+            for alt in alternatives[1:]
+        )
+    )
+
+
+def parse_recognition_response(
+    response: Dict[str, Any],
+    offset: float = 0.0,
+    duration: Optional[float] = None,
+    channel: Optional[str] = None
+) -> Transcript:
+    """
+    Разбирает ответ SpeechKit в Transcript, сохраняя время, уверенность и альтернативы
+    
+    Args:
+        response: JSON ответа API
+        offset: Смещение (сек) начала распознанного фрагмента в исходном аудио
+        duration: Длительность фрагмента, если API не вернул временные метки
+        channel: Метка канала по умолчанию
+        
+    Returns:
+        Структурированный результат
+    """
+    result = response.get("result", response)
+    
+    # Синхронный API v1 возвращает только строку
+    if isinstance(result, str):
+        if not result:
+            return Transcript()
+        end = offset + duration if duration is not None else offset
+        return Transcript([Segment(start=offset, end=end, text=result, channel=channel)])
+        
+    chunks = result.get("chunks", []) if isinstance(result, dict) else []
+    segments = []
+    for chunk in chunks:
+        segment = _parse_alternative(chunk, offset, channel)
+        if segment is not None:
+            segments.append(segment)
+            
+    segments.sort(key=lambda segment: segment.start)
+    return Transcript(segments)
@@ -0,0 +1,315 @@
+"""
+Предобработка аудио: вырезание тишины по энергии сигнала (VAD)
+
+Анализ векторизован на NumPy: сигнал режется на кадры, для каждого кадра
+считается энергия в dBFS, порог берется относительно уровня шума записи.
+Паузы длиннее VAD_MIN_SILENCE_MS сжимаются до 2 * VAD_PADDING_MS, а
+OffsetMap позволяет перевести время из обрезанного аудио обратно в исходное.
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.core.config import settings
+from app.models.preprocessing import OffsetMap, TrimStats
+
+logger = logging.getLogger("speech_service.preprocess")
+
+# Минимальная энергия кадра, который может считаться речью (dBFS)
+MIN_SPEECH_DBFS = -55.0
+
+
+def frame_energy_db(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """
+    Энергия кадров в dBFS
+    
+    Args:
+        samples: Моно-сигнал int16
+        frame_length: Длина кадра в сэмплах
+        
+    Returns:
+        Массив энергий по кадрам (неполный последний кадр дополняется нулями)
+    """
+    n_frames = -(-len(samples) // frame_length)
+    padded = np.zeros(n_frames * frame_length, dtype=np.float32)
+    padded[:len(samples)] = samples
+    frames = padded.reshape(n_frames, frame_length) / 32768.0
+    power = np.einsum("ij,ij->i", frames, frames) / frame_length
+    return 10.0 * np.log10(power + 1e-12)
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Разбивает булев массив на серии: начала, длины, значения"""
+    change = np.flatnonzero(np.diff(mask.astype(np.int8))) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [len(mask)])))
+    return starts, lengths, mask[starts]
+
+
+def _fill_short_runs(mask: np.ndarray, value: bool, max_length: int) -> np.ndarray:
+    """
+    Инвертирует серии значения value короче max_length кадров
+    
+    Паузы (value=False) заполняются только внутри записи, короткие
+    всплески (value=True) убираются везде.
+    """
+    if len(mask) == 0 or max_length <= 0:
+        return mask
+    mask = mask.copy()
+    starts, lengths, values = _runs(mask)
+    for start, length, run_value in zip(starts, lengths, values):
+        inner = start > 0 and start + length < len(mask)
+        if run_value == value and length < max_length and (inner or value):
+            mask[start:start + length] = not value
+    return mask
+
+
+def frame_length(sample_rate: int, frame_ms: Optional[int] = None) -> int:
+    """Длина кадра анализа в сэмплах"""
+    return max(int(sample_rate * (frame_ms or settings.VAD_FRAME_MS) / 1000), 1)
+
+
+def detect_speech(
+    samples: np.ndarray,
+    sample_rate: int,
+    frame_ms: Optional[int] = None,
+    threshold_db: Optional[float] = None,
+    min_speech_ms: Optional[int] = None,
+    min_silence_ms: Optional[int] = None,
+    padding_ms: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Находит участки речи
+    
+    Args:
+        samples: Моно-сигнал int16
+        sample_rate: Частота дискретизации
+        frame_ms: Длина кадра анализа
+        threshold_db: Превышение над уровнем шума, начиная с которого кадр — речь
+        min_speech_ms: Более короткие всплески считаются шумом
+        min_silence_ms: Более короткие паузы не вырезаются
+        padding_ms: Запас тишины вокруг каждого участка речи
+        
+    Returns:
+        Список (start, end) в сэмплах, отсортированный и без пересечений
+    """
+    if len(samples) == 0:
+        return []
+    energy = frame_energy_db(samples, frame_length(sample_rate, frame_ms))
+    return speech_regions(
+        energy, len(samples), sample_rate, frame_ms, threshold_db, min_speech_ms, min_silence_ms, padding_ms
+    )
+
+
+def speech_regions(
+    energy: np.ndarray,
+    n_samples: int,
+    sample_rate: int,
+    frame_ms: Optional[int] = None,
+    threshold_db: Optional[float] = None,
+    min_speech_ms: Optional[int] = None,
+    min_silence_ms: Optional[int] = None,
+    padding_ms: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Находит участки речи по уже посчитанной энергии кадров
+    
+    Для потоковой обработки: энергию можно накопить по окнам, не держа
+    в памяти сам сигнал (одно число на кадр).
+    
+    Args:
+        energy: Энергия кадров в dBFS (frame_energy_db)
+        n_samples: Длина сигнала в сэмплах
+        sample_rate: Частота дискретизации
+        Остальные — как у detect_speech
+        
+    Returns:
+        Список (start, end) в сэмплах, отсортированный и без пересечений
+    """
+    frame_ms = frame_ms or settings.VAD_FRAME_MS
+    threshold_db = settings.VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+    min_speech_ms = settings.VAD_MIN_SPEECH_MS if min_speech_ms is None else min_speech_ms
+    min_silence_ms = settings.VAD_MIN_SILENCE_MS if min_silence_ms is None else min_silence_ms
+    padding_ms = settings.VAD_PADDING_MS if padding_ms is None else padding_ms
+    
+    if n_samples == 0 or len(energy) == 0:
+        return []
+        
+    length = frame_length(sample_rate, frame_ms)
+    
+    # Порог относительно уровня шума конкретной записи
+    noise_floor = float(np.percentile(energy, 10))
+    threshold = max(noise_floor + threshold_db, MIN_SPEECH_DBFS)
+    speech = energy > threshold
+    
+    speech = _fill_short_runs(speech, False, min_silence_ms // frame_ms)
+    speech = _fill_short_runs(speech, True, min_speech_ms // frame_ms)
+    
+    padding = int(sample_rate * padding_ms / 1000)
+    regions: List[Tuple[int, int]] = []
+    starts, lengths, values = _runs(speech)
+    for start, run_length, is_speech in zip(starts, lengths, values):
+        if not is_speech:
+            continue
+        begin = max(int(start) * length - padding, 0)
+        end = min(int(start + run_length) * length + padding, n_samples)
+        if regions and begin <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((begin, end))
+    return regions
+
+
+def offset_map_for(regions: List[Tuple[int, int]], sample_rate: int) -> OffsetMap:
+    """Карта смещений для сигнала, склеенного из участков regions"""
+    offset_map = OffsetMap()
+    processed = 0
+    for begin, end in regions:
+        offset_map.add(processed / sample_rate, begin / sample_rate)
+        processed += end - begin
+    return offset_map
+
+
+def trim_silence(audio: AudioSegment) -> Tuple[AudioSegment, OffsetMap, TrimStats]:
+    """
+    Вырезает тишину из моно-аудио
+    
+    Args:
+        audio: Моно AudioSegment
+        
+    Returns:
+        Обрезанное аудио, карта смещений и статистика экономии
+    """
+    if audio.channels != 1:
+        raise ValueError("Предобработка ожидает моно-аудио")
+        
+    if audio.sample_width != 2:
+        audio = audio.set_sample_width(2)
+        
+    sample_rate = audio.frame_rate
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    
+    regions = detect_speech(samples, sample_rate)
+    
+    if not regions:
+        # Речь не найдена — отправляем как есть, пусть решает распознавание
+        stats = TrimStats(audio.duration_seconds, audio.duration_seconds, 0)
+        return audio, OffsetMap(), stats
+        
+    offset_map = offset_map_for(regions, sample_rate)
+    trimmed = np.concatenate([samples[begin:end] for begin, end in regions])
+    result = AudioSegment(
+        data=trimmed.tobytes(),
+        sample_width=2,
+        frame_rate=sample_rate,
+        channels=1
+    )
+    
+    stats = TrimStats(
+        original_seconds=len(samples) / sample_rate,
+        processed_seconds=len(trimmed) / sample_rate,
+        pcm_bytes_saved=(len(samples) - len(trimmed)) * 2
+    )
+    logger.info(
+        f"VAD: {len(regions)} участков речи, вырезано {stats.audio_seconds_saved:.1f} из "
+        f"{stats.original_seconds:.1f} сек"
+    )
+    return result, offset_map, stats
+
+
+# Кадров истории для уровня шума в потоковом VAD (около 10 минут при кадре 30 мс)
+NOISE_HISTORY_FRAMES = 20000
+
+
+class SpeechSegmenter:
+    """
+    Потоковый VAD: режет поступающий сигнал на законченные реплики
+    
+    Пороги те же, что у detect_speech, но уровень шума считается по уже
+    полученным кадрам. Реплика закрывается после паузы VAD_MIN_SILENCE_MS
+    или по достижении max_seconds, и ее можно сразу отправлять, не дожидаясь
+    конца записи. В памяти только сигнал открытой реплики.
+    """
+    
+    def __init__(self, sample_rate: int, max_seconds: Optional[float] = None):
+        frame_ms = settings.VAD_FRAME_MS
+        self.sample_rate = sample_rate
+        self.frame = frame_length(sample_rate)
+        self.min_silence_frames = max(settings.VAD_MIN_SILENCE_MS // frame_ms, 1)
+        self.min_speech_frames = settings.VAD_MIN_SPEECH_MS // frame_ms
+        self.padding = int(sample_rate * settings.VAD_PADDING_MS / 1000)
+        self.max_frames = max(int((max_seconds or settings.UTTERANCE_MAX_SECONDS) * sample_rate) // self.frame, 1)
+        self._history = np.zeros(0, dtype=np.float32)
+        # Сигнал с абсолютного сэмпла _buffer_start
+        self._buffer = np.zeros(0, dtype=np.int16)
+        self._buffer_start = 0
+        self._frames = 0
+        # Открытая реплика: первый и последний кадр речи
+        self._start: Optional[int] = None
+        self._last_speech = 0
+        # Конец последней отданной реплики (реплики не перекрываются)
+        self._emitted_end = 0
+        
+    def feed(self, samples: np.ndarray) -> List[Tuple[int, np.ndarray]]:
+        """
+        Добавляет сигнал
+        
+        Returns:
+            Закрывшиеся реплики: (начало в сэмплах от начала записи, сигнал)
+        """
+        self._buffer = np.concatenate((self._buffer, samples))
+        available = (self._buffer_start + len(self._buffer)) // self.frame - self._frames
+        if available <= 0:
+            return []
+        offset = self._frames * self.frame - self._buffer_start
+        energy = frame_energy_db(self._buffer[offset:offset + available * self.frame], self.frame)
+        self._history = np.concatenate((self._history, energy))[-NOISE_HISTORY_FRAMES:]
+        noise_floor = float(np.percentile(self._history, 10))
+        threshold = max(noise_floor + settings.VAD_THRESHOLD_DB, MIN_SPEECH_DBFS)
+        
+        closed = []
+        for index, is_speech in enumerate(energy > threshold, start=self._frames):
+            if is_speech:
+                if self._start is None:
+                    self._start = index
+                self._last_speech = index
+            elif self._start is not None and index - self._last_speech >= self.min_silence_frames:
+                closed += self._close(self._last_speech + 1, pad=True)
+                continue
+            if self._start is not None and index + 1 - self._start >= self.max_frames:
+                # Слишком длинная реплика: режем без запаса, следующая продолжит с этого места
+                closed += self._close(index + 1, pad=False)
+        self._frames += available
+        self._trim()
+        return closed
+        
+    def flush(self) -> List[Tuple[int, np.ndarray]]:
+        """Закрывает открытую реплику (конец записи)"""
+        closed = []
+        if self._start is not None:
+            closed = self._close(self._last_speech + 1, pad=True)
+        self._buffer = np.zeros(0, dtype=np.int16)
+        return closed
+        
+    def _close(self, end_frame: int, pad: bool) -> List[Tuple[int, np.ndarray]]:
+        start, self._start = self._start, None
+        if end_frame - start < self.min_speech_frames:
+            # Короткий всплеск — шум
+            return []
+        begin = start * self.frame
+        if begin > self._emitted_end:
+            begin = max(begin - self.padding, self._emitted_end)
+        end = end_frame * self.frame + (self.padding if pad else 0)
+        end = min(end, self._buffer_start + len(self._buffer))
+        self._emitted_end = end
+        return [(begin, self._buffer[begin - self._buffer_start:end - self._buffer_start].copy())]
+        
+    def _trim(self) -> None:
+        """Отбрасывает сигнал, который уже не попадет ни в одну реплику"""
+        keep = self._frames * self.frame if self._start is None else self._start * self.frame
+        keep = max(keep - self.padding, self._emitted_end, self._buffer_start)
+        self._buffer = self._buffer[keep - self._buffer_start:]
+        self._buffer_start = keep
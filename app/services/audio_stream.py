@@ -0,0 +1,594 @@
+"""
+Потоковая обработка аудио окнами фиксированного размера
+
+ffmpeg декодирует файл, сводит каналы и меняет частоту дискретизации по ходу
+чтения, а сигнал приходит окнами NumPy int16. Этапы (VAD, кодирование)
+работают с окнами как генераторы, поэтому память не зависит от длительности
+файла: вместо полного PCM (30 минут стерео 48 кГц — около 350MB) в памяти
+одно окно и одно число энергии на кадр VAD.
+"""
+
+import io
+import os
+import csv
+import shutil
+import logging
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.preprocessing import OffsetMap, TrimStats
+from app.services.audio_preprocess import frame_energy_db, frame_length, offset_map_for, speech_regions
+
+logger = logging.getLogger("speech_service.stream")
+
+# Частота дискретизации OGG Opus
+OPUS_RATE = 48000
+
+# Накладные расходы контейнера Ogg на поток Opus и размер заголовков (оценка размера файла)
+OGG_OVERHEAD = 1.02
+OGG_HEADER_BYTES = 4096
+
+
+def _converter() -> str:
+    """Путь к ffmpeg (тот же, что находит pydub)"""
+    from pydub import AudioSegment
+    return AudioSegment.converter
+
+
+def window_samples(sample_rate: int) -> int:
+    """Размер окна в сэмплах: около STREAM_WINDOW_SECONDS, кратно кадру VAD"""
+    frame = frame_length(sample_rate)
+    return max(int(settings.STREAM_WINDOW_SECONDS * sample_rate) // frame, 1) * frame
+
+
+def iter_pcm_windows(audio_path: str, sample_rate: int, window: Optional[int] = None) -> Iterator[np.ndarray]:
+    """
+    Декодирует файл в моно int16 окнами
+
+    Args:
+        audio_path: Исходный файл (любой формат, который читает ffmpeg)
+        sample_rate: Частота дискретизации результата
+        window: Размер окна в сэмплах (по умолчанию window_samples)
+
+    Yields:
+        Окна сигнала; последнее может быть короче
+    """
+    window = window or window_samples(sample_rate)
+    command = [
+        _converter(), "-v", "error", "-nostdin", "-i", audio_path,
+        "-map", "0:a:0", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"
+    ]
+    # stderr во временный файл: канал, который читают только после stdout, при
+    # большом выводе ffmpeg заполнился бы и остановил декодирование
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+    try:
+        while True:
+            data = process.stdout.read(window * 2)
+            if not data:
+                break
+            if len(data) % 2:
+                data = data[:-1]
+            yield np.frombuffer(data, dtype=np.int16)
+        if process.wait() != 0:
+            raise Exception(f"Ошибка декодирования {audio_path}: {_read_stderr(stderr)}")
+    finally:
+        # Потребитель мог остановиться раньше конца файла
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr.close()
+
+
+def _read_stderr(stderr: BinaryIO) -> str:
+    """Возвращает накопленный во временном файле stderr ffmpeg"""
+    stderr.seek(0)
+    return stderr.read().decode(errors="replace").strip()
+
+
+def scan_energy(windows: Iterable[np.ndarray], sample_rate: int) -> Tuple[np.ndarray, int]:
+    """
+    Энергия кадров VAD по окнам (окна кратны кадру, кроме последнего)
+
+    Returns:
+        Энергия всех кадров и длина сигнала в сэмплах
+    """
+    frame = frame_length(sample_rate)
+    parts: List[np.ndarray] = []
+    total = 0
+    for samples in windows:
+        if len(samples):
+            parts.append(frame_energy_db(samples, frame))
+            total += len(samples)
+    energy = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return energy, total
+
+
+def select_regions(windows: Iterable[np.ndarray], regions: List[Tuple[int, int]]) -> Iterator[np.ndarray]:
+    """Оставляет из потока окон только участки regions (в сэмплах от начала)"""
+    position = 0
+    index = 0
+    for samples in windows:
+        window_end = position + len(samples)
+        while index < len(regions) and regions[index][0] < window_end:
+            begin, end = regions[index]
+            piece = samples[max(begin - position, 0):min(end, window_end) - position]
+            if len(piece):
+                yield piece
+            if end > window_end:
+                break
+            index += 1
+        if index >= len(regions):
+            return
+        position = window_end
+
+
+class EncodingPlan:
+    """Параметры кодирования Opus, выбранные до кодирования"""
+
+    __slots__ = ("bitrate", "sample_rate", "estimated_bytes", "fits")
+
+    def __init__(self, bitrate: int, sample_rate: int, estimated_bytes: Optional[int] = None, fits: bool = True):
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        # Ожидаемый размер файла (None — длительность неизвестна)
+        self.estimated_bytes = estimated_bytes
+        # Помещается ли файл в один запрос; иначе он будет отправлен частями
+        self.fits = fits
+
+    def __repr__(self) -> str:
+        return f"{self.bitrate // 1000} кбит/с, {self.sample_rate // 1000} кГц"
+
+
+def estimate_opus_bytes(duration: float, bitrate: int) -> int:
+    """Ожидаемый размер OGG Opus: поток заданного битрейта, страницы Ogg и заголовки"""
+    return int(duration * bitrate / 8 * OGG_OVERHEAD) + OGG_HEADER_BYTES
+
+
+def plan_encoding(duration: Optional[float], limit: Optional[int] = None) -> EncodingPlan:
+    """
+    Выбирает наибольший битрейт и частоту из OPUS_LADDER, при которых файл
+    помещается в лимит запроса к SpeechKit
+
+    Запрос ограничен и по длительности: файл длиннее UTTERANCE_MAX_SECONDS
+    отправляется частями такой длины, и ступень выбирается по размеру части.
+
+    Args:
+        duration: Длительность отправляемого аудио, сек (None — неизвестна)
+        limit: Лимит размера запроса (по умолчанию STT_MAX_REQUEST_BYTES)
+
+    Returns:
+        План кодирования. Если не помещается даже нижняя ступень, берется
+        верхняя: файл все равно будет отправлен частями, а их качество
+        от размера всего файла не зависит.
+    """
+    limit = limit or settings.STT_MAX_REQUEST_BYTES
+    ladder = settings.OPUS_LADDER
+    if not duration:
+        return EncodingPlan(*ladder[0])
+    fits_duration = duration <= settings.UTTERANCE_MAX_SECONDS
+    request_seconds = min(duration, settings.UTTERANCE_MAX_SECONDS)
+    for bitrate, sample_rate in ladder:
+        if estimate_opus_bytes(request_seconds, bitrate) <= limit * settings.OPUS_SIZE_MARGIN:
+            return EncodingPlan(bitrate, sample_rate, estimate_opus_bytes(duration, bitrate), fits=fits_duration)
+    bitrate, sample_rate = ladder[0]
+    return EncodingPlan(bitrate, sample_rate, estimate_opus_bytes(duration, bitrate), fits=False)
+
+
+class OpusEncoder:
+    """
+    Кодирует поток моно int16 в OGG Opus через stdin ffmpeg
+
+    Результат пишется в файл по пути или в файловый объект (из stdout).
+    """
+
+    def __init__(self, output: Union[str, BinaryIO], sample_rate: int = OPUS_RATE, bitrate: Optional[int] = None):
+        command = [
+            _converter(), "-v", "error", "-nostdin", "-y",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+            "-c:a", "libopus",
+        ]
+        if bitrate:
+            command += ["-b:a", str(bitrate)]
+        command += ["-f", "ogg"]
+        to_path = isinstance(output, str)
+        command.append(output if to_path else "pipe:1")
+
+        self.samples = 0
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL if to_path else subprocess.PIPE,
+            stderr=self._stderr
+        )
+        self._reader = None
+        if not to_path:
+            # Чтение stdout параллельно с записью stdin, иначе оба буфера заполнятся
+            self._reader = threading.Thread(
+                target=shutil.copyfileobj, args=(self._process.stdout, output), daemon=True
+            )
+            self._reader.start()
+
+    def write(self, samples: np.ndarray) -> None:
+        """Передает очередное окно сигнала"""
+        try:
+            self._process.stdin.write(samples.astype(np.int16, copy=False).tobytes())
+        except BrokenPipeError:
+            # ffmpeg завершился раньше времени (например, не открылся файл результата)
+            self._process.wait()
+            errors = _read_stderr(self._stderr)
+            self.abort()
+            raise Exception(f"Ошибка кодирования Opus: {errors}") from None
+        self.samples += len(samples)
+
+    def close(self) -> None:
+        """Завершает кодирование"""
+        self._process.stdin.close()
+        if self._reader is not None:
+            self._reader.join()
+        try:
+            if self._process.wait() != 0:
+                raise Exception(f"Ошибка кодирования Opus: {_read_stderr(self._stderr)}")
+        finally:
+            self._stderr.close()
+
+    def abort(self) -> None:
+        """Прерывает кодирование (при ошибке на предыдущих этапах)"""
+        self._process.kill()
+        self._process.wait()
+        if self._reader is not None:
+            self._reader.join()
+        self._stderr.close()
+
+
+def encode_opus_stream(
+    audio_path: str,
+    trim_silence: bool,
+    output: Union[str, BinaryIO],
+    duration_hint: Optional[float] = None,
+    plan: Optional[EncodingPlan] = None
+) -> Tuple[float, Optional[OffsetMap], Optional[TrimStats]]:
+    """
+    Конвертирует файл в моно OGG Opus с ограниченной памятью
+
+    С вырезанием тишины файл декодируется дважды: первый проход считает
+    энергию кадров, второй передает кодировщику только участки речи. Это
+    дешевле, чем держать весь сигнал в памяти или на диске.
+
+    Битрейт и частота выбираются до кодирования (plan_encoding) по
+    длительности: после VAD она известна точно, без него берется
+    duration_hint. Кодирование всегда одно.
+
+    Args:
+        audio_path: Исходный файл
+        trim_silence: Вырезать тишину (VAD)
+        output: Путь или файловый объект для результата
+        duration_hint: Длительность исходного файла, если известна
+        plan: Параметры кодирования (вместо выбора по длительности)
+
+    Returns:
+        Длительность результата, карта смещений и статистика предобработки
+    """
+    offset_map, trim_stats, regions = None, None, None
+    if trim_silence:
+        energy, total = scan_energy(iter_pcm_windows(audio_path, OPUS_RATE), OPUS_RATE)
+        regions = speech_regions(energy, total, OPUS_RATE)
+        if regions:
+            offset_map = offset_map_for(regions, OPUS_RATE)
+            processed = sum(end - begin for begin, end in regions)
+        else:
+            # Речь не найдена — отправляем как есть, пусть решает распознавание
+            offset_map = OffsetMap()
+            processed = total
+        trim_stats = TrimStats(
+            original_seconds=total / OPUS_RATE,
+            processed_seconds=processed / OPUS_RATE,
+            pcm_bytes_saved=(total - processed) * 2
+        )
+        duration_hint = trim_stats.processed_seconds
+        logger.info(
+            f"VAD: {len(regions)} участков речи, вырезано {trim_stats.audio_seconds_saved:.1f} из "
+            f"{trim_stats.original_seconds:.1f} сек"
+        )
+
+    plan = plan or plan_encoding(duration_hint)
+    logger.info(
+        f"Кодирование Opus: {plan}"
+        + (f", ожидается {plan.estimated_bytes} байт" if plan.estimated_bytes else "")
+        + ("" if plan.fits else " (будет отправлен частями)")
+    )
+
+    rate = plan.sample_rate
+    windows = iter_pcm_windows(audio_path, rate)
+    if regions:
+        # Участки найдены на 48 кГц; частоты лестницы делят 48000 нацело
+        scaled = [(begin * rate // OPUS_RATE, end * rate // OPUS_RATE) for begin, end in regions]
+        windows = select_regions(windows, scaled)
+
+    encoder = OpusEncoder(output, rate, plan.bitrate)
+    try:
+        for samples in windows:
+            encoder.write(samples)
+    except BaseException:
+        encoder.abort()
+        raise
+    encoder.close()
+    return encoder.samples / rate, offset_map, trim_stats
+
+
+def split_ogg(path: str, segment_seconds: float, output_dir: str) -> List[Tuple[str, float, float]]:
+    """
+    Делит OGG Opus на части без перекодирования (сегментный муксер ffmpeg)
+
+    Args:
+        path: Файл OGG Opus
+        segment_seconds: Длительность части
+        output_dir: Каталог для частей
+
+    Returns:
+        Список (путь, начало, конец) в секундах от начала файла
+    """
+    prefix = Path(output_dir) / f"{Path(path).stem}_part"
+    listing = f"{prefix}.csv"
+    command = [
+        _converter(), "-v", "error", "-nostdin", "-y", "-i", path,
+        "-map", "0:a:0", "-c", "copy", "-f", "segment", "-segment_time", f"{segment_seconds:.3f}",
+        "-segment_list", listing, "-segment_list_type", "csv", "-reset_timestamps", "1",
+        f"{prefix}%03d.ogg"
+    ]
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        if process.returncode != 0:
+            raise Exception(f"Ошибка разделения {path}: {process.stderr.decode(errors='replace').strip()}")
+        segments = []
+        with open(listing, "r", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                name, start, end = row[0], float(row[1]), float(row[2])
+                segments.append((str(Path(output_dir) / name), start, end))
+        return segments
+    finally:
+        if os.path.exists(listing):
+            os.remove(listing)
+
+
+def encode_pcm_opus(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Кодирует небольшой участок сигнала (реплику) в OGG Opus"""
+    buffer = io.BytesIO()
+    encoder = OpusEncoder(buffer, sample_rate)
+    try:
+        encoder.write(samples)
+    except BaseException:
+        encoder.abort()
+        raise
+    encoder.close()
+    return buffer.getvalue()
+
+
+def read_wav_region(path: str, start: int, end: int) -> Tuple[np.ndarray, int]:
+    """
+    Читает участок моно WAV pcm_s16le (файлы каналов) без чтения всего файла
+
+    Returns:
+        Сэмплы участка и частота дискретизации
+    """
+    with wave.open(path, "rb") as f:
+        f.setpos(start)
+        return np.frombuffer(f.readframes(end - start), dtype=np.int16), f.getframerate()
+
+
+def wav_rate(path: str) -> int:
+    """Частота дискретизации WAV-файла по заголовку"""
+    with wave.open(path, "rb") as f:
+        return f.getframerate()
+
+
+def wav_frames(path: str) -> int:
+    """Число кадров WAV по заголовку (0 — декодер ничего не записал или файл не WAV)"""
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getnframes()
+    except (wave.Error, EOFError):
+        return 0
+
+
+def mp4_moov_first(head: bytes) -> Optional[bool]:
+    """
+    Идет ли индекс MP4/M4A (moov) перед данными (mdat) по первым байтам файла
+
+    Файл без faststart (moov в конце) ffmpeg из pipe прочитать не может и
+    при этом выходит без ошибки, записав пустой WAV.
+
+    Returns:
+        None — не MP4; False — moov после mdat или за пределами head
+    """
+    if head[4:8] != b"ftyp":
+        return None
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset:offset + 4], "big")
+        kind = head[offset + 4:offset + 8]
+        if kind == b"moov":
+            return True
+        if kind == b"mdat":
+            return False
+        if size == 1:
+            # 64-битный размер блока
+            if offset + 16 > len(head):
+                return False
+            size = int.from_bytes(head[offset + 8:offset + 16], "big")
+        if size < 8:
+            # 0 — блок до конца файла
+            return False
+        offset += size
+    return False
+
+
+class _RecordingEnd:
+    """
+    Признак штатного конца записи по уже прочитанным байтам
+
+    OGG: прочитана страница с флагом конца потока (EOS). WAV: программа
+    записи вписала в заголовок итоговый размер данных, и он прочитан.
+    Для остальных форматов конец определяется только по паузе в росте файла.
+    """
+
+    def __init__(self, head: bytes):
+        self.kind = "ogg" if head.startswith(b"OggS") else "wav" if head[8:12] == b"WAVE" else None
+        self.fed = 0
+        self.eos = False
+        # OGG: накопленный заголовок страницы, сколько байт ее тела осталось и флаг EOS страницы
+        self._page = b""
+        self._skip = 0
+        self._page_eos = False
+
+    def feed(self, data: bytes) -> None:
+        self.fed += len(data)
+        position = 0
+        while self.kind == "ogg" and position < len(data):
+            if self._skip:
+                step = min(self._skip, len(data) - position)
+                self._skip -= step
+                position += step
+                self.eos = self._page_eos and not self._skip
+                continue
+            if len(self._page) < 27:
+                take = min(27 - len(self._page), len(data) - position)
+                self._page += data[position:position + take]
+                position += take
+                if len(self._page) < 27:
+                    return
+                if not self._page.startswith(b"OggS"):
+                    # Поток не удалось разобрать: конец только по паузе
+                    self.kind = None
+                    return
+            need = 27 + self._page[26]
+            take = min(need - len(self._page), len(data) - position)
+            self._page += data[position:position + take]
+            position += take
+            if len(self._page) < need:
+                return
+            self._page_eos = bool(self._page[5] & 0x04)
+            self._skip = sum(self._page[27:need])
+            self.eos = self._page_eos and not self._skip
+            self._page = b""
+
+    def finished(self, path: str) -> bool:
+        """Прочитан ли весь объявленный поток"""
+        if self.kind == "ogg":
+            return self.eos
+        if self.kind == "wav":
+            end = _wav_declared_end(path)
+            return end is not None and self.fed >= end
+        return False
+
+
+def _wav_declared_end(path: str) -> Optional[int]:
+    """Конец данных WAV по заголовку или None, пока там заглушка (0 или 0xFFFFFFFF)"""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    position = 12
+    while position + 8 <= len(head):
+        chunk, size = head[position:position + 4], int.from_bytes(head[position + 4:position + 8], "little")
+        if chunk == b"data":
+            return None if size in (0, 0xFFFFFFFF) else position + 8 + size
+        position += 8 + size + (size & 1)
+    return None
+
+
+def iter_growing_pcm(
+    audio_path: str,
+    sample_rate: int,
+    idle_seconds: float,
+    stop: Optional[threading.Event] = None,
+    poll_seconds: float = 0.2
+) -> Iterator[np.ndarray]:
+    """
+    Декодирует файл, который еще записывается, по мере дописывания
+
+    Новые байты файла передаются в stdin ffmpeg, поэтому каждый кадр
+    читается и декодируется один раз. Запись считается законченной, когда
+    прочитан конец потока (OGG EOS, итоговый размер в заголовке WAV), файл
+    не растет idle_seconds секунд или установлен stop.
+
+    Args:
+        audio_path: Растущий файл (WAV, OGG или другой потоковый формат)
+        sample_rate: Частота дискретизации результата
+        idle_seconds: Пауза в росте файла, после которой запись считается законченной
+        stop: Событие досрочной остановки
+        poll_seconds: Как часто проверять рост файла
+
+    Yields:
+        Моно int16 по мере декодирования (блоки разной длины)
+    """
+    stop = stop or threading.Event()
+    command = [
+        _converter(), "-v", "error", "-nostdin",
+        # Формат определяется по первым байтам, декодированное отдается без буферизации
+        "-probesize", "32768", "-analyzeduration", "0", "-fflags", "nobuffer", "-i", "pipe:0",
+        "-map", "0:a:0", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "-acodec", "pcm_s16le", "-flush_packets", "1", "pipe:1"
+    ]
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+
+    def feed() -> None:
+        end = None
+        last_growth = time.monotonic()
+        try:
+            with open(audio_path, "rb") as f:
+                while not stop.is_set():
+                    data = f.read(1024 * 1024)
+                    if data:
+                        if end is None:
+                            end = _RecordingEnd(data)
+                        end.feed(data)
+                        process.stdin.write(data)
+                        process.stdin.flush()
+                        last_growth = time.monotonic()
+                        continue
+                    if end is not None and end.finished(audio_path):
+                        break
+                    if time.monotonic() - last_growth >= idle_seconds:
+                        logger.info(f"{audio_path} не растет {idle_seconds:g} сек, запись считается законченной")
+                        break
+                    stop.wait(poll_seconds)
+        except (BrokenPipeError, OSError) as e:
+            logger.warning(f"Чтение растущего файла {audio_path} прервано: {e}")
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="growing-file-feeder", daemon=True)
+    feeder.start()
+    try:
+        carry = b""
+        while True:
+            data = os.read(process.stdout.fileno(), 64 * 1024)
+            if not data:
+                break
+            data = carry + data
+            carry = data[len(data) & ~1:]
+            yield np.frombuffer(data[:len(data) & ~1], dtype=np.int16)
+        if process.wait() != 0 and not stop.is_set():
+            raise Exception(f"Ошибка декодирования {audio_path}: {_read_stderr(stderr)}")
+    finally:
+        stop.set()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        feeder.join()
+        process.stdout.close()
+        stderr.close()
@@ -0,0 +1,110 @@
+"""
+Контрольные точки задач между перезапусками
+
+При остановке воркер сохраняет все свои задачи одним JSONL-файлом в
+CHECKPOINT_DIR (запись во временный файл, fsync и переименование). При
+запуске файлы забираются переименованием: если несколько воркеров делят
+каталог, каждый файл получает ровно один из них.
+"""
+
+import os
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger("speech_service.checkpoint")
+
+PREFIX = "tasks-"
+SUFFIX = ".jsonl"
+
+
+class CheckpointStore:
+    """Каталог с контрольными точками задач"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def save(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Атомарно сохраняет задачи воркера
+
+        Returns:
+            Число сохраненных задач
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        name = f"{PREFIX}{time.time_ns()}-{os.getpid()}{SUFFIX}"
+        temp_path = self.root / f".{name}.tmp"
+        count = 0
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        if count:
+            os.replace(temp_path, self.root / name)
+        else:
+            temp_path.unlink()
+        return count
+
+    def claim(self) -> Iterator[Tuple[Path, List[Dict[str, Any]]]]:
+        """
+        Забирает сохраненные файлы задач
+
+        Yields:
+            Путь забранного файла (удалить через discard) и задачи из него
+        """
+        if not self.root.exists():
+            return
+        # Файлы, забранные воркером, который завершился до их обработки
+        # (в контейнере новый процесс может получить тот же PID)
+        for stale in self.root.glob(f"{PREFIX}*{SUFFIX}.*.claimed"):
+            pid = stale.name.split(".")[-2]
+            if pid.isdigit() and (int(pid) == os.getpid() or not _alive(int(pid))):
+                try:
+                    os.rename(stale, stale.with_name(stale.name.split(SUFFIX)[0] + SUFFIX))
+                except FileNotFoundError:
+                    pass
+
+        for path in sorted(self.root.glob(f"{PREFIX}*{SUFFIX}")):
+            claimed = path.with_name(f"{path.name}.{os.getpid()}.claimed")
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Забрал другой воркер
+                continue
+            records = []
+            with open(claimed, "r", encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError as e:
+                        logger.error(f"Поврежденная строка {number} в {path.name}: {e}")
+            yield claimed, records
+
+    @staticmethod
+    def discard(path: Path) -> None:
+        """Удаляет обработанный файл"""
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _alive(pid: int) -> bool:
+    """Существует ли процесс"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Глобальное хранилище контрольных точек
+checkpoint_store = CheckpointStore(settings.CHECKPOINT_DIR)
@@ -0,0 +1,185 @@
+"""
+Кэш сконвертированного аудио
+
+Результат конвертации (OGG Opus и сведения о предобработке) сохраняется на
+диске по ключу из хеша исходного файла и параметров конвертации, но без
+языка: повтор упавшей задачи или тот же файл на другом языке пропускают
+конвертацию. Файлы добавляются жесткой ссылкой и переименованием, поэтому
+каталог могут делить несколько процессов сервиса. Размер ограничен
+CONVERT_CACHE_MAX_BYTES, вытесняются давно не использованные записи (по mtime).
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger("speech_service.convert_cache")
+
+# Меняется вместе с параметрами кодирования в encode_opus_stream: старые записи перестают находиться
+FORMAT_VERSION = "oggopus-mono-3"
+
+AUDIO_SUFFIX = ".ogg"
+META_SUFFIX = ".json"
+
+
+def conversion_key(content_hash: str, trim_silence: bool) -> str:
+    """
+    Ключ записи: исходный файл и все, что влияет на результат конвертации
+
+    Args:
+        content_hash: Хеш содержимого исходного файла
+        trim_silence: Вырезается ли тишина (тогда в ключ входят настройки VAD)
+    """
+    # Выбор битрейта зависит от лимитов запроса и лестницы ступеней
+    params = [
+        FORMAT_VERSION,
+        content_hash,
+        settings.STT_MAX_REQUEST_BYTES,
+        settings.UTTERANCE_MAX_SECONDS,
+        settings.OPUS_LADDER,
+        settings.OPUS_SIZE_MARGIN,
+    ]
+    if trim_silence:
+        params += [
+            "vad",
+            settings.VAD_FRAME_MS,
+            settings.VAD_THRESHOLD_DB,
+            settings.VAD_MIN_SPEECH_MS,
+            settings.VAD_MIN_SILENCE_MS,
+            settings.VAD_PADDING_MS,
+        ]
+    return hashlib.sha256("|".join(map(str, params)).encode("utf-8")).hexdigest()
+
+
+class ConversionCache:
+    """Дисковый LRU-кэш результатов конвертации"""
+
+    def __init__(self, root: str, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        # Оценка размера каталога этим процессом; точный размер считается, когда оценка превышает лимит
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _paths(self, key: str):
+        folder = self.root / key[:2]
+        return folder / f"{key}{AUDIO_SUFFIX}", folder / f"{key}{META_SUFFIX}"
+
+    def get(self, key: str, dest: str) -> Optional[Dict[str, Any]]:
+        """
+        Достает запись в файл dest (жесткая ссылка или копия)
+
+        Returns:
+            Сведения о конвертации (без пути) или None, если записи нет
+        """
+        audio_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            _link_or_copy(audio_path, dest)
+        except (OSError, ValueError):
+            # Нет записи или ее как раз вытеснили
+            return None
+        # Отметка использования для вытеснения
+        for path in (audio_path, meta_path):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return meta
+
+    def put(self, key: str, path: str, meta: Dict[str, Any]) -> None:
+        """
+        Сохраняет результат конвертации
+
+        Args:
+            key: Ключ conversion_key
+            path: Сконвертированный файл (остается на месте)
+            meta: Сведения о конвертации без пути
+        """
+        audio_path, meta_path = self._paths(key)
+        audio_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        audio_temp = audio_path.with_name(audio_path.name + suffix)
+        meta_temp = meta_path.with_name(meta_path.name + suffix)
+        try:
+            _link_or_copy(Path(path), str(audio_temp))
+            with open(meta_temp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            # Сначала аудио: запись видна, только когда появились метаданные
+            os.replace(audio_temp, audio_path)
+            os.replace(meta_temp, meta_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить конвертацию в кэш: {e}")
+            for temp in (audio_temp, meta_temp):
+                _unlink(temp)
+            return
+
+        with self._lock:
+            if self._size is not None:
+                self._size += audio_path.stat().st_size + meta_path.stat().st_size
+            if self._size is None or self._size > self.max_bytes:
+                self._size = self._evict()
+
+    def _evict(self) -> int:
+        """Удаляет давно не использованные записи до 90% лимита, возвращает размер каталога"""
+        entries = []
+        total = 0
+        for audio_path in self.root.glob(f"*/*{AUDIO_SUFFIX}"):
+            meta_path = audio_path.with_suffix(META_SUFFIX)
+            try:
+                stat = audio_path.stat()
+                size = stat.st_size + meta_path.stat().st_size
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, size, audio_path, meta_path))
+            total += size
+        if total <= self.max_bytes:
+            return total
+
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, audio_path, meta_path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= target:
+                break
+            # Сначала метаданные: запись перестает находиться раньше, чем пропадет аудио
+            _unlink(meta_path)
+            _unlink(audio_path)
+            total -= size
+            evicted += 1
+        logger.info(f"Кэш конвертации: вытеснено записей {evicted}, размер {total / 2**20:.1f}MB")
+        return total
+
+
+def _link_or_copy(source: Path, dest: str) -> None:
+    """Жесткая ссылка (без копирования данных), на другой файловой системе — копия"""
+    try:
+        os.link(source, dest)
+    except OSError as e:
+        if not source.exists():
+            raise
+        logger.debug(f"Жесткая ссылка невозможна ({e}), копирую")
+        shutil.copyfile(source, dest)
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+# Глобальный кэш конвертации
+conversion_cache = ConversionCache(
+    settings.CONVERT_CACHE_DIR,
+    settings.CONVERT_CACHE_MAX_BYTES,
+    enabled=settings.CONVERT_CACHE_ENABLED
+)
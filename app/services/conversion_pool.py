@@ -0,0 +1,144 @@
+"""
+Пул процессов конвертации аудио в OGG Opus
+
+Декодирование, вырезание тишины и кодирование (потоково, окнами — см.
+audio_stream) выполняются в долгоживущих процессах (по числу ядер), а не
+в потоках API-процесса под GIL. Задания передаются через очередь
+ProcessPoolExecutor; процесс сам пишет закодированный файл по указанному
+пути, так что между процессами передаются только пути и метаданные, а
+не сам файл.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.preprocessing import OffsetMap, TrimStats
+
+logger = logging.getLogger("speech_service.convert")
+
+# Результат задания в процессе: длительность, карта смещений и
+# статистика предобработки (в виде для pickle)
+JobResult = Tuple[float, Optional[List[List[float]]], Optional[Dict[str, Any]]]
+
+
+def _convert_job(
+    audio_path: str,
+    trim_silence: bool,
+    output_path: str,
+    duration_hint: Optional[float]
+) -> JobResult:
+    """Задание процесса: конвертирует файл в output_path"""
+    from app.services.audio_stream import encode_opus_stream
+    
+    duration, offset_map, trim_stats = encode_opus_stream(audio_path, trim_silence, output_path, duration_hint)
+    return (
+        duration,
+        offset_map.to_list() if offset_map is not None else None,
+        trim_stats.to_dict() if trim_stats is not None else None
+    )
+
+
+def _warm_job() -> int:
+    """Задание прогрева: загружает модули обработки аудио в процессе"""
+    from pydub import AudioSegment  # noqa: F401
+    from app.services import audio_stream  # noqa: F401
+    return os.getpid()
+
+
+def _discard(output_path: str, future: Future) -> None:
+    """Удаляет файл задания, результат которого уже никто не ждет"""
+    try:
+        os.remove(output_path)
+    except FileNotFoundError:
+        pass
+
+
+class ConversionPool:
+    """Долгоживущие процессы конвертации"""
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Пул процессов (запускается при первом задании)"""
+        if self._executor is None:
+            # spawn: API-процесс многопоточный, fork в нем небезопасен
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def convert(
+        self,
+        audio_path: str,
+        trim_silence: bool,
+        output_path: str,
+        duration_hint: Optional[float] = None
+    ) -> Tuple[float, Optional[OffsetMap], Optional[TrimStats]]:
+        """
+        Конвертирует файл в процессе пула
+
+        Args:
+            audio_path: Исходный файл
+            trim_silence: Вырезать тишину (VAD)
+            output_path: Куда записать OGG Opus (пишет процесс пула)
+            duration_hint: Длительность исходного файла (для выбора битрейта)
+
+        Returns:
+            Длительность результата, карта смещений и статистика предобработки
+        """
+        job = (_convert_job, audio_path, trim_silence, output_path, duration_hint)
+        try:
+            future = self.executor.submit(*job)
+        except BrokenProcessPool:
+            self._executor = None
+            future = self.executor.submit(*job)
+
+        try:
+            duration, offsets, stats = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Процесс доделает задание, файл удаляется по его завершении
+            future.add_done_callback(partial(_discard, output_path))
+            raise
+        except BrokenProcessPool:
+            # Процесс завершился аварийно (например, по нехватке памяти): пул пересоздается
+            self._executor = None
+            raise Exception("Процесс конвертации аварийно завершился")
+
+        return (
+            duration,
+            OffsetMap.from_list(offsets) if offsets is not None else None,
+            TrimStats.from_dict(stats) if stats is not None else None
+        )
+
+    async def warmup(self) -> None:
+        """Запускает все процессы и загружает в них модули обработки аудио"""
+        started = time.perf_counter()
+        pids = await asyncio.gather(*(
+            asyncio.wrap_future(self.executor.submit(_warm_job)) for _ in range(self.workers)
+        ))
+        logger.info(
+            f"Процессов конвертации: {len(set(pids))} из {self.workers}, "
+            f"запуск {time.perf_counter() - started:.2f} сек"
+        )
+
+    def shutdown(self) -> None:
+        """Останавливает процессы: задания в очереди отменяются, выполняющиеся дорабатывают"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальный пул процессов конвертации
+conversion_pool = ConversionPool(settings.CONVERT_WORKERS)
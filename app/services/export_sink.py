@@ -0,0 +1,404 @@
+"""
+Выгрузка готовых транскриптов для аналитики
+
+Завершенные задачи копятся в памяти и пачками дописываются в файлы
+EXPORT_DIR: NDJSON (по умолчанию) или Parquet. Вместо опроса каждой задачи
+аналитика читает файлы последовательно либо запрашивает диапазон времени
+через GET /api/v1/export или CLI:
+
+    python -m app.services.export_sink --since 2024-01-15T00:00 --until 2024-01-16T00:00 -o day.ndjson
+
+Файл дописывается до EXPORT_ROTATE_BYTES или EXPORT_ROTATE_SECONDS, затем
+закрывается и переименовывается в transcripts-<первая>-<последняя>-<pid>.<формат>
+по времени завершения задач: выборка по диапазону открывает только
+пересекающиеся файлы. Открытый файл называется так же с суффиксом .inprogress.
+
+Строка NDJSON начинается с completed_at и client_id, поэтому при выборке
+по диапазону вся запись не разбирается. В Parquet фрагменты хранятся
+JSON-строкой в колонке segments; открытый Parquet-файл без футера не читается,
+поэтому выгрузка диапазона закрывает его.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.models.task import TaskRecord
+
+logger = logging.getLogger("speech_service.export")
+
+FILE_PREFIX = "transcripts-"
+IN_PROGRESS = ".inprogress"
+TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+_decoder = json.JSONDecoder()
+
+
+def task_record(task: TaskRecord) -> Dict[str, Any]:
+    """
+    Запись выгрузки для завершенной задачи
+
+    Порядок ключей важен: completed_at и client_id читаются из начала строки.
+    """
+    return {
+        "completed_at": task.completed_at,
+        "client_id": task.client_id,
+        "task_id": task.id,
+        "language": task.language,
+        "priority": task.priority.value,
+        "audio_duration": task.audio_duration,
+        "created_at": task.created_at,
+        "started_at": task.started_at,
+        "wait_seconds": _elapsed(task.created_at, task.started_at),
+        "processing_seconds": _elapsed(task.started_at, task.completed_at),
+        "text": task.result,
+        "segments": [segment.to_dict() for segment in task.iter_segments()],
+    }
+
+
+def _elapsed(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    return round(end - start, 3) if start is not None and end is not None else None
+
+
+def _parse_header(line: bytes) -> Tuple[float, str]:
+    """completed_at и client_id из начала строки NDJSON без разбора всей записи"""
+    text = line[:512].decode("utf-8", errors="ignore")
+    completed_at, position = _decoder.raw_decode(text, len('{"completed_at":'))
+    client_id, _ = _decoder.raw_decode(text, position + len(',"client_id":'))
+    return completed_at, client_id
+
+
+def _file_bounds(path: Path) -> Optional[Tuple[float, float]]:
+    """Диапазон времени закрытого файла по имени (None — файл открыт)"""
+    if path.name.endswith(IN_PROGRESS):
+        return None
+    try:
+        _, first, last, _ = path.name.split(".")[0].split("-")
+        return (
+            datetime.strptime(first, TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp(),
+            # Имя с точностью до секунды: последняя секунда входит целиком
+            datetime.strptime(last, TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp() + 1,
+        )
+    except ValueError:
+        return None
+
+
+def _stamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(TIME_FORMAT)
+
+
+class NdjsonWriter:
+    """Дозапись записей в NDJSON"""
+
+    extension = ".ndjson"
+
+    def __init__(self, path: Path):
+        self._file = open(path, "ab")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        lines = [json.dumps(record, ensure_ascii=False, separators=(",", ":")) for record in records]
+        self._file.write(("\n".join(lines) + "\n").encode("utf-8"))
+        self._file.flush()
+
+    def size(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """Запись пачек в Parquet (одна пачка — одна группа строк)"""
+
+    extension = ".parquet"
+
+    def __init__(self, path: Path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._path = path
+        self._schema = pa.schema([
+            ("completed_at", pa.float64()),
+            ("client_id", pa.string()),
+            ("task_id", pa.string()),
+            ("language", pa.string()),
+            ("priority", pa.string()),
+            ("audio_duration", pa.float64()),
+            ("created_at", pa.float64()),
+            ("started_at", pa.float64()),
+            ("wait_seconds", pa.float64()),
+            ("processing_seconds", pa.float64()),
+            ("text", pa.string()),
+            ("segments", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(str(path), self._schema, compression="zstd")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        rows = [
+            {**record, "segments": json.dumps(record["segments"], ensure_ascii=False, separators=(",", ":"))}
+            for record in records
+        ]
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def size(self) -> int:
+        return self._path.stat().st_size
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+WRITERS = {"ndjson": NdjsonWriter, "parquet": ParquetWriter}
+
+
+class ExportSink:
+    """Пакетная выгрузка завершенных задач с ротацией файлов"""
+
+    def __init__(self, root: str, export_format: str = "ndjson"):
+        if export_format not in WRITERS:
+            raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+        self.root = Path(root)
+        self.format = export_format
+        self.enabled = settings.EXPORT_ENABLED
+        self._pending: List[TaskRecord] = []
+        # Запись в файлы идет в одном потоке, по порядку пачек
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._writer = None
+        self._path: Optional[Path] = None
+        self._opened_at = 0.0
+        self._first: Optional[float] = None
+        self._last: Optional[float] = None
+
+    def add(self, task: TaskRecord) -> None:
+        """Ставит завершенную задачу в очередь на выгрузку"""
+        if not self.enabled:
+            return
+        self._pending.append(task)
+        if len(self._pending) >= settings.EXPORT_BATCH_SIZE and self._wake is not None:
+            self._wake.set()
+
+    def start(self) -> None:
+        """Запускает фоновую запись пачек (в цикле событий приложения)"""
+        if not self.enabled or self._flusher is not None:
+            return
+        self._wake = asyncio.Event()
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Дописывает очередь и закрывает текущий файл"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush(rotate=True)
+
+    async def flush(self, rotate: bool = False) -> None:
+        """
+        Записывает накопленные задачи
+
+        Args:
+            rotate: Закрыть текущий файл после записи
+        """
+        batch, self._pending = self._pending, []
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, batch, rotate)
+
+    async def flush_for_export(self, since: float, until: float) -> None:
+        """
+        Записывает накопленные задачи перед выгрузкой [since, until)
+
+        Открытый Parquet-файл без итогового заголовка не читается, поэтому
+        закрывается, только если в нем есть задачи из диапазона: выгрузка
+        прошлых периодов и повторная выгрузка без новых задач файлов не плодят.
+        """
+        batch, self._pending = self._pending, []
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write_for_export, batch, since, until)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.EXPORT_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка выгрузки транскриптов: {e}")
+
+    def _write(self, batch: List[TaskRecord], rotate: bool = False) -> None:
+        """Пишет пачку в текущий файл, при необходимости начиная новый (в потоке выгрузки)"""
+        if self._writer is not None and (
+            self._writer.size() >= settings.EXPORT_ROTATE_BYTES
+            or time.time() - self._opened_at >= settings.EXPORT_ROTATE_SECONDS
+        ):
+            self._rotate()
+
+        if batch:
+            records = []
+            for task in batch:
+                try:
+                    records.append(task_record(task))
+                except Exception as e:
+                    logger.error(f"Задача {task.id} не выгружена: {e}")
+            if records:
+                if self._writer is None:
+                    self._open()
+                self._writer.write(records)
+                times = [record["completed_at"] for record in records]
+                self._first = min(times + ([self._first] if self._first is not None else []))
+                self._last = max(times + ([self._last] if self._last is not None else []))
+
+        if rotate:
+            self._rotate()
+
+    def _write_for_export(self, batch: List[TaskRecord], since: float, until: float) -> None:
+        self._write(batch)
+        if self.format == "parquet" and self._first is not None and self._first < until and self._last >= since:
+            self._rotate()
+
+    def _open(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._opened_at = time.time()
+        writer_class = WRITERS[self.format]
+        self._path = self.root / f"{FILE_PREFIX}{_stamp(self._opened_at)}-{os.getpid()}{writer_class.extension}{IN_PROGRESS}"
+        self._writer = writer_class(self._path)
+        self._first = self._last = None
+
+    def _rotate(self) -> None:
+        """Закрывает текущий файл и дает ему имя с диапазоном времени"""
+        if self._writer is None:
+            return
+        self._writer.close()
+        extension = self._writer.extension
+        self._writer = None
+        if self._first is None:
+            self._path.unlink()
+        else:
+            final = self.root / f"{FILE_PREFIX}{_stamp(self._first)}-{_stamp(self._last)}-{os.getpid()}{extension}"
+            self._path.rename(final)
+            logger.info(f"Файл выгрузки закрыт: {final}")
+        self._prune()
+
+    def _prune(self) -> None:
+        """Удаляет закрытые файлы старше EXPORT_RETENTION_DAYS"""
+        if settings.EXPORT_RETENTION_DAYS <= 0:
+            return
+        cutoff = time.time() - settings.EXPORT_RETENTION_DAYS * 86400
+        for path in self.root.glob(f"{FILE_PREFIX}*"):
+            bounds = _file_bounds(path)
+            if bounds and bounds[1] < cutoff:
+                path.unlink()
+                logger.info(f"Удален старый файл выгрузки {path}")
+
+    def files(self, since: float, until: float) -> List[Path]:
+        """Файлы, которые могут содержать задачи, завершенные в [since, until)"""
+        selected = []
+        for path in sorted(self.root.glob(f"{FILE_PREFIX}*")):
+            bounds = _file_bounds(path)
+            if bounds is None or (bounds[0] < until and bounds[1] > since):
+                selected.append(path)
+        return selected
+
+    def iter_range(self, since: float, until: float, client_id: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Строки NDJSON задач, завершенных в [since, until)
+
+        Args:
+            since: Начало диапазона (unix-время)
+            until: Конец диапазона (unix-время, не включительно)
+            client_id: Только задачи этого клиента
+
+        Yields:
+            Строки NDJSON с переводом строки
+        """
+        for path in self.files(since, until):
+            if ".parquet" in path.name:
+                if path.name.endswith(IN_PROGRESS):
+                    continue
+                yield from _iter_parquet(path, since, until, client_id)
+                continue
+            with open(path, "rb") as f:
+                for line in f:
+                    # Недописанная строка (запись прервана) пропускается
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        completed_at, owner = _parse_header(line)
+                    except ValueError:
+                        continue
+                    if since <= completed_at < until and (client_id is None or owner == client_id):
+                        yield line
+
+
+def _iter_parquet(path: Path, since: float, until: float, client_id: Optional[str]) -> Iterator[bytes]:
+    """Строки NDJSON из Parquet-файла с фильтром по группам строк"""
+    import pyarrow.parquet as pq
+
+    filters = [("completed_at", ">=", since), ("completed_at", "<", until)]
+    if client_id is not None:
+        filters.append(("client_id", "=", client_id))
+    table = pq.read_table(str(path), filters=filters)
+    for batch in table.to_batches():
+        for row in batch.to_pylist():
+            segments = row.pop("segments")
+            # Фрагменты уже в JSON: вставляем строкой, без повторной сериализации
+            head = json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+            yield f'{head[:-1]},"segments":{segments}}}\n'.encode("utf-8")
+
+
+# Глобальный экземпляр выгрузки
+export_sink = ExportSink(settings.EXPORT_DIR, settings.EXPORT_FORMAT)
+
+
+def _parse_time(value: str) -> float:
+    """unix-время или ISO 8601 (без зоны — UTC)"""
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def main():
+    """Выгрузка диапазона из командной строки (читает EXPORT_DIR напрямую)"""
+    parser = argparse.ArgumentParser(description="Выгрузка транскриптов за период в NDJSON")
+    parser.add_argument("--since", required=True, help="Начало: ISO 8601 или unix-время")
+    parser.add_argument("--until", default=None, help="Конец (не включительно), по умолчанию — сейчас")
+    parser.add_argument("--client", default=None, help="Только задачи клиента")
+    parser.add_argument("--dir", default=settings.EXPORT_DIR, help="Каталог выгрузки")
+    parser.add_argument("-o", "--output", default="-", help="Файл результата (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    since = _parse_time(args.since)
+    until = _parse_time(args.until) if args.until else time.time()
+    sink = ExportSink(args.dir, settings.EXPORT_FORMAT)
+
+    output = os.fdopen(os.dup(1), "wb") if args.output == "-" else open(args.output, "wb")
+    count = 0
+    with output:
+        for line in sink.iter_range(since, until, args.client):
+            output.write(line)
+            count += 1
+    print(f"Выгружено задач: {count}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
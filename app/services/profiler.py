@@ -0,0 +1,248 @@
+"""
+Профилирование работающего сервиса без перезапуска
+
+SamplingProfiler из отдельного потока с заданной частотой снимает стеки
+всех потоков процесса (sys._current_frames): event loop, пул исполнителей,
+потоки чтения. Результат — свернутые стеки (collapsed, "a;b;c N"), которые
+принимают flamegraph.pl, speedscope и inferno. Процессы конвертации
+(CONVERT_PROCESSES) в выборку не попадают.
+
+Выборка — обход стеков под GIL без трассировки вызовов: код сервиса не
+замедляется между выборками, а при 100 Гц на выборки уходит несколько
+процентов одного ядра (время — в заголовке X-Profile-Overhead-Seconds).
+Одновременно выполняется только одно профилирование.
+
+describe_tasks() показывает выполняющиеся корутины event loop: цепочку
+await до самой глубокой и этап конвейера задачи, определенный по ней.
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+import linecache
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+# Этап конвейера по имени корутины (ищется от самой глубокой к внешней)
+PIPELINE_STAGES = {
+    "_negotiate": "recognize",
+    "_send_part": "recognize",
+    "_send_parts": "recognize",
+    "_recognize_direct": "recognize",
+    "_recognize_piece": "recognize",
+    "send": "recognize",
+    "recognize_file": "recognize",
+    "_convert_cached": "convert",
+    "_convert_to_ogg": "convert",
+    "_transcribe_channel": "channels",
+    "transcribe_channels": "channels",
+    "transcribe_audio": "transcribe",
+    "follow_file": "follow",
+    "_process_task": "task",
+}
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Номер потока пула в имени: потоки одного пула сворачиваются в один корень
+_WORKER_SUFFIX = re.compile(r"_\d+$")
+
+
+class ProfilerBusy(Exception):
+    """Профилирование уже выполняется"""
+
+
+class SamplingProfiler:
+    """Выборочный профилировщик всех потоков процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Подписи функций по объекту кода: строятся один раз
+        self._labels: Dict[Any, str] = {}
+
+    async def profile(self, seconds: float, interval: float) -> "Profile":
+        """
+        Снимает стеки seconds секунд с периодом interval, не блокируя event loop
+
+        Raises:
+            ProfilerBusy: Если профилирование уже идет
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("Профилирование уже выполняется")
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        loop_thread = threading.get_ident()
+
+        def run() -> None:
+            try:
+                result = self._sample(seconds, interval, loop_thread)
+                loop.call_soon_threadsafe(done.set_result, result)
+            except BaseException as e:
+                loop.call_soon_threadsafe(done.set_exception, e)
+            finally:
+                self._lock.release()
+
+        # Отдельный поток: пул исполнителей сам попадает в выборку и не должен ею заниматься
+        threading.Thread(target=run, name="debug-profiler", daemon=True).start()
+        return await done
+
+    def _sample(self, seconds: float, interval: float, loop_thread: int) -> "Profile":
+        own = threading.get_ident()
+        depth = settings.DEBUG_PROFILE_MAX_DEPTH
+        stacks: Counter = Counter()
+        samples = 0
+        names: Dict[int, str] = {}
+        started = time.perf_counter()
+        deadline = started + seconds
+        spent = 0.0
+        next_at = started
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            frames = sys._current_frames()
+            if not names.keys() >= frames.keys():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < depth:
+                    labels.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if ident == loop_thread:
+                    root = "event-loop"
+                else:
+                    root = _WORKER_SUFFIX.sub("", names.get(ident, f"thread-{ident}"))
+                labels.append(root)
+                stacks[";".join(reversed(labels))] += 1
+            samples += 1
+            spent += time.perf_counter() - now
+            # Период держится по расписанию, а не от конца выборки: частота не плывет под нагрузкой
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.perf_counter()
+        return Profile(stacks, samples, time.perf_counter() - started, spent)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+
+class Profile:
+    """Результат профилирования"""
+
+    __slots__ = ("stacks", "samples", "seconds", "overhead")
+
+    def __init__(self, stacks: Counter, samples: int, seconds: float, overhead: float):
+        self.stacks = stacks
+        self.samples = samples
+        self.seconds = seconds
+        # Время, потраченное на сами выборки
+        self.overhead = overhead
+
+    def collapsed(self) -> str:
+        """Свернутые стеки, самые частые первыми"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def describe_tasks(scheduler_jobs: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Выполняющиеся корутины текущего event loop
+
+    Args:
+        scheduler_jobs: Задачи планировщика по ID (running): для корутин
+            задач распознавания добавляются ID, клиент и полоса
+
+    Returns:
+        Описания корутин, дольше выполняющиеся задачи первыми
+    """
+    jobs_by_handle = {job.handle: (task_id, job) for task_id, job in (scheduler_jobs or {}).items()}
+    now = time.monotonic()
+    current = asyncio.current_task()
+    described = []
+    for task in asyncio.all_tasks():
+        if task is current:
+            continue
+        frames = _await_chain(task.get_coro())
+        info: Dict[str, Any] = {
+            "name": task.get_name(),
+            "stage": _stage(frames),
+            "where": _where(frames),
+            "stack": [f"{frame.f_code.co_name} ({_short_path(frame.f_code.co_filename)}:{frame.f_lineno})" for frame in frames],
+        }
+        found = jobs_by_handle.get(task)
+        if found is not None:
+            task_id, job = found
+            info.update(
+                task_id=task_id,
+                client_id=job.client_id,
+                priority=job.lane.priority.value,
+                audio_seconds=round(job.cost, 1),
+                running_seconds=round(now - job.started_at, 1) if job.started_at else None,
+            )
+        described.append(info)
+    described.sort(key=lambda info: -(info.get("running_seconds") or 0.0))
+    return described
+
+
+def describe_threads() -> List[Dict[str, str]]:
+    """Где сейчас находится каждый поток процесса"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    threads = []
+    for ident, frame in sys._current_frames().items():
+        code = frame.f_code
+        threads.append({
+            "name": names.get(ident, f"thread-{ident}"),
+            "where": f"{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})",
+        })
+    return sorted(threads, key=lambda thread: thread["name"])
+
+
+def _await_chain(coro) -> list:
+    """Кадры цепочки await от корутины задачи до самой глубокой"""
+    frames = []
+    while coro is not None and len(frames) < settings.DEBUG_PROFILE_MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+def _stage(frames: list) -> Optional[str]:
+    for frame in reversed(frames):
+        if frame.f_code.co_filename.startswith(_APP_DIR):
+            stage = PIPELINE_STAGES.get(frame.f_code.co_name)
+            if stage is not None:
+                return stage
+    return None
+
+
+def _where(frames: list) -> Optional[str]:
+    """Самое глубокое место в коде сервиса и его строка"""
+    for frame in reversed(frames):
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR):
+            line = linecache.getline(filename, frame.f_lineno).strip()
+            return f"{_short_path(filename)}:{frame.f_lineno} {line}"
+    return None
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_APP_DIR):
+        return "app" + filename[len(_APP_DIR):]
+    return os.path.basename(filename)
+
+
+# Глобальный экземпляр
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,327 @@
+"""
+Лимиты и квоты клиентов API
+
+Для каждого API-ключа (тенанта) действуют:
+
+* token bucket на частоту загрузок (RATE_LIMIT_RPS, RATE_LIMIT_BURST);
+* ограничение числа одновременных задач (в очереди и в обработке);
+* суточная квота секунд аудио (по UTC).
+
+Состояние хранится в памяти процесса или, если задан RATE_LIMIT_REDIS_URL,
+в Redis — тогда лимиты общие для всех воркеров. Каждая проверка — O(1):
+несколько операций со словарем или один вызов Lua-скрипта. Задачи пока
+живут в памяти воркера, поэтому при его падении счетчик одновременных
+задач в Redis может разойтись с реальным до истечения ключа.
+"""
+
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.models.schemas import Priority
+
+logger = logging.getLogger("speech_service.rate_limiter")
+
+DAY_SECONDS = 86400
+
+
+_PRIORITY_ORDER = list(Priority)
+
+
+class Tenant:
+    """Клиент API, его лимиты и доступные полосы приоритета"""
+
+    __slots__ = ("name", "rps", "burst", "max_concurrent", "daily_audio_seconds", "priority", "max_priority")
+
+    def __init__(
+        self,
+        name: str,
+        rps: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrent: Optional[int] = None,
+        daily_audio_seconds: Optional[float] = None,
+        priority: Optional[str] = None,
+        max_priority: Optional[str] = None
+    ):
+        self.name = name
+        self.rps = settings.RATE_LIMIT_RPS if rps is None else rps
+        self.burst = settings.RATE_LIMIT_BURST if burst is None else burst
+        self.max_concurrent = settings.RATE_LIMIT_MAX_CONCURRENT if max_concurrent is None else max_concurrent
+        self.daily_audio_seconds = (
+            settings.RATE_LIMIT_DAILY_AUDIO_SECONDS if daily_audio_seconds is None else daily_audio_seconds
+        )
+        self.priority = Priority(priority or settings.DEFAULT_PRIORITY)
+        # Полоса по умолчанию всегда доступна клиенту
+        top = Priority(max_priority or settings.MAX_PRIORITY)
+        self.max_priority = min(top, self.priority, key=_PRIORITY_ORDER.index)
+
+    def allows(self, priority: Priority) -> bool:
+        """Доступна ли клиенту полоса приоритета"""
+        return _PRIORITY_ORDER.index(priority) >= _PRIORITY_ORDER.index(self.max_priority)
+
+
+class RateLimitExceeded(Exception):
+    """Превышен лимит или квота клиента"""
+
+    def __init__(self, message: str, retry_after: float, headers: Optional[Dict[str, str]] = None):
+        self.retry_after = max(int(retry_after + 0.999), 1)
+        self.headers = {**(headers or {}), "Retry-After": str(self.retry_after)}
+        super().__init__(message)
+
+
+def _seconds_to_midnight(now: float) -> float:
+    """Секунд до конца текущих суток (UTC)"""
+    return DAY_SECONDS - now % DAY_SECONDS
+
+
+def _rate_headers(tenant: Tenant, remaining: float, reset: float) -> Dict[str, str]:
+    """Заголовки RateLimit-* для ответа"""
+    return {
+        "RateLimit-Limit": str(tenant.burst),
+        "RateLimit-Remaining": str(max(int(remaining), 0)),
+        "RateLimit-Reset": str(max(int(reset + 0.999), 0)),
+    }
+
+
+class MemoryBackend:
+    """Состояние лимитов в памяти процесса"""
+
+    # При большем числе корзин (анонимные клиенты по IP) удаляются давно не обращавшиеся
+    MAX_BUCKETS = 100000
+
+    def __init__(self):
+        # tenant -> [токены, время обновления], от давно не обращавшихся к недавним
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.active: Dict[str, int] = {}
+        # tenant -> [номер суток, секунд аудио]
+        self.usage: Dict[str, list] = {}
+
+    async def take_token(self, tenant: Tenant, now: float) -> Tuple[bool, float]:
+        """Берет токен из корзины; возвращает (успех, остаток токенов)"""
+        bucket = self.buckets.get(tenant.name)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_BUCKETS:
+                # O(1) и жесткая граница памяти: давно не обращавшийся клиент
+                # при следующем запросе получит полную корзину
+                self.buckets.popitem(last=False)
+            bucket = self.buckets[tenant.name] = [float(tenant.burst), now]
+        else:
+            self.buckets.move_to_end(tenant.name)
+        tokens = min(tenant.burst, bucket[0] + (now - bucket[1]) * tenant.rps)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return False, tokens
+        bucket[0] = tokens - 1.0
+        return True, bucket[0]
+
+    async def acquire_slot(self, tenant: Tenant) -> bool:
+        """Занимает место под одновременную задачу"""
+        active = self.active.get(tenant.name, 0)
+        if tenant.max_concurrent and active >= tenant.max_concurrent:
+            return False
+        self.active[tenant.name] = active + 1
+        return True
+
+    async def release_slot(self, name: str) -> None:
+        """Освобождает место"""
+        active = self.active.get(name, 0) - 1
+        if active > 0:
+            self.active[name] = active
+        else:
+            self.active.pop(name, None)
+
+    async def charge(self, tenant: Tenant, seconds: float, now: float) -> Tuple[bool, float]:
+        """Списывает секунды аудио из суточной квоты; возвращает (успех, израсходовано)"""
+        day = int(now // DAY_SECONDS)
+        usage = self.usage.get(tenant.name)
+        if usage is None or usage[0] != day:
+            usage = self.usage[tenant.name] = [day, 0.0]
+        if tenant.daily_audio_seconds and usage[1] + seconds > tenant.daily_audio_seconds:
+            return False, usage[1]
+        usage[1] += seconds
+        return True, usage[1]
+
+    async def refund(self, name: str, seconds: float, now: float) -> None:
+        """Возвращает секунды в квоту (задача не была принята)"""
+        usage = self.usage.get(name)
+        if usage is not None and usage[0] == int(now // DAY_SECONDS):
+            usage[1] = max(usage[1] - seconds, 0.0)
+
+
+# Token bucket: KEYS[1] — корзина; ARGV: rps, burst, now
+_TAKE_TOKEN = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rps, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rps)
+local ok = 0
+if tokens >= 1 then tokens = tokens - 1; ok = 1 end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / math.max(rps, 0.001)) + 60)
+return {ok, tostring(tokens)}
+"""
+
+# Счетчик одновременных задач: KEYS[1]; ARGV: лимит (0 — без лимита)
+_ACQUIRE_SLOT = """
+local limit = tonumber(ARGV[1])
+local active = tonumber(redis.call('GET', KEYS[1]) or '0')
+if limit > 0 and active >= limit then return 0 end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], 86400)
+return 1
+"""
+
+_RELEASE_SLOT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then redis.call('DECR', KEYS[1]) end
+return 1
+"""
+
+# Суточная квота: KEYS[1]; ARGV: секунды, лимит (0 — без лимита)
+_CHARGE = """
+local seconds, limit = tonumber(ARGV[1]), tonumber(ARGV[2])
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if limit > 0 and used + seconds > limit then return {0, tostring(used)} end
+used = redis.call('INCRBYFLOAT', KEYS[1], seconds)
+redis.call('EXPIRE', KEYS[1], 172800)
+return {1, tostring(used)}
+"""
+
+
+class RedisBackend:
+    """Состояние лимитов в Redis (общее для всех воркеров)"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = "speech:rl:"
+        self._take_token = self.client.register_script(_TAKE_TOKEN)
+        self._acquire_slot = self.client.register_script(_ACQUIRE_SLOT)
+        self._release_slot = self.client.register_script(_RELEASE_SLOT)
+        self._charge = self.client.register_script(_CHARGE)
+
+    def _key(self, name: str, kind: str) -> str:
+        return f"{self.prefix}{name}:{kind}"
+
+    async def take_token(self, tenant: Tenant, now: float) -> Tuple[bool, float]:
+        ok, tokens = await self._take_token(
+            keys=[self._key(tenant.name, "bucket")], args=[tenant.rps, tenant.burst, now]
+        )
+        return bool(ok), float(tokens)
+
+    async def acquire_slot(self, tenant: Tenant) -> bool:
+        return bool(await self._acquire_slot(keys=[self._key(tenant.name, "active")], args=[tenant.max_concurrent]))
+
+    async def release_slot(self, name: str) -> None:
+        await self._release_slot(keys=[self._key(name, "active")])
+
+    async def charge(self, tenant: Tenant, seconds: float, now: float) -> Tuple[bool, float]:
+        key = self._key(tenant.name, f"quota:{int(now // DAY_SECONDS)}")
+        ok, used = await self._charge(keys=[key], args=[seconds, tenant.daily_audio_seconds])
+        return bool(ok), float(used)
+
+    async def refund(self, name: str, seconds: float, now: float) -> None:
+        await self.client.incrbyfloat(self._key(name, f"quota:{int(now // DAY_SECONDS)}"), -seconds)
+
+
+class RateLimiter:
+    """Проверка лимитов клиентов"""
+
+    def __init__(self):
+        self.enabled = settings.RATE_LIMIT_ENABLED
+        # Без явного имени тенант называется по хешу ключа (сам ключ не попадает в логи)
+        self.tenants: Dict[str, Tenant] = {
+            key: Tenant(**{"name": hashlib.sha256(key.encode()).hexdigest()[:12], **config})
+            for key, config in settings.API_KEYS.items()
+        }
+        self.backend = RedisBackend(settings.RATE_LIMIT_REDIS_URL) if settings.RATE_LIMIT_REDIS_URL else MemoryBackend()
+
+    @property
+    def requires_key(self) -> bool:
+        """Доступ только по API-ключу (ключи заданы в API_KEYS)"""
+        return bool(self.tenants)
+
+    def resolve(self, api_key: Optional[str], client_host: str) -> Optional[Tenant]:
+        """
+        Определяет тенанта запроса
+
+        Args:
+            api_key: Значение заголовка X-API-Key
+            client_host: Адрес клиента (для работы без ключей)
+
+        Returns:
+            Тенант или None, если ключ обязателен и не подошел
+        """
+        if self.requires_key:
+            return self.tenants.get(api_key) if api_key else None
+        return Tenant(f"ip:{client_host}")
+
+    async def check_request(self, tenant: Tenant) -> Dict[str, str]:
+        """
+        Списывает токен на загрузку и занимает место под задачу
+
+        Returns:
+            Заголовки RateLimit-* для ответа
+
+        Raises:
+            RateLimitExceeded: Если лимит частоты или одновременных задач исчерпан
+        """
+        if not self.enabled:
+            return {}
+        now = time.time()
+        ok, tokens = await self.backend.take_token(tenant, now)
+        reset = (tenant.burst - tokens) / tenant.rps if tenant.rps else 0.0
+        headers = _rate_headers(tenant, tokens, reset)
+        if not ok:
+            raise RateLimitExceeded(
+                f"Превышен лимит запросов: {tenant.rps:g}/сек",
+                (1.0 - tokens) / tenant.rps if tenant.rps else 60.0,
+                headers
+            )
+        if not await self.backend.acquire_slot(tenant):
+            raise RateLimitExceeded(
+                f"Превышен лимит одновременных задач: {tenant.max_concurrent}",
+                settings.RATE_LIMIT_CONCURRENCY_RETRY,
+                headers
+            )
+        return headers
+
+    async def charge_audio(self, tenant: Tenant, seconds: float) -> None:
+        """
+        Списывает секунды аудио из суточной квоты
+
+        Raises:
+            RateLimitExceeded: Если квота исчерпана
+        """
+        if not self.enabled or not tenant.daily_audio_seconds:
+            return
+        now = time.time()
+        ok, used = await self.backend.charge(tenant, seconds, now)
+        if not ok:
+            raise RateLimitExceeded(
+                f"Суточная квота исчерпана: использовано {used:.0f} из "
+                f"{tenant.daily_audio_seconds:.0f} сек аудио",
+                _seconds_to_midnight(now)
+            )
+
+    async def refund_audio(self, tenant: Tenant, seconds: float) -> None:
+        """Возвращает секунды в квоту (задача не создана)"""
+        if self.enabled and tenant.daily_audio_seconds:
+            await self.backend.refund(tenant.name, seconds, time.time())
+
+    async def release(self, name: str) -> None:
+        """Освобождает место одновременной задачи"""
+        if self.enabled:
+            try:
+                await self.backend.release_slot(name)
+            except Exception as e:
+                logger.error(f"Не удалось освободить лимит задач {name}: {e}")
+
+
+# Глобальный экземпляр лимитов
+rate_limiter = RateLimiter()
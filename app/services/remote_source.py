@@ -0,0 +1,474 @@
+"""
+Загрузка аудио по ссылке: HTTP(S) и S3-совместимые хранилища
+
+Файл не скачивается целиком перед конвертацией: при создании задачи
+читаются только первые байты (запрос с Range), по ним определяются размер,
+формат и длительность. При обработке задачи ответ хранилища потоком
+передается в stdin ffmpeg, который сразу пишет WAV для дальнейшей обработки.
+Исключение — MP4/M4A с индексом (moov) в конце: такой файл сохраняется
+целиком и декодируется после загрузки.
+Соединения переиспользуются через общий requests.Session (создается при
+первой загрузке, requests и pydub не импортируются вместе с модулем).
+
+Ссылки вида s3://bucket/key запрашиваются у S3_ENDPOINT_URL с подписью
+AWS Signature V4 (если заданы ключи доступа).
+"""
+
+import os
+import hmac
+import socket
+import hashlib
+import logging
+import ipaddress
+import subprocess
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from itertools import chain
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote, urljoin, urlsplit
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger("speech_service.remote")
+
+PROBE_BYTES = 64 * 1024
+STREAM_CHUNK_SIZE = 256 * 1024
+MAX_REDIRECTS = 5
+
+# Расширение по Content-Type, если его нет в ссылке
+CONTENT_TYPES = {
+    "audio/mpeg": ".mp3",
+    "audio/mp3": ".mp3",
+    "audio/ogg": ".ogg",
+    "audio/opus": ".ogg",
+    "audio/wav": ".wav",
+    "audio/x-wav": ".wav",
+    "audio/wave": ".wav",
+    "audio/flac": ".flac",
+    "audio/x-flac": ".flac",
+    "audio/mp4": ".m4a",
+    "audio/x-m4a": ".m4a",
+}
+
+
+class RemoteSourceError(Exception):
+    """Ссылка недоступна или не подходит для распознавания"""
+
+
+class RemoteAudio:
+    """Сведения об удаленном файле, полученные по первым байтам"""
+
+    __slots__ = ("url", "extension", "size", "etag", "duration")
+
+    def __init__(self, url: str, extension: str, size: int, etag: Optional[str], duration: float):
+        self.url = url
+        self.extension = extension
+        self.size = size
+        self.etag = etag
+        self.duration = duration
+
+    @property
+    def content_id(self) -> str:
+        """Идентификатор содержимого для объединения одинаковых задач"""
+        return f"url:{self.url}|{self.etag or ''}|{self.size}"
+
+
+def sign_s3_request(
+    method: str,
+    url: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: Optional[datetime] = None
+) -> Dict[str, str]:
+    """
+    Заголовки AWS Signature V4 для запроса без тела
+
+    Args:
+        method: HTTP-метод
+        url: Полный адрес объекта (путь уже закодирован)
+        access_key: ID ключа доступа
+        secret_key: Секретный ключ
+        region: Регион хранилища
+        now: Время подписи (по умолчанию текущее)
+
+    Returns:
+        Заголовки Authorization, x-amz-date и x-amz-content-sha256
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    datestamp = now.strftime("%Y%m%d")
+    parts = urlsplit(url)
+    payload_hash = "UNSIGNED-PAYLOAD"
+
+    query = "&".join(sorted(parts.query.split("&"))) if parts.query else ""
+    canonical_headers = f"host:{parts.netloc}\nx-amz-content-sha256:{payload_hash}\nx-amz-date:{amz_date}\n"
+    signed_headers = "host;x-amz-content-sha256;x-amz-date"
+    canonical_request = "\n".join([
+        method, parts.path or "/", query, canonical_headers, signed_headers, payload_hash
+    ])
+
+    scope = f"{datestamp}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+    ])
+
+    key = f"AWS4{secret_key}".encode("utf-8")
+    for part in (datestamp, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    return {
+        "Authorization": (
+            f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        ),
+        "x-amz-date": amz_date,
+        "x-amz-content-sha256": payload_hash,
+    }
+
+
+class RemoteSource:
+    """Загрузчик аудио по ссылкам с общим пулом соединений"""
+
+    def __init__(self):
+        self._session = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Пул потоков для проверки и загрузки ссылок
+
+        Загрузка занимает поток на все время скачивания и декодирования:
+        в общем пуле задач медленные ссылки задерживали бы чтение файлов,
+        сохранение транскриптов и объединение задач.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.REMOTE_WORKERS, thread_name_prefix="remote-download"
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        """Останавливает пул загрузок (выполняющиеся загрузки не ждет)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def session(self):
+        """HTTP-сессия с пулом соединений"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=settings.REMOTE_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    @staticmethod
+    def resolve_url(url: str) -> str:
+        """
+        Проверяет ссылку и переводит s3:// в адрес хранилища
+
+        Raises:
+            RemoteSourceError: Если схема не поддерживается или адрес запрещен
+        """
+        parts = urlsplit(url)
+        if parts.scheme == "s3":
+            if not settings.S3_ENDPOINT_URL:
+                raise RemoteSourceError("Ссылки s3:// требуют настройки S3_ENDPOINT_URL")
+            key = quote(parts.path.lstrip("/"), safe="/~")
+            url = f"{settings.S3_ENDPOINT_URL.rstrip('/')}/{parts.netloc}/{key}"
+            parts = urlsplit(url)
+        elif parts.scheme not in ("http", "https"):
+            raise RemoteSourceError("Поддерживаются ссылки http://, https:// и s3://")
+
+        if not parts.hostname:
+            raise RemoteSourceError("В ссылке не указан хост")
+        if settings.REMOTE_ALLOWED_HOSTS and parts.hostname not in settings.REMOTE_ALLOWED_HOSTS:
+            raise RemoteSourceError(f"Хост {parts.hostname} не разрешен")
+        if not settings.REMOTE_ALLOW_PRIVATE:
+            _check_public(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        return url
+
+    def _headers(self, url: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Заголовки запроса (с подписью для хранилища S3)"""
+        headers = dict(extra or {})
+        if (
+            settings.S3_ACCESS_KEY_ID
+            and settings.S3_ENDPOINT_URL
+            and url.startswith(settings.S3_ENDPOINT_URL.rstrip("/") + "/")
+        ):
+            headers.update(sign_s3_request(
+                "GET", url, settings.S3_ACCESS_KEY_ID, settings.S3_SECRET_ACCESS_KEY, settings.S3_REGION
+            ))
+        return headers
+
+    def _get(self, url: str, extra: Optional[Dict[str, str]] = None) -> "requests.Response":
+        """
+        GET с проверкой каждого перенаправления
+
+        requests переходит по Location, не проверяя адрес: публичная ссылка
+        могла бы перенаправить запрос во внутреннюю сеть. Каждый переход
+        проходит resolve_url, подпись S3 считается для каждого адреса заново.
+
+        Raises:
+            RemoteSourceError: Если перенаправление ведет на запрещенный адрес
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.session.get(
+                url, headers=self._headers(url, extra), stream=True,
+                timeout=settings.REMOTE_TIMEOUT, allow_redirects=False
+            )
+            if not response.is_redirect:
+                return response
+            location = urljoin(url, response.headers["Location"])
+            response.close()
+            if urlsplit(location).scheme not in ("http", "https"):
+                raise RemoteSourceError("Перенаправление на неподдерживаемую схему")
+            url = self.resolve_url(location)
+        raise RemoteSourceError(f"Больше {MAX_REDIRECTS} перенаправлений")
+
+    def probe(self, url: str) -> RemoteAudio:
+        """
+        Читает первые байты файла и определяет размер, формат и длительность
+
+        Args:
+            url: Ссылка на файл (http, https или s3)
+
+        Returns:
+            Сведения о файле
+
+        Raises:
+            RemoteSourceError: Если файл недоступен или не подходит
+        """
+        import requests
+
+        resolved = self.resolve_url(url)
+        try:
+            response = self._get(resolved, {"Range": f"bytes=0-{PROBE_BYTES - 1}"})
+        except requests.RequestException as e:
+            raise RemoteSourceError(f"Не удалось получить файл: {e}")
+
+        with response:
+            if response.status_code not in (200, 206):
+                raise RemoteSourceError(f"Хранилище ответило {response.status_code}")
+
+            size = _total_size(response)
+            if size is None:
+                raise RemoteSourceError("Хранилище не сообщило размер файла")
+            if size > settings.REMOTE_MAX_FILE_SIZE:
+                raise RemoteSourceError(
+                    f"Файл слишком большой: {size} байт, максимум {settings.REMOTE_MAX_FILE_SIZE}"
+                )
+
+            extension = _extension(resolved, response.headers.get("Content-Type", ""))
+            # Без поддержки Range сервер отдает файл целиком: читаем только начало
+            prefix = b""
+            for chunk in response.iter_content(PROBE_BYTES):
+                prefix += chunk
+                if len(prefix) >= PROBE_BYTES:
+                    break
+            etag = response.headers.get("ETag")
+
+        duration = _prefix_duration(prefix[:PROBE_BYTES], extension, size)
+        logger.info(f"Файл по ссылке: {size} байт, {extension}, ~{duration:.1f} сек")
+        return RemoteAudio(resolved, extension, size, etag, duration)
+
+    def download_audio(self, url: str, output_path: str, keep_channels: bool = False) -> None:
+        """
+        Потоково скачивает файл и декодирует его ffmpeg в WAV без промежуточной копии
+
+        MP4/M4A с индексом (moov) в конце файла из потока не декодируется:
+        такой файл сначала сохраняется рядом с output_path.
+
+        Args:
+            url: Адрес файла (после resolve_url; проверяется заново — DNS мог
+                измениться после создания задачи)
+            output_path: Куда записать WAV (файл появляется только целиком)
+            keep_channels: Сохранить все каналы (для раздельного распознавания)
+
+        Raises:
+            RemoteSourceError: При ошибке загрузки или декодирования
+        """
+        import requests
+        from pydub import AudioSegment
+        from app.services.audio_stream import mp4_moov_first, wav_frames
+
+        url = self.resolve_url(url)
+        partial_path = f"{output_path}.part"
+        spool_path = f"{output_path}.src"
+        output = ["-ac", "1"] if not keep_channels else []
+        output += ["-ar", "48000", "-c:a", "pcm_s16le", "-f", "wav", partial_path]
+
+        try:
+            try:
+                with self._get(url) as response:
+                    if response.status_code != 200:
+                        raise RemoteSourceError(f"Хранилище ответило {response.status_code}")
+                    chunks = _limited(response.iter_content(STREAM_CHUNK_SIZE))
+                    head = b""
+                    for chunk in chunks:
+                        head += chunk
+                        if len(head) >= PROBE_BYTES:
+                            break
+
+                    if mp4_moov_first(head) is False:
+                        # Без moov в начале ffmpeg нужен произвольный доступ к файлу
+                        with open(spool_path, "wb") as spool:
+                            spool.write(head)
+                            for chunk in chunks:
+                                spool.write(chunk)
+                        received = os.path.getsize(spool_path)
+                        logger.info(f"Индекс MP4 в конце файла, декодирование после загрузки: {received} байт")
+                        _decode([AudioSegment.converter, "-y", "-v", "error", "-i", spool_path] + output)
+                    else:
+                        received = _decode(
+                            [AudioSegment.converter, "-y", "-v", "error", "-i", "pipe:0"] + output,
+                            chain([head], chunks)
+                        )
+            except requests.RequestException as e:
+                raise RemoteSourceError(f"Ошибка загрузки файла: {e}")
+
+            # ffmpeg выходит без ошибки и на файле, в котором не нашел звука
+            if wav_frames(partial_path) == 0:
+                raise RemoteSourceError("В файле нет аудио, которое удалось декодировать")
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+
+        # Прерванная загрузка не оставляет файл, который можно принять за готовый
+        os.replace(partial_path, output_path)
+        logger.info(f"Файл по ссылке загружен и декодирован: {received} байт -> {output_path}")
+
+
+def _limited(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Части ответа не больше REMOTE_MAX_FILE_SIZE в сумме"""
+    received = 0
+    for chunk in chunks:
+        received += len(chunk)
+        if received > settings.REMOTE_MAX_FILE_SIZE:
+            raise RemoteSourceError("Файл больше допустимого размера")
+        yield chunk
+
+
+def _decode(command: List[str], chunks: Optional[Iterable[bytes]] = None) -> int:
+    """
+    Запускает ffmpeg и передает ему chunks через stdin
+
+    Returns:
+        Сколько байт передано
+
+    Raises:
+        RemoteSourceError: Если ffmpeg завершился с ошибкой
+    """
+    sent = 0
+    broken = False
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if chunks is not None else subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr
+        )
+        try:
+            for chunk in chunks or ():
+                process.stdin.write(chunk)
+                sent += len(chunk)
+        except BrokenPipeError:
+            # ffmpeg завершился раньше конца данных: причина — в stderr
+            broken = True
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            if process.stdin and not process.stdin.closed:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+            process.wait()
+
+        if broken or process.returncode != 0:
+            stderr.seek(0)
+            raise RemoteSourceError(f"ffmpeg не смог декодировать файл: {stderr.read().decode(errors='replace')[-500:]}")
+    return sent
+
+
+def _check_public(hostname: str, port: int) -> None:
+    """Запрещает ссылки на внутренние адреса (loopback, частные сети)"""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(hostname, port)}
+    except socket.gaierror as e:
+        raise RemoteSourceError(f"Не удалось разрешить {hostname}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
+            raise RemoteSourceError(f"Адрес {hostname} недоступен для загрузки")
+
+
+def _total_size(response: "requests.Response") -> Optional[int]:
+    """Полный размер файла из Content-Range или Content-Length"""
+    content_range = response.headers.get("Content-Range", "")
+    if response.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _extension(url: str, content_type: str) -> str:
+    """Расширение файла по ссылке или Content-Type"""
+    suffix = Path(urlsplit(url).path).suffix.lower()
+    if suffix in settings.ALLOWED_EXTENSIONS:
+        return suffix
+    suffix = CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+    if suffix in settings.ALLOWED_EXTENSIONS:
+        return suffix
+    raise RemoteSourceError(
+        f"Неподдерживаемый формат файла. Поддерживаются: {', '.join(settings.ALLOWED_EXTENSIONS)}"
+    )
+
+
+def _prefix_duration(prefix: bytes, extension: str, size: int) -> float:
+    """
+    Длительность по началу файла
+
+    У WAV длительность есть в заголовке; для сжатых форматов ffprobe по
+    началу файла определяет битрейт, а длительность считается по полному
+    размеру.
+    """
+    from pydub.utils import mediainfo
+
+    with tempfile.NamedTemporaryFile(suffix=extension) as probe_file:
+        probe_file.write(prefix)
+        probe_file.flush()
+        try:
+            if extension == ".wav":
+                with wave.open(probe_file.name, "rb") as wav:
+                    return wav.getnframes() / wav.getframerate()
+            bit_rate = float(mediainfo(probe_file.name).get("bit_rate", 0))
+            if bit_rate > 0:
+                return size * 8 / bit_rate
+        except (ValueError, OSError, EOFError, wave.Error) as e:
+            logger.warning(f"Не удалось определить битрейт по началу файла: {e}")
+    return size * 8 / settings.SCHED_FALLBACK_BITRATE
+
+
+# Глобальный загрузчик
+remote_source = RemoteSource()
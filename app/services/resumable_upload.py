@@ -0,0 +1,567 @@
+"""
+Возобновляемая загрузка файлов частями
+
+Протокол: POST создает загрузку, PATCH дописывает часть с текущего
+смещения (Upload-Offset) и при необходимости проверяет ее контрольную
+сумму, HEAD возвращает принятое смещение для продолжения после обрыва,
+POST .../finalize сверяет хеш всего файла и создает задачу.
+
+Принятые байты и смещение хранятся на диске (каталог на загрузку), поэтому
+загрузку можно продолжить и после перезапуска сервиса. Пока файл
+загружается, принятые части потоком передаются ffmpeg, который декодирует
+их в WAV (как файл по ссылке): к концу загрузки декодирование почти
+завершено, и задача получает уже декодированный файл. Результат
+принимается, только если ffmpeg не сообщил об ошибках и длительность WAV
+совпала с длительностью исходного файла; иначе исходный файл
+конвертируется целиком, как без потокового декодирования.
+"""
+
+import os
+import json
+import time
+import uuid
+import wave
+import base64
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger("speech_service.upload")
+
+META_NAME = "meta.json"
+DATA_NAME = "data"
+DECODED_NAME = "decoded.wav"
+FEED_CHUNK_SIZE = 256 * 1024
+CLEANUP_INTERVAL = 600
+# Начало файла, по которому решается, можно ли декодировать его потоком
+HEAD_BYTES = 64 * 1024
+# Допустимое расхождение длительности WAV и исходного файла: сек и доля
+DURATION_TOLERANCE = (0.5, 0.02)
+# Если длительность исходного файла неизвестна: битрейт сжатых форматов не выше
+LOSSY_MAX_BITRATE = 640000
+LOSSLESS_EXTENSIONS = (".wav", ".flac")
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки (status — HTTP-код ответа)"""
+
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    """Часть начинается не с принятого смещения"""
+
+    status = 409
+
+    def __init__(self, offset: int):
+        super().__init__(f"Ожидается смещение {offset}")
+        self.offset = offset
+
+
+class ChecksumMismatch(UploadError):
+    """Контрольная сумма части или файла не совпала"""
+
+    # Checksum Mismatch из расширения checksum протокола tus
+    status = 460
+
+
+class UploadIncomplete(UploadError):
+    """Завершение до получения всего файла"""
+
+    status = 409
+
+
+class UploadTooLarge(UploadError):
+    """Часть выходит за объявленный размер файла или лимит части"""
+
+    status = 413
+
+
+class EarlyDecoder:
+    """ffmpeg, декодирующий файл в WAV по мере поступления частей"""
+
+    __slots__ = ("process", "output_path", "fed", "failed", "stderr")
+
+    def __init__(self, output_path: Path, keep_channels: bool):
+        from pydub import AudioSegment
+
+        self.output_path = output_path
+        # Сколько байт загрузки передано ffmpeg
+        self.fed = 0
+        self.failed = False
+        command = [AudioSegment.converter, "-y", "-v", "error", "-i", "pipe:0"]
+        if not keep_channels:
+            command += ["-ac", "1"]
+        command += ["-ar", "48000", "-c:a", "pcm_s16le", "-f", "wav", f"{output_path}.part"]
+        # С -v error любой вывод — ошибка декодирования (поврежденные кадры ffmpeg пропускает)
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.stderr
+        )
+
+    def feed(self, data_path: Path, end: int) -> None:
+        """Передает ffmpeg принятые байты до смещения end (блокирующий вызов)"""
+        if self.failed:
+            return
+        try:
+            with open(data_path, "rb") as f:
+                f.seek(self.fed)
+                while self.fed < end:
+                    chunk = f.read(min(FEED_CHUNK_SIZE, end - self.fed))
+                    if not chunk:
+                        break
+                    self.process.stdin.write(chunk)
+                    self.fed += len(chunk)
+        except (BrokenPipeError, OSError) as e:
+            # Формат не читается потоком (например, m4a с индексом в конце): декодируем после загрузки
+            logger.info(f"Потоковое декодирование загрузки остановлено: {e}")
+            self.abort()
+
+    def finish(self, data_path: Path, size: int, extension: str) -> bool:
+        """
+        Завершает декодирование и проверяет WAV (блокирующий вызов)
+
+        Returns:
+            True, если WAV готов; False — исходный файл нужно конвертировать целиком
+        """
+        self.feed(data_path, size)
+        if self.failed:
+            return False
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        self.stderr.seek(0)
+        errors = self.stderr.read().decode(errors="replace").strip()
+        partial_path = f"{self.output_path}.part"
+        if self.process.returncode != 0 or errors:
+            logger.info(f"Потоковое декодирование загрузки с ошибками, файл будет сконвертирован целиком: {errors[-500:]}")
+            self.abort()
+            return False
+        if not _decoded_whole(partial_path, data_path, extension):
+            logger.info("Длительность WAV не совпала с исходным файлом, файл будет сконвертирован целиком")
+            self.abort()
+            return False
+        self.stderr.close()
+        os.replace(partial_path, self.output_path)
+        return True
+
+    def abort(self) -> None:
+        """Останавливает ffmpeg и удаляет недописанный WAV"""
+        self.failed = True
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.stderr.close()
+        try:
+            os.remove(f"{self.output_path}.part")
+        except FileNotFoundError:
+            pass
+
+
+class ResumableUpload:
+    """Состояние одной загрузки"""
+
+    __slots__ = (
+        "id", "client_id", "filename", "size", "sha256", "params", "offset", "created",
+        "updated", "directory", "lock", "_digest", "_decoder", "_streamable",
+    )
+
+    def __init__(
+        self,
+        upload_id: str,
+        client_id: str,
+        filename: str,
+        size: int,
+        sha256: Optional[str],
+        params: Dict[str, Any],
+        offset: int,
+        created: float,
+        updated: float,
+        directory: Path
+    ):
+        self.id = upload_id
+        self.client_id = client_id
+        self.filename = filename
+        self.size = size
+        # Ожидаемый SHA-256 всего файла (hex), если клиент его указал
+        self.sha256 = sha256
+        # Параметры задачи: language, trim_silence, split_channels, priority
+        self.params = params
+        self.offset = offset
+        self.created = created
+        # Время последней принятой части: от него считается срок хранения
+        self.updated = updated
+        self.directory = directory
+        # Части одной загрузки принимаются по очереди
+        self.lock = asyncio.Lock()
+        # Хеш принятых байт; после перезапуска считается заново при завершении
+        self._digest: Optional["hashlib._Hash"] = hashlib.sha256() if offset == 0 else None
+        self._decoder: Optional[EarlyDecoder] = None
+        # Можно ли декодировать файл потоком (None — начало еще не загружено)
+        self._streamable: Optional[bool] = None
+
+    @property
+    def extension(self) -> str:
+        return Path(self.filename).suffix.lower()
+
+    @property
+    def data_path(self) -> Path:
+        return self.directory / DATA_NAME
+
+    @property
+    def decoded_path(self) -> Path:
+        return self.directory / DECODED_NAME
+
+    @property
+    def expires_at(self) -> float:
+        return self.updated + settings.UPLOAD_RESUMABLE_TTL
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "client_id": self.client_id,
+            "filename": self.filename,
+            "size": self.size,
+            "sha256": self.sha256,
+            "params": self.params,
+            "offset": self.offset,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+    def save(self) -> None:
+        """Атомарно сохраняет состояние (после fsync данных)"""
+        temp_path = self.directory / f".{META_NAME}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temp_path, self.directory / META_NAME)
+
+    @classmethod
+    def load(cls, directory: Path) -> "ResumableUpload":
+        with open(directory / META_NAME, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        upload = cls(
+            data["id"], data["client_id"], data["filename"], data["size"], data.get("sha256"),
+            data["params"], data["offset"], data["created"], data.get("updated", data["created"]), directory
+        )
+        # Байты после сохраненного смещения не подтверждены (запись прервал перезапуск)
+        with open(upload.data_path, "r+b") as f:
+            f.truncate(upload.offset)
+        return upload
+
+
+class ResumableUploads:
+    """Каталог возобновляемых загрузок"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._uploads: Dict[str, ResumableUpload] = {}
+        self._last_cleanup = 0.0
+
+    def create(
+        self,
+        client_id: str,
+        filename: str,
+        size: int,
+        sha256: Optional[str],
+        params: Dict[str, Any]
+    ) -> ResumableUpload:
+        """
+        Создает загрузку
+
+        Raises:
+            UploadTooLarge: Если размер больше UPLOAD_RESUMABLE_MAX_SIZE
+        """
+        if size > settings.UPLOAD_RESUMABLE_MAX_SIZE:
+            raise UploadTooLarge(
+                f"Файл слишком большой. Максимальный размер: {settings.UPLOAD_RESUMABLE_MAX_SIZE // (1024 * 1024)}MB"
+            )
+        self._cleanup()
+        upload_id = uuid.uuid4().hex
+        directory = self.root / upload_id
+        directory.mkdir(parents=True)
+        now = time.time()
+        upload = ResumableUpload(
+            upload_id, client_id, filename, size, sha256.lower() if sha256 else None, params, 0, now, now, directory
+        )
+        upload.data_path.touch()
+        upload.save()
+        self._uploads[upload_id] = upload
+        logger.info(f"Создана загрузка {upload_id}: {filename}, {size} байт")
+        return upload
+
+    def get(self, upload_id: str, client_id: str) -> Optional[ResumableUpload]:
+        """Загрузка клиента (после перезапуска читается с диска) или None"""
+        upload = self._uploads.get(upload_id)
+        if upload is None and len(upload_id) == 32 and upload_id.isalnum():
+            try:
+                upload = self._uploads[upload_id] = ResumableUpload.load(self.root / upload_id)
+            except (OSError, ValueError, KeyError):
+                return None
+        if upload is None or upload.client_id != client_id:
+            return None
+        if upload.expires_at < time.time():
+            self.discard(upload)
+            return None
+        return upload
+
+    async def append(
+        self,
+        upload: ResumableUpload,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+        checksum: Optional[str] = None
+    ) -> int:
+        """
+        Дописывает часть, начинающуюся со смещения offset
+
+        Без контрольной суммы сохраняются и байты, принятые до обрыва
+        соединения: клиент продолжит с нового смещения. С контрольной
+        суммой часть принимается только целиком.
+
+        Args:
+            upload: Загрузка
+            offset: Смещение части (Upload-Offset)
+            chunks: Тело запроса
+            checksum: Upload-Checksum в формате "sha256 <base64>"
+
+        Returns:
+            Новое смещение
+
+        Raises:
+            OffsetMismatch, ChecksumMismatch, UploadTooLarge, UploadError
+        """
+        expected = _parse_checksum(checksum) if checksum else None
+        async with upload.lock:
+            if offset != upload.offset:
+                raise OffsetMismatch(upload.offset)
+
+            part_digest = hashlib.sha256()
+            file_digest = upload._digest.copy() if upload._digest is not None else None
+            written = 0
+            error: Optional[UploadError] = None
+            with open(upload.data_path, "r+b") as f:
+                f.seek(offset)
+                f.truncate()
+                try:
+                    async for chunk in chunks:
+                        written += len(chunk)
+                        if offset + written > upload.size:
+                            error = UploadTooLarge("Часть выходит за объявленный размер файла")
+                        elif written > settings.UPLOAD_CHUNK_MAX_BYTES:
+                            error = UploadTooLarge(f"Часть больше {settings.UPLOAD_CHUNK_MAX_BYTES} байт")
+                        if error:
+                            break
+                        part_digest.update(chunk)
+                        if file_digest is not None:
+                            file_digest.update(chunk)
+                        f.write(chunk)
+                    if expected is not None and error is None and part_digest.digest() != expected:
+                        error = ChecksumMismatch("Контрольная сумма части не совпала")
+                    accepted = error is None
+                except BaseException:
+                    # Обрыв соединения: без контрольной суммы принятые байты сохраняются
+                    accepted = expected is None
+                    raise
+                finally:
+                    if not accepted:
+                        written = 0
+                        f.seek(offset)
+                        f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+                    if written:
+                        upload.offset = offset + written
+                        upload._digest = file_digest
+                        upload.updated = time.time()
+                        upload.save()
+            if error:
+                raise error
+
+            # Под той же блокировкой: части передаются ffmpeg по очереди и без пропусков
+            if written:
+                await self._feed(upload)
+            return upload.offset
+
+    async def _feed(self, upload: ResumableUpload) -> None:
+        """Передает новые байты потоковому декодированию"""
+        if not settings.UPLOAD_EARLY_DECODE:
+            return
+        if upload._decoder is None:
+            if upload.extension not in settings.ALLOWED_EXTENSIONS:
+                return
+            if upload._streamable is None:
+                if upload.offset < min(HEAD_BYTES, upload.size):
+                    return
+                with open(upload.data_path, "rb") as f:
+                    upload._streamable = _streamable(f.read(HEAD_BYTES))
+            if not upload._streamable:
+                return
+            keep_channels = bool(upload.params.get("split_channels"))
+            # После перезапуска декодирование начинается с начала принятых байт
+            upload._decoder = EarlyDecoder(upload.decoded_path, keep_channels)
+        if not upload._decoder.failed:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, upload._decoder.feed, upload.data_path, upload.offset)
+
+    async def complete(self, upload: ResumableUpload, destination: Path) -> Tuple[str, str]:
+        """
+        Проверяет загруженный файл и ссылается на него из destination
+
+        Сама загрузка остается до discard: если задачу создать не удалось,
+        завершение можно повторить.
+
+        Args:
+            upload: Загрузка
+            destination: Путь файла задачи без расширения
+
+        Returns:
+            Путь файла задачи (декодированный WAV или исходный файл) и SHA-256 содержимого
+
+        Raises:
+            UploadIncomplete: Если файл загружен не полностью
+            ChecksumMismatch: Если SHA-256 файла не совпал с объявленным
+        """
+        loop = asyncio.get_running_loop()
+        async with upload.lock:
+            if upload.offset != upload.size:
+                raise UploadIncomplete(f"Загружено {upload.offset} из {upload.size} байт")
+
+            if upload._digest is None:
+                upload._digest = await loop.run_in_executor(None, _file_digest, upload.data_path)
+            content_hash = upload._digest.hexdigest()
+            if upload.sha256 and upload.sha256 != content_hash:
+                raise ChecksumMismatch("SHA-256 файла не совпал с объявленным при создании загрузки")
+
+            decoder = upload._decoder
+            if decoder is not None and not decoder.failed and not upload.decoded_path.exists():
+                await loop.run_in_executor(None, decoder.finish, upload.data_path, upload.size, upload.extension)
+
+            if upload.decoded_path.exists():
+                source, path = upload.decoded_path, destination.with_suffix(".wav")
+            else:
+                source, path = upload.data_path, destination.with_suffix(upload.extension)
+            await loop.run_in_executor(None, _link_or_copy, source, path)
+            logger.info(
+                f"Загрузка {upload.id} завершена: {upload.size} байт"
+                + (", декодирована во время загрузки" if source == upload.decoded_path else "")
+            )
+            return str(path), content_hash
+
+    def discard(self, upload: ResumableUpload) -> None:
+        """Удаляет загрузку и ее файлы"""
+        self._uploads.pop(upload.id, None)
+        if upload._decoder is not None and upload._decoder.process.poll() is None:
+            upload._decoder.abort()
+        shutil.rmtree(upload.directory, ignore_errors=True)
+
+    def _cleanup(self) -> None:
+        """Удаляет просроченные загрузки (не чаще раза в CLEANUP_INTERVAL)"""
+        now = time.time()
+        if now - self._last_cleanup < CLEANUP_INTERVAL or not self.root.exists():
+            return
+        self._last_cleanup = now
+        for directory in self.root.iterdir():
+            upload = self._uploads.get(directory.name)
+            if upload is not None:
+                expires_at = upload.expires_at
+            else:
+                expires_at = _stored_updated(directory) + settings.UPLOAD_RESUMABLE_TTL
+            if expires_at < now:
+                if upload is not None:
+                    self.discard(upload)
+                else:
+                    shutil.rmtree(directory, ignore_errors=True)
+                logger.info(f"Удалена просроченная загрузка {directory.name}")
+
+
+def _stored_updated(directory: Path) -> float:
+    """Время последней активности загрузки, не открытой после перезапуска"""
+    try:
+        with open(directory / META_NAME, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return float(data.get("updated", data["created"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        # Метаданные не записаны или повреждены: по времени изменения каталога
+        try:
+            return directory.stat().st_mtime
+        except OSError:
+            return 0.0
+
+
+def _streamable(head: bytes) -> bool:
+    """MP4/M4A декодируется потоком, только если индекс (moov) идет перед данными"""
+    from app.services.audio_stream import mp4_moov_first
+
+    return mp4_moov_first(head) is not False
+
+
+def _source_seconds(data_path: Path, extension: str) -> Optional[float]:
+    """Длительность загруженного файла по заголовку (None — не удалось определить)"""
+    from pydub.utils import mediainfo
+
+    try:
+        if extension == ".wav":
+            with wave.open(str(data_path), "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        duration = float(mediainfo(str(data_path)).get("duration", 0))
+    except (ValueError, OSError, EOFError, wave.Error):
+        return None
+    return duration if duration > 0 else None
+
+
+def _decoded_whole(wav_path: str, data_path: Path, extension: str) -> bool:
+    """Декодирован ли файл целиком: длительность WAV против заголовка или размера файла"""
+    from app.services.audio_stream import wav_frames, wav_rate
+
+    frames = wav_frames(wav_path)
+    if frames == 0:
+        return False
+    decoded = frames / wav_rate(wav_path)
+    expected = _source_seconds(data_path, extension)
+    if expected is not None:
+        seconds, share = DURATION_TOLERANCE
+        return abs(decoded - expected) <= max(seconds, expected * share)
+    if extension in LOSSLESS_EXTENSIONS:
+        return True
+    return decoded * LOSSY_MAX_BITRATE >= data_path.stat().st_size * 8
+
+
+def _parse_checksum(header: str) -> bytes:
+    """Разбирает Upload-Checksum: "sha256 <base64>" """
+    algorithm, _, value = header.strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise UploadError("Поддерживается только Upload-Checksum: sha256 <base64>")
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise UploadError("Некорректное значение Upload-Checksum")
+
+
+def _file_digest(path: Path) -> "hashlib._Hash":
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest
+
+
+def _link_or_copy(source: Path, dest: Path) -> None:
+    """Жесткая ссылка (без копирования данных), на другой файловой системе — копия"""
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+# Глобальный каталог загрузок
+resumable_uploads = ResumableUploads(settings.UPLOAD_RESUMABLE_DIR)
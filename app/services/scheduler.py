@@ -0,0 +1,397 @@
+"""
+Планировщик задач распознавания с учетом длительности аудио
+
+Стоимость задачи — длительность аудио в секундах (определяется по
+заголовкам при загрузке). Порядок обработки:
+
+* между клиентами — справедливое разделение по секундам аудио: у клиента
+  есть виртуальное время (сколько аудио ему уже обработано), первым
+  обслуживается клиент с наименьшим vtime + стоимость его следующей задачи;
+* внутри клиента — сначала короткие задачи (SJF) со старением: каждая
+  секунда ожидания уменьшает эффективную стоимость на SCHED_AGING_RATE,
+  поэтому длинные задачи не голодают.
+
+Задачи разделены на полосы приоритета (realtime, interactive, bulk) со
+своими очередями. У полосы есть зарезервированные места
+(PRIORITY_RESERVED_WORKERS), которые не занимают полосы ниже по приоритету;
+остальные места общие и достаются более приоритетной полосе первой. Так
+фоновая загрузка не может занять все места, а простаивающие общие места
+используются любой полосой.
+
+Если оценка ожидания в очереди превышает допустимую для полосы
+(PRIORITY_MAX_WAIT_SECONDS, по умолчанию SCHED_MAX_WAIT_SECONDS), задача
+отклоняется сразу при загрузке.
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+import wave
+from itertools import count
+from pathlib import Path
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.models.schemas import Priority
+
+logger = logging.getLogger("speech_service.scheduler")
+
+# Порядковый номер задачи: при равной стоимости раньше идет поставленная раньше
+_sequence = count()
+
+
+def probe_duration(audio_path: str) -> float:
+    """
+    Определяет длительность аудио без декодирования
+
+    WAV читается по заголовку, остальные форматы — через ffprobe.
+    Если длительность определить не удалось, она оценивается по размеру
+    файла и SCHED_FALLBACK_BITRATE.
+
+    Args:
+        audio_path: Путь к аудиофайлу
+
+    Returns:
+        Длительность в секундах
+    """
+    from pydub.utils import mediainfo
+
+    try:
+        if Path(audio_path).suffix.lower() == ".wav":
+            with wave.open(audio_path, "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        duration = float(mediainfo(audio_path).get("duration", 0))
+        if duration > 0:
+            return duration
+    except (ValueError, OSError, EOFError, wave.Error) as e:
+        logger.warning(f"Не удалось определить длительность {audio_path}: {e}")
+
+    return Path(audio_path).stat().st_size * 8 / settings.SCHED_FALLBACK_BITRATE
+
+
+class AdmissionRejected(Exception):
+    """Задача не принята: ожидание в очереди превысит допустимое"""
+
+    def __init__(self, estimated_wait: float, max_wait: float):
+        self.estimated_wait = estimated_wait
+        self.retry_after = max(int(estimated_wait - max_wait), 1)
+        super().__init__(
+            f"Очередь перегружена: ожидание ~{estimated_wait:.0f} сек "
+            f"при допустимых {max_wait:g} сек"
+        )
+
+
+class Job:
+    """Задача в очереди планировщика"""
+
+    __slots__ = ("task_id", "client_id", "cost", "lane", "enqueued_at", "started_at", "predicted", "handle")
+
+    def __init__(self, task_id: str, client_id: str, cost: float, lane: "Lane", enqueued_at: float):
+        self.task_id = task_id
+        self.client_id = client_id
+        self.cost = cost
+        self.lane = lane
+        self.enqueued_at = enqueued_at
+        self.started_at: Optional[float] = None
+        self.predicted = 0.0
+        self.handle: Optional[asyncio.Task] = None
+
+    def aged_cost(self, now: float) -> float:
+        """Стоимость с учетом старения"""
+        return self.cost - settings.SCHED_AGING_RATE * (now - self.enqueued_at)
+
+
+class ClientQueue:
+    """Очередь задач одного клиента"""
+
+    __slots__ = ("vtime", "heap")
+
+    def __init__(self, vtime: float):
+        self.vtime = vtime
+        # (cost + aging * enqueued_at, seq, job): старение одинаково для всех
+        # задач, поэтому порядок в куче от текущего времени не зависит
+        self.heap: List[tuple] = []
+
+
+class Histogram:
+    """Гистограмма времени ожидания с фиксированными границами (как у Prometheus)"""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    BOUNDS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+    def __init__(self):
+        self.bounds = self.BOUNDS
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Учитывает значение"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def to_dict(self) -> Dict:
+        """Накопленные значения по границам (le), сумма и количество"""
+        buckets = {}
+        cumulative = 0
+        for bound, value in zip((*self.bounds, "+Inf"), self.counts):
+            cumulative += value
+            buckets[str(bound)] = cumulative
+        return {"buckets": buckets, "sum": round(self.total, 3), "count": self.count}
+
+
+class Lane:
+    """Полоса приоритета: свои очереди клиентов, резерв мест и статистика"""
+
+    def __init__(self, priority: Priority, reserved: int, max_wait: float):
+        self.priority = priority
+        self.reserved = reserved
+        self.max_wait = max_wait
+        self.clients: Dict[str, ClientQueue] = {}
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+        # Виртуальное время последней запущенной задачи
+        self.virtual_clock = 0.0
+        self.wait_histogram = Histogram()
+
+    def push(self, job: Job) -> None:
+        """Ставит задачу в очередь клиента"""
+        queue = self.clients.get(job.client_id)
+        if queue is None:
+            queue = self.clients[job.client_id] = ClientQueue(self.virtual_clock)
+        elif not queue.heap:
+            # Простаивавший клиент не копит "кредит" за время простоя
+            queue.vtime = max(queue.vtime, self.virtual_clock)
+
+        key = job.cost + settings.SCHED_AGING_RATE * job.enqueued_at
+        heapq.heappush(queue.heap, (key, next(_sequence), job))
+        self.queued += 1
+
+    def pop(self, now: float) -> Optional[Job]:
+        """Выбирает следующую задачу полосы"""
+        best: Optional[ClientQueue] = None
+        best_key = 0.0
+        idle = []
+        for client_id, queue in self.clients.items():
+            if not queue.heap:
+                # Клиент без задач, отставший от часов, ничего не теряет при удалении
+                if queue.vtime <= self.virtual_clock:
+                    idle.append(client_id)
+                continue
+            key = queue.vtime + max(queue.heap[0][2].aged_cost(now), 0.0)
+            if best is None or key < best_key:
+                best, best_key = queue, key
+        for client_id in idle:
+            del self.clients[client_id]
+        if best is None:
+            return None
+
+        job = heapq.heappop(best.heap)[2]
+        self.virtual_clock = best.vtime
+        best.vtime += job.cost
+        self.queued -= 1
+        return job
+
+    def iter_jobs(self):
+        """Все задачи в очереди полосы"""
+        for queue in self.clients.values():
+            for _, _, job in queue.heap:
+                yield job
+
+
+class JobScheduler:
+    """Очередь задач с полосами приоритета, SJF, старением и справедливостью по секундам аудио"""
+
+    def __init__(self, runner: Callable[[str], Awaitable[None]], workers: Optional[int] = None):
+        """
+        Args:
+            runner: Корутина обработки задачи по ее ID
+            workers: Сколько задач обрабатывается одновременно
+        """
+        self.runner = runner
+        self.workers = workers or settings.SCHED_WORKERS
+        # Полосы в порядке убывания приоритета
+        self.lanes: Dict[Priority, Lane] = {
+            priority: Lane(
+                priority,
+                settings.PRIORITY_RESERVED_WORKERS.get(priority.value, 0),
+                settings.PRIORITY_MAX_WAIT_SECONDS.get(priority.value, settings.SCHED_MAX_WAIT_SECONDS)
+            )
+            for priority in Priority
+        }
+        self.running: Dict[str, Job] = {}
+        # При остановке сервиса новые задачи из очереди не запускаются
+        self.paused = False
+        # Секунд обработки на секунду аудио (скользящее среднее)
+        self._processing_ratio = settings.SCHED_INITIAL_RATIO
+
+    @property
+    def queued(self) -> int:
+        """Задач в очереди во всех полосах"""
+        return sum(lane.queued for lane in self.lanes.values())
+
+    def predict(self, cost: float) -> float:
+        """Прогноз времени обработки задачи в секундах"""
+        return settings.SCHED_TASK_OVERHEAD + cost * self._processing_ratio
+
+    def _higher(self, lane: Lane) -> List[Lane]:
+        """Полосы с более высоким приоритетом"""
+        lanes = list(self.lanes.values())
+        return lanes[:lanes.index(lane)]
+
+    def _can_start(self, lane: Lane) -> bool:
+        """
+        Есть ли место для задачи полосы
+
+        Свой резерв доступен всегда; сверх него — свободные места, кроме
+        незанятого резерва более приоритетных полос.
+        """
+        if lane.running < lane.reserved:
+            return True
+        held = sum(max(higher.reserved - higher.running, 0) for higher in self._higher(lane))
+        return self.workers - len(self.running) - held > 0
+
+    def estimate_wait(self, cost: float, priority: Priority, now: Optional[float] = None) -> float:
+        """
+        Оценивает ожидание новой задачи в очереди
+
+        Учитываются остаток выполняющихся задач, все задачи более
+        приоритетных полос и задачи своей полосы, которые при SJF окажутся
+        впереди (не длиннее новой с учетом старения).
+        """
+        if now is None:
+            now = time.monotonic()
+        lane = self.lanes[priority]
+        higher = self._higher(lane)
+        if self._can_start(lane) and not lane.queued and not any(h.queued for h in higher):
+            return 0.0
+
+        remaining = sum(max(job.predicted - (now - job.started_at), 0.0) for job in self.running.values())
+        ahead = sum(self.predict(job.cost) for h in higher for job in h.iter_jobs())
+        ahead += sum(self.predict(job.cost) for job in lane.iter_jobs() if job.aged_cost(now) <= cost)
+        capacity = max(self.workers - sum(h.reserved for h in higher), 1)
+        return (remaining + ahead) / capacity
+
+    def submit(
+        self,
+        task_id: str,
+        client_id: str,
+        cost: float,
+        priority: Priority = Priority.INTERACTIVE,
+        waited: Optional[float] = None
+    ) -> None:
+        """
+        Ставит задачу в очередь
+
+        Args:
+            task_id: ID задачи
+            client_id: Идентификатор клиента для справедливого разделения
+            cost: Длительность аудио в секундах
+            priority: Полоса приоритета
+            waited: Сколько задача уже ждала (восстановленная после перезапуска:
+                сохраняет старение и не проходит проверку ожидания)
+
+        Raises:
+            AdmissionRejected: Если ожидание превысит допустимое для полосы
+        """
+        now = time.monotonic()
+        lane = self.lanes[priority]
+        if waited is None and lane.max_wait > 0:
+            wait = self.estimate_wait(cost, priority, now)
+            if wait > lane.max_wait:
+                lane.rejected += 1
+                raise AdmissionRejected(wait, lane.max_wait)
+
+        lane.push(Job(task_id, client_id, cost, lane, now - (waited or 0.0)))
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Запускает задачи, пока есть свободные места"""
+        while not self.paused and len(self.running) < self.workers:
+            now = time.monotonic()
+            job = None
+            for lane in self.lanes.values():
+                if lane.queued and self._can_start(lane):
+                    job = lane.pop(now)
+                    if job is not None:
+                        break
+            if job is None:
+                return
+
+            job.started_at = now
+            job.predicted = self.predict(job.cost)
+            job.lane.running += 1
+            job.lane.wait_histogram.observe(now - job.enqueued_at)
+            self.running[job.task_id] = job
+            logger.info(
+                f"Задача {job.task_id} запущена ({job.lane.priority.value}): {job.cost:.1f} сек аудио, "
+                f"ожидание {now - job.enqueued_at:.1f} сек"
+            )
+            job.handle = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job) -> None:
+        """Выполняет задачу и освобождает место"""
+        try:
+            await self.runner(job.task_id)
+        finally:
+            self.running.pop(job.task_id, None)
+            job.lane.running -= 1
+            elapsed = time.monotonic() - job.started_at
+            if job.cost >= 1.0:
+                ratio = max(elapsed - settings.SCHED_TASK_OVERHEAD, 0.0) / job.cost
+                self._processing_ratio += 0.2 * (ratio - self._processing_ratio)
+            self._dispatch()
+
+    async def drain(self, timeout: float) -> List[str]:
+        """
+        Останавливает запуск задач и ждет выполняющиеся
+
+        Args:
+            timeout: Сколько ждать, сек; оставшиеся задачи отменяются
+
+        Returns:
+            ID отмененных задач
+        """
+        self.paused = True
+        handles = [job.handle for job in self.running.values() if job.handle is not None]
+        if handles:
+            logger.info(f"Ожидание {len(handles)} выполняющихся задач (до {timeout:g} сек)")
+            await asyncio.wait(handles, timeout=timeout)
+
+        cancelled = [job.task_id for job in self.running.values()]
+        pending = [job.handle for job in self.running.values() if job.handle is not None]
+        for handle in pending:
+            handle.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        return cancelled
+
+    def stats(self) -> Dict:
+        """Состояние очереди по полосам"""
+        now = time.monotonic()
+        return {
+            "workers": self.workers,
+            "paused": self.paused,
+            "running": len(self.running),
+            "queued": self.queued,
+            "processing_ratio": round(self._processing_ratio, 3),
+            "lanes": {
+                lane.priority.value: {
+                    "reserved": lane.reserved,
+                    "running": lane.running,
+                    "queued": lane.queued,
+                    "queued_audio_seconds": round(sum(job.cost for job in lane.iter_jobs()), 1),
+                    "clients": sum(1 for queue in lane.clients.values() if queue.heap),
+                    "estimated_wait_seconds": round(self.estimate_wait(0.0, lane.priority, now), 1),
+                    "max_wait_seconds": lane.max_wait,
+                    "rejected": lane.rejected,
+                    "wait_seconds": lane.wait_histogram.to_dict(),
+                }
+                for lane in self.lanes.values()
+            },
+        }
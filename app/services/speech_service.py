@@ -3,148 +3,391 @@
 """
 
 import os
-import json
-import base64
-import requests
+import heapq
+import asyncio
 import logging
+import subprocess
+from functools import partial
 from pathlib import Path
-from pydub import AudioSegment
-from typing import Dict, Any, Optional
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
 from app.core.config import settings
+from app.models.preprocessing import OffsetMap, TrimStats
+from app.models.transcript import Transcript
+from app.speechkit import SpeechKitClient
+
+# pydub и NumPy импортируются при первом использовании (или в warmup),
+# чтобы не замедлять импорт приложения
 
 logger = logging.getLogger("speech_service.speech")
 
 
+class ConvertedAudio:
+    """Результат конвертации: файл для отправки и сведения о предобработке"""
+    
+    __slots__ = ("path", "duration", "offset_map", "trim_stats")
+    
+    def __init__(
+        self,
+        path: str,
+        duration: float,
+        offset_map: Optional[OffsetMap] = None,
+        trim_stats: Optional[TrimStats] = None
+    ):
+        self.path = path
+        self.duration = duration
+        self.offset_map = offset_map
+        self.trim_stats = trim_stats
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """Представление для контрольной точки задачи"""
+        return {
+            "path": self.path,
+            "duration": self.duration,
+            "offset_map": self.offset_map.to_list() if self.offset_map is not None else None,
+            "trim_stats": self.trim_stats.to_dict() if self.trim_stats is not None else None,
+        }
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConvertedAudio":
+        """Восстанавливает результат конвертации из контрольной точки"""
+        return cls(
+            data["path"],
+            data["duration"],
+            OffsetMap.from_list(data["offset_map"]) if data.get("offset_map") is not None else None,
+            TrimStats.from_dict(data["trim_stats"]) if data.get("trim_stats") else None
+        )
+
+
 class YandexSpeechService:
     """Сервис для работы с Yandex SpeechKit API"""
     
-    def __init__(self):
-        self.iam_token = settings.YANDEX_CLOUD_IAM_TOKEN
-        self.folder_id = settings.YANDEX_FOLDER_ID
-        self.api_url = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
+    def __init__(self, executor: Optional[Executor] = None):
+        # Блокирующая работа с файлами (pydub/ffmpeg) выполняется вне event loop
+        self.executor = executor
+        # Запросы к SpeechKit с общим лимитом для всех задач и каналов, в собственном пуле потоков клиента
+        self.client = SpeechKitClient(executor=executor)
+        
+    def warmup(self) -> None:
+        """
+        Заранее загружает модули обработки аудио и открывает соединение с SpeechKit
+        
+        Выполняется при запуске в пуле потоков; ошибки соединения не мешают запуску.
+        """
+        from pydub import AudioSegment  # noqa: F401
+        from app.services import audio_stream  # noqa: F401
+        
+        self.client.warmup()
         
-    async def transcribe_audio(self, audio_path: str, language: str = "ru-RU") -> str:
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Выполняет блокирующую функцию в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+        
+    async def transcribe_audio(
+        self,
+        audio_path: str,
+        language: str = "ru-RU",
+        trim_silence: bool = False,
+        split_channels: bool = False,
+        stages: Optional[Dict[str, Any]] = None,
+        content_hash: Optional[str] = None,
+        audio_duration: Optional[float] = None
+    ) -> Tuple[Transcript, Optional[TrimStats]]:
         """
         Распознает речь из аудиофайла
         
         Args:
             audio_path: Путь к аудиофайлу
             language: Язык распознавания
+            trim_silence: Вырезать тишину перед отправкой (VAD)
+            split_channels: Распознавать каналы стерео-записи раздельно (диалог)
+            stages: Результаты уже выполненных этапов задачи. Сюда попадает
+                сконвертированный файл ("converted"): если обработку прервали,
+                файл сохраняется и при повторе конвертация пропускается
+            content_hash: Хеш содержимого файла: результат конвертации берется
+                из кэша и сохраняется в него (для повторов и других языков)
+            audio_duration: Длительность файла, если известна: по ней до
+                кодирования выбирается битрейт, при котором файл помещается
+                в один запрос
             
         Returns:
-            Распознанный текст
+            Структурированный результат распознавания (время — по исходному аудио)
+            и статистика предобработки, если она включена
             
         Raises:
             Exception: При ошибке распознавания
         """
         logger.info(f"Начинаю распознавание файла: {audio_path}, язык: {language}")
         
+        if split_channels:
+            channels = await self._run_blocking(self._probe_channels, audio_path)
+            if channels > 1:
+                return await self.transcribe_channels(audio_path, language, channels)
+            logger.info("Файл моно, раздельное распознавание каналов не требуется")
+        
+        if stages is None:
+            stages = {}
+        
         try:
-            # Конвертируем аудио в OGG Opus
-            temp_file = await self._convert_to_ogg(audio_path)
+            converted = stages.get("converted")
+            if converted is not None and os.path.exists(converted.path):
+                logger.info(f"Использую ранее сконвертированный файл: {converted.path}")
+            else:
+                # Конвертируем аудио в OGG Opus
+                converted = stages["converted"] = await self._convert_cached(
+                    audio_path, trim_silence, content_hash, audio_duration
+                )
+            temp_file = converted.path
+            interrupted = False
             
             try:
-                # Читаем конвертированный файл
-                with open(temp_file, 'rb') as f:
-                    audio_data = f.read()
-                
-                # Проверяем размер
-                if len(audio_data) > settings.MAX_FILE_SIZE:
-                    raise Exception(f"Файл слишком большой: {len(audio_data)} байт")
+                # Отправляем запрос к API (не поместившийся в лимит файл — частями)
+                result = await self.client.recognize_file(temp_file, language, converted.duration)
                 
-                logger.info(f"Размер OGG файла: {len(audio_data)} байт")
-                
-                # Отправляем запрос к API
-                result = await self._send_recognition_request(audio_data, language)
+                # Возвращаем временные метки к исходному аудио
+                if converted.offset_map:
+                    result.remap_times(converted.offset_map.to_original)
+                if converted.trim_stats:
+                    converted.trim_stats.estimate_upload_savings(os.path.getsize(temp_file))
                 
                 logger.info("Распознавание завершено успешно")
-                return result
+                return result, converted.trim_stats
+                
+            except asyncio.CancelledError:
+                # Обработку прервали (остановка сервиса): файл понадобится при повторе
+                interrupted = True
+                raise
                 
             finally:
                 # Удаляем временный файл
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
+                if not interrupted:
+                    stages.pop("converted", None)
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
                     
         except Exception as e:
             logger.error(f"Ошибка распознавания: {e}")
             raise
     
-    async def _convert_to_ogg(self, audio_path: str) -> str:
-        """Конвертирует аудио в OGG Opus формат"""
-        logger.info("Конвертирую аудио в OGG Opus...")
+    async def transcribe_channels(
+        self,
+        audio_path: str,
+        language: str,
+        channels: int = 2
+    ) -> Tuple[Transcript, TrimStats]:
+        """
+        Распознает каждый канал записи отдельно и собирает диалог
+        
+        Каналы выделяются одним проходом ffmpeg в отдельные моно-файлы (потоково,
+        без полной копии стерео-сигнала в памяти), затем в каждом канале
+        находятся реплики (VAD) и распознаются параллельно в рамках общего
+        лимита запросов. Фразы объединяются по времени с меткой канала.
+        
+        Args:
+            audio_path: Путь к аудиофайлу
+            language: Язык распознавания
+            channels: Количество каналов в файле
+            
+        Returns:
+            Диалог, упорядоченный по времени, и суммарная статистика по каналам
+        """
+        logger.info(f"Раздельное распознавание {channels} каналов: {audio_path}")
+        channel_paths = await self._run_blocking(self._split_channels, audio_path, channels)
+        
+        try:
+            results = await asyncio.gather(*(
+                self._transcribe_channel(path, language, self._channel_label(index))
+                for index, path in enumerate(channel_paths)
+            ))
+        finally:
+            for path in channel_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+                    
+        dialogue = Transcript(heapq.merge(
+            *(transcript.segments for transcript, _ in results),
+            key=lambda segment: segment.start
+        ))
+        if not dialogue:
+            raise Exception("Не удалось распознать речь в файле")
+            
+        stats = TrimStats(
+            original_seconds=sum(s.original_seconds for _, s in results),
+            processed_seconds=sum(s.processed_seconds for _, s in results),
+            pcm_bytes_saved=sum(s.pcm_bytes_saved for _, s in results)
+        )
+        stats.upload_bytes_saved = sum(s.upload_bytes_saved or 0 for _, s in results)
+        return dialogue, stats
         
-        # Загружаем аудио
-        audio = AudioSegment.from_file(audio_path)
+    @staticmethod
+    def _channel_label(index: int) -> str:
+        """Метка канала для диалога"""
+        if index < len(settings.CHANNEL_LABELS):
+            return settings.CHANNEL_LABELS[index]
+        return str(index + 1)
         
-        # Конвертируем в моно, 48kHz для OGG Opus
-        audio = audio.set_channels(1).set_frame_rate(48000)
+    @staticmethod
+    def _probe_channels(audio_path: str) -> int:
+        """Количество каналов в файле (по заголовкам, без декодирования)"""
+        from pydub.utils import mediainfo
         
-        # Создаем временный файл
-        temp_file = f"temp_{datetime.now().timestamp()}.ogg"
-        temp_path = Path(settings.UPLOAD_DIR) / temp_file
+        try:
+            return int(mediainfo(audio_path).get("channels", 1))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Не удалось определить число каналов {audio_path}: {e}")
+            return 1
+            
+    @staticmethod
+    def _split_channels(audio_path: str, channels: int) -> List[str]:
+        """Выделяет каналы в отдельные моно WAV-файлы одним потоковым проходом ffmpeg"""
+        from pydub import AudioSegment
         
-        # Экспортируем в OGG Opus
-        audio.export(str(temp_path), format="ogg", codec="libopus")
+        base = Path(settings.UPLOAD_DIR) / f"temp_{datetime.now().timestamp()}"
+        paths = [f"{base}_ch{index}.wav" for index in range(channels)]
         
-        return str(temp_path)
-    
-    async def _send_recognition_request(self, audio_data: bytes, language: str) -> str:
-        """Отправляет запрос на распознавание к Yandex API"""
+        command = [AudioSegment.converter, "-y", "-v", "error", "-i", audio_path]
+        for index, path in enumerate(paths):
+            command += ["-map", "0:a:0", "-af", f"pan=mono|c0=c{index}", "-c:a", "pcm_s16le", path]
+            
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise Exception(f"Ошибка разделения каналов: {process.stderr.decode(errors='replace')}")
+        return paths
         
-        headers = {
-            'Authorization': f'Bearer {self.iam_token}',
-            'Content-Type': 'audio/ogg',
-        }
+    async def _transcribe_channel(self, channel_path: str, language: str, label: str) -> Tuple[Transcript, TrimStats]:
+        """Распознает реплики одного канала (файл канала читается окнами, а не целиком)"""
+        from app.services.audio_preprocess import speech_regions
+        from app.services.audio_stream import iter_pcm_windows, scan_energy, wav_rate
         
-        params = {
-            'topic': 'general',
-            'folderId': self.folder_id,
-            'lang': language,
-            'format': 'oggopus'
-        }
+        rate = await self._run_blocking(wav_rate, channel_path)
+        energy, total = await self._run_blocking(lambda: scan_energy(iter_pcm_windows(channel_path, rate), rate))
+        regions = speech_regions(energy, total, rate)
+        
+        # Синхронный API ограничен по длительности, длинные реплики режем на части
+        max_samples = int(settings.UTTERANCE_MAX_SECONDS * rate)
+        pieces = [
+            (start, min(start + max_samples, end))
+            for begin, end in regions
+            for start in range(begin, end, max_samples)
+        ]
         
-        logger.info("Отправляю запрос к Yandex SpeechKit API...")
+        # Участок читается и кодируется, только когда для него есть место среди
+        # запросов: тела всех реплик длинного звонка не копятся в ожидании отправки
+        pending = asyncio.Semaphore(self.client.max_concurrent_requests)
         
-        response = requests.post(
-            self.api_url,
-            headers=headers,
-            params=params,
-            data=audio_data,
-            timeout=settings.API_TIMEOUT
+        async def recognize(start: int, end: int) -> Tuple[Transcript, int]:
+            async with pending:
+                return await self._recognize_piece(channel_path, start, end, language, label)
+                
+        uploads = await asyncio.gather(*(recognize(start, end) for start, end in pieces))
+        
+        processed = sum(end - start for start, end in pieces)
+        stats = TrimStats(
+            original_seconds=total / rate,
+            processed_seconds=processed / rate,
+            pcm_bytes_saved=(total - processed) * 2
         )
+        stats.estimate_upload_savings(sum(size for _, size in uploads))
         
-        if response.status_code != 200:
-            error_msg = f"API ошибка: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+        segments = [segment for transcript, _ in uploads for segment in transcript]
+        segments.sort(key=lambda segment: segment.start)
+        logger.info(f"Канал {label}: {len(pieces)} реплик, {len(segments)} фраз")
+        return Transcript(segments), stats
         
-        # Парсим ответ
-        result = response.json()
-        text = self._extract_text_from_response(result)
+    async def _recognize_piece(
+        self,
+        channel_path: str,
+        start: int,
+        end: int,
+        language: str,
+        label: str
+    ) -> Tuple[Transcript, int]:
+        """Кодирует и распознает участок канала, возвращает результат и размер отправки"""
+        from app.services.audio_stream import encode_pcm_opus, read_wav_region
         
-        if not text:
-            raise Exception("Не удалось распознать речь в файле")
+        def encode() -> Tuple[bytes, int]:
+            samples, rate = read_wav_region(channel_path, start, end)
+            return encode_pcm_opus(samples, rate), rate
+            
+        audio_data, rate = await self._run_blocking(encode)
+        transcript = await self.client.send(
+            audio_data,
+            language,
+            (end - start) / rate,
+            offset=start / rate,
+            channel=label,
+            allow_empty=True
+        )
+        return transcript, len(audio_data)
         
-        return text
-    
-    def _extract_text_from_response(self, response: Dict[str, Any]) -> str:
-        """Извлекает текст из ответа API"""
-        
-        # Новый API возвращает результат в поле 'result'
-        if 'result' in response:
-            if isinstance(response['result'], str):
-                return response['result']
-            elif isinstance(response['result'], dict) and 'chunks' in response['result']:
-                # Старый формат с chunks
-                chunks = response['result']['chunks']
-                text_parts = []
-                
-                for chunk in chunks:
-                    if 'alternatives' in chunk and chunk['alternatives']:
-                        text_parts.append(chunk['alternatives'][0]['text'])
-                
-                return ' '.join(text_parts)
+    async def _convert_cached(
+        self,
+        audio_path: str,
+        trim_silence: bool,
+        content_hash: Optional[str],
+        audio_duration: Optional[float] = None
+    ) -> ConvertedAudio:
+        """Конвертирует аудио или берет ранее сконвертированный файл из кэша"""
+        from app.services.conversion_cache import conversion_cache, conversion_key
+        
+        if not content_hash or not conversion_cache.enabled:
+            return await self._convert_to_ogg(audio_path, trim_silence, audio_duration)
+            
+        key = conversion_key(content_hash, trim_silence)
+        temp_path = str(self._temp_ogg_path())
+        meta = await self._run_blocking(conversion_cache.get, key, temp_path)
+        if meta is not None:
+            logger.info(f"Сконвертированный файл взят из кэша: {key[:12]}")
+            return ConvertedAudio.from_dict({**meta, "path": temp_path})
+            
+        converted = await self._convert_to_ogg(audio_path, trim_silence, audio_duration)
+        meta = converted.to_dict()
+        del meta["path"]
+        await self._run_blocking(conversion_cache.put, key, converted.path, meta)
+        return converted
+        
+    async def _convert_to_ogg(
+        self,
+        audio_path: str,
+        trim_silence: bool = False,
+        audio_duration: Optional[float] = None
+    ) -> ConvertedAudio:
+        """Конвертирует аудио в OGG Opus формат (при необходимости вырезая тишину)"""
+        if not settings.CONVERT_PROCESSES:
+            return await self._run_blocking(self._convert_to_ogg_sync, audio_path, trim_silence, audio_duration)
+            
+        from app.services.conversion_pool import conversion_pool
+        
+        logger.info("Конвертирую аудио в OGG Opus (процесс конвертации)...")
+        temp_path = self._temp_ogg_path()
+        duration, offset_map, trim_stats = await conversion_pool.convert(
+            audio_path, trim_silence, str(temp_path), duration_hint=audio_duration
+        )
+        return ConvertedAudio(str(temp_path), duration, offset_map, trim_stats)
+        
+    def _convert_to_ogg_sync(
+        self,
+        audio_path: str,
+        trim_silence: bool = False,
+        audio_duration: Optional[float] = None
+    ) -> ConvertedAudio:
+        """Синхронная конвертация в пуле потоков (CONVERT_PROCESSES=false)"""
+        from app.services.audio_stream import encode_opus_stream
+        
+        logger.info("Конвертирую аудио в OGG Opus...")
+        temp_path = self._temp_ogg_path()
+        duration, offset_map, trim_stats = encode_opus_stream(
+            audio_path, trim_silence, str(temp_path), duration_hint=audio_duration
+        )
+        return ConvertedAudio(str(temp_path), duration, offset_map, trim_stats)
         
-        return ""
\ No newline at end of file
+    @staticmethod
+    def _temp_ogg_path() -> Path:
+        """Путь для временного OGG-файла"""
+        return Path(settings.UPLOAD_DIR) / f"temp_{datetime.now().timestamp()}.ogg"
@@ -2,60 +2,276 @@
 Сервис для управления задачами
 """
 
+import os
+import time
 import uuid
 import asyncio
+import hashlib
 import logging
-from datetime import datetime
-from typing import Dict, Optional
+import subprocess
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor
 
-from app.models.schemas import TaskStatus
-from app.services.speech_service import YandexSpeechService
+from app.core.config import settings
+from app.models.preprocessing import TrimStats
+from app.models.schemas import Priority, TaskStatus
+from app.models.task import TaskRecord
+from app.services.checkpoint_store import checkpoint_store
+from app.services.conversion_pool import conversion_pool
+from app.services.export_sink import export_sink
+from app.services.rate_limiter import rate_limiter
+from app.services.remote_source import RemoteAudio, remote_source
+from app.services.scheduler import JobScheduler, probe_duration
+from app.services.speech_service import ConvertedAudio, YandexSpeechService
+from app.services.transcript_store import transcript_store
 
 logger = logging.getLogger("speech_service.tasks")
 
+_PRIORITY_ORDER = list(Priority)
+
+
+class DuplicateRequest(Exception):
+    """Задача с этим Idempotency-Key уже создана"""
+    
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        super().__init__(f"Задача уже создана: {task_id}")
+
+
+class IdempotencyConflict(Exception):
+    """Idempotency-Key повторно использован с другим файлом или параметрами"""
+
+
+class ServiceDraining(Exception):
+    """Сервис останавливается и не принимает новые задачи"""
+
 
 class TaskService:
     """Сервис для управления задачами распознавания"""
     
     def __init__(self):
-        self.tasks: Dict[str, Dict] = {}
-        self.speech_service = YandexSpeechService()
-        self.executor = ThreadPoolExecutor(max_workers=5)
+        self.tasks: Dict[str, TaskRecord] = {}
+        # Пул потоков и клиент SpeechKit создаются при первом использовании
+        # (или в warmup при запуске), а не при импорте модуля
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._speech_service: Optional[YandexSpeechService] = None
+        self.scheduler = JobScheduler(self._process_task)
+        # Сериализованные ответы для завершенных задач (LRU) и их суммарный размер
+        self._status_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._status_cache_bytes = 0
+        # (клиент, Idempotency-Key) -> ID задачи
+        self._idempotency: Dict[Tuple[str, str], str] = {}
+        # Отпечаток -> ID выполняющейся задачи и объединенные с ней задачи
+        self._inflight: Dict[str, str] = {}
+        self._followers: Dict[str, List[str]] = {}
+        # Сбрасывается при остановке: новые задачи не принимаются
+        self.accepting = True
+        
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Пул потоков для блокирующей работы с файлами (запросы к SpeechKit — в пуле клиента)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=5)
+        return self._executor
+        
+    @property
+    def speech_service(self) -> YandexSpeechService:
+        """Клиент SpeechKit"""
+        if self._speech_service is None:
+            self._speech_service = YandexSpeechService(self.executor)
+        return self._speech_service
+        
+    async def warmup(self) -> None:
+        """
+        Параллельно готовит все, что нужно первой задаче
+        
+        Создает пул потоков, импортирует модули обработки аудио, открывает
+        соединение с SpeechKit, проверяет ffmpeg и запускает процессы конвертации.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        steps = {
+            "speechkit": loop.run_in_executor(self.executor, self.speech_service.warmup),
+            "ffmpeg": loop.run_in_executor(self.executor, _check_ffmpeg),
+        }
+        if settings.CONVERT_PROCESSES:
+            steps["conversion"] = conversion_pool.warmup()
+        results = await asyncio.gather(*steps.values(), return_exceptions=True)
+        for name, result in zip(steps, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Прогрев {name} не выполнен: {result}")
+        logger.info(f"Прогрев завершен за {time.perf_counter() - started:.2f} сек")
+        
+    @staticmethod
+    def fingerprint(content_hash: str, language: str, trim_silence: bool, split_channels: bool) -> str:
+        """Отпечаток задачи: содержимое файла и влияющие на результат параметры"""
+        params = f"{content_hash}|{language}|{int(trim_silence)}|{int(split_channels)}"
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+        
+    def find_idempotent(self, client_id: str, idempotency_key: str, fingerprint: Optional[str]) -> Optional[str]:
+        """
+        Ищет задачу, ранее созданную с этим Idempotency-Key
+        
+        Args:
+            client_id: Идентификатор клиента (ключи разных клиентов не пересекаются)
+            idempotency_key: Значение заголовка Idempotency-Key
+            fingerprint: Отпечаток текущего запроса
+            
+        Returns:
+            ID задачи или None
+            
+        Raises:
+            IdempotencyConflict: Если ключ использован с другим запросом
+        """
+        task_id = self._idempotency.get((client_id, idempotency_key))
+        task = self.tasks.get(task_id) if task_id else None
+        if task is None:
+            return None
+        if task.fingerprint != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key уже использован для другого файла или параметров")
+        return task_id
+        
+    async def probe_duration(self, audio_path: str) -> float:
+        """
+        Определяет длительность аудио по заголовкам (в пуле потоков)
+        
+        Args:
+            audio_path: Путь к аудиофайлу
+            
+        Returns:
+            Длительность в секундах
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, probe_duration, audio_path)
+        
+    async def probe_remote(self, url: str) -> RemoteAudio:
+        """
+        Читает начало файла по ссылке: размер, формат, длительность (в пуле загрузок)
+        
+        Args:
+            url: Ссылка HTTP(S) или s3://
+            
+        Returns:
+            Сведения о файле
+            
+        Raises:
+            RemoteSourceError: Если ссылка недоступна или запрещена
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(remote_source.executor, remote_source.probe, url)
         
-    def create_task(self, audio_path: str, language: str) -> str:
+    def create_task(
+        self,
+        audio_path: str,
+        language: str,
+        trim_silence: bool = False,
+        split_channels: bool = False,
+        client_id: str = "",
+        audio_duration: float = 0.0,
+        priority: Priority = Priority.INTERACTIVE,
+        rate_limited: bool = False,
+        fingerprint: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        source_url: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> str:
         """
         Создает новую задачу распознавания
         
         Args:
             audio_path: Путь к аудиофайлу
             language: Язык распознавания
+            trim_silence: Вырезать тишину перед отправкой
+            split_channels: Распознавать каналы раздельно
+            client_id: Идентификатор клиента (для справедливой очереди)
+            audio_duration: Длительность аудио в секундах (стоимость задачи)
+            priority: Полоса приоритета
+            rate_limited: Задача занимает место в лимите одновременных задач клиента
+            fingerprint: Отпечаток задачи (одинаковые выполняющиеся задачи объединяются)
+            idempotency_key: Ключ идемпотентности клиента
+            source_url: Ссылка на файл, который загружается в audio_path при обработке
+            content_hash: Хеш содержимого файла (ключ кэша конвертации)
             
         Returns:
             ID задачи
+            
+        Raises:
+            AdmissionRejected: Если очередь перегружена
+            DuplicateRequest: Если задача с этим ключом уже есть
+            IdempotencyConflict: Если ключ использован с другим запросом
+            ServiceDraining: Если сервис останавливается
         """
+        if not self.accepting:
+            raise ServiceDraining("Сервис останавливается, повторите запрос")
+        # Проверка и регистрация выполняются без await, поэтому атомарны
+        # для одновременных одинаковых запросов
+        if idempotency_key:
+            existing = self.find_idempotent(client_id, idempotency_key, fingerprint)
+            if existing:
+                raise DuplicateRequest(existing)
+                
         task_id = str(uuid.uuid4())
         
-        task_data = {
-            "id": task_id,
-            "status": TaskStatus.PENDING,
-            "audio_path": audio_path,
-            "language": language,
-            "created_at": datetime.utcnow(),
-            "completed_at": None,
-            "result": None,
-            "error": None
-        }
-        
-        self.tasks[task_id] = task_data
+        task = self.tasks[task_id] = TaskRecord(
+            task_id,
+            audio_path,
+            language,
+            time.time(),
+            trim_silence=trim_silence,
+            split_channels=split_channels,
+            client_id=client_id,
+            audio_duration=round(audio_duration, 3),
+            priority=priority,
+            rate_limited=rate_limited,
+            fingerprint=fingerprint,
+            source_url=source_url,
+            content_hash=content_hash
+        )
         
-        # Запускаем задачу асинхронно
-        asyncio.create_task(self._process_task(task_id))
+        leader = self._find_leader(fingerprint, priority)
+        if leader is not None:
+            # Такая же задача уже выполняется: ждем ее результата
+            task.leader_id = leader.id
+            task.audio_path = leader.audio_path
+            task.status = leader.status
+            self._followers.setdefault(leader.id, []).append(task_id)
+            logger.info(f"Задача {task_id} объединена с задачей {leader.id}")
+        else:
+            # Ставим в очередь планировщика (может отклонить задачу)
+            try:
+                self.scheduler.submit(task_id, client_id, audio_duration, priority)
+            except Exception:
+                del self.tasks[task_id]
+                raise
+            if fingerprint:
+                self._inflight[fingerprint] = task_id
+            logger.info(
+                f"Создана задача {task_id} для файла {source_url or audio_path} "
+                f"({audio_duration:.1f} сек, {priority.value})"
+            )
         
-        logger.info(f"Создана задача {task_id} для файла {audio_path}")
+        if idempotency_key:
+            self._idempotency[(client_id, idempotency_key)] = task_id
         return task_id
     
-    def get_task_status(self, task_id: str) -> Optional[Dict]:
+    def _find_leader(self, fingerprint: Optional[str], priority: Priority) -> Optional[TaskRecord]:
+        """
+        Выполняющаяся задача с тем же отпечатком
+        
+        Задача не присоединяется к задаче из менее приоритетной полосы,
+        чтобы не ждать ее в очереди.
+        """
+        if not fingerprint:
+            return None
+        leader = self.tasks.get(self._inflight.get(fingerprint, ""))
+        if leader is None or leader.is_finished:
+            return None
+        if _PRIORITY_ORDER.index(leader.priority) > _PRIORITY_ORDER.index(priority):
+            return None
+        return leader
+        
+    def get_task_status(self, task_id: str) -> Optional[TaskRecord]:
         """
         Получает статус задачи
         
@@ -63,11 +279,51 @@ class TaskService:
             task_id: ID задачи
             
         Returns:
-            Данные задачи или None если не найдена
+            Запись задачи или None если не найдена
         """
         return self.tasks.get(task_id)
     
-    def get_all_tasks(self) -> Dict[str, Dict]:
+    def get_status_payload(self, task_id: str) -> Optional[bytes]:
+        """
+        Возвращает сериализованный ответ о статусе задачи
+        
+        Для завершенных задач ответ не меняется, поэтому он сериализуется
+        один раз и дальше отдается из LRU-кэша. Кэш ограничен и числом
+        ответов (STATUS_CACHE_SIZE), и их суммарным размером
+        (STATUS_CACHE_MAX_BYTES).
+        
+        Args:
+            task_id: ID задачи
+            
+        Returns:
+            JSON ответа или None если задача не найдена
+        """
+        payload = self._status_cache.get(task_id)
+        if payload is not None:
+            self._status_cache.move_to_end(task_id)
+            return payload
+            
+        task = self.tasks.get(task_id)
+        if not task:
+            return None
+            
+        payload = task.to_json()
+        if (
+            task.is_finished
+            and settings.STATUS_CACHE_SIZE > 0
+            and len(payload) <= settings.STATUS_CACHE_MAX_BYTES
+        ):
+            self._status_cache[task_id] = payload
+            self._status_cache_bytes += len(payload)
+            while (
+                len(self._status_cache) > settings.STATUS_CACHE_SIZE
+                or self._status_cache_bytes > settings.STATUS_CACHE_MAX_BYTES
+            ):
+                _, evicted = self._status_cache.popitem(last=False)
+                self._status_cache_bytes -= len(evicted)
+        return payload
+        
+    def get_all_tasks(self) -> Dict[str, TaskRecord]:
         """Возвращает все задачи"""
         return self.tasks.copy()
     
@@ -83,31 +339,214 @@ class TaskService:
             logger.error(f"Задача {task_id} не найдена")
             return
         
+        interrupted = False
         try:
             # Обновляем статус
-            task["status"] = TaskStatus.PROCESSING
+            task.status = TaskStatus.PROCESSING
+            task.started_at = time.time()
+            for follower_id in self._followers.get(task_id, ()):
+                self.tasks[follower_id].status = TaskStatus.PROCESSING
             logger.info(f"Начинаю обработку задачи {task_id}")
             
+            loop = asyncio.get_running_loop()
+            if task.source_url and not os.path.exists(task.audio_path):
+                # Файл по ссылке потоком декодируется в WAV (в пуле загрузок)
+                await loop.run_in_executor(
+                    remote_source.executor,
+                    remote_source.download_audio,
+                    task.source_url,
+                    task.audio_path,
+                    task.split_channels
+                )
+            
             # Выполняем распознавание
-            result = await self.speech_service.transcribe_audio(
-                task["audio_path"], 
-                task["language"]
+            result, task.preprocessing = await self.speech_service.transcribe_audio(
+                task.audio_path,
+                task.language,
+                trim_silence=task.trim_silence,
+                split_channels=task.split_channels,
+                stages=task.stages,
+                content_hash=task.content_hash,
+                audio_duration=task.audio_duration
             )
             
-            # Обновляем результат
-            task["status"] = TaskStatus.COMPLETED
-            task["result"] = result
-            task["completed_at"] = datetime.utcnow()
+            # Сохраняем результат в хранилище транскриптов
+            await loop.run_in_executor(self.executor, transcript_store.save, task_id, result)
+            task.set_result(
+                result,
+                str(transcript_store.text_path(task_id)),
+                str(transcript_store.segments_path(task_id)),
+                keep_inline=len(result.text) <= settings.RESULT_INLINE_LIMIT
+            )
+            task.completed_at = time.time()
+            task.status = TaskStatus.COMPLETED
+            export_sink.add(task)
             
             logger.info(f"Задача {task_id} завершена успешно")
             
         except Exception as e:
             # Обновляем ошибку
-            task["status"] = TaskStatus.FAILED
-            task["error"] = str(e)
-            task["completed_at"] = datetime.utcnow()
+            task.error = str(e)
+            task.completed_at = time.time()
+            task.status = TaskStatus.FAILED
             
             logger.error(f"Задача {task_id} завершена с ошибкой: {e}")
+            
+        except asyncio.CancelledError:
+            # Остановка сервиса: задача продолжится после перезапуска
+            interrupted = True
+            # Новые такие же задачи к прерванной не присоединяются (после перезапуска отпечаток восстановится)
+            self._forget_fingerprint(task)
+            for record in [task, *(self.tasks[i] for i in self._followers.get(task_id, ()))]:
+                record.status = TaskStatus.PENDING
+                record.started_at = None
+            logger.warning(f"Обработка задачи {task_id} прервана остановкой сервиса")
+            raise
+            
+        finally:
+            if not interrupted:
+                await self._resolve_followers(task)
+                # Освобождаем место в лимите одновременных задач клиента
+                if task.rate_limited:
+                    await rate_limiter.release(task.client_id)
+                
+    async def _resolve_followers(self, leader: TaskRecord) -> None:
+        """
+        Передает итог задачи объединенным с ней задачам
+        
+        Args:
+            leader: Завершенная задача
+        """
+        self._forget_fingerprint(leader)
+        follower_ids = self._followers.pop(leader.id, [])
+        
+        loop = asyncio.get_running_loop()
+        for follower_id in follower_ids:
+            follower = self.tasks.get(follower_id)
+            if follower is None:
+                continue
+            try:
+                if leader.status == TaskStatus.COMPLETED:
+                    await loop.run_in_executor(self.executor, transcript_store.link, leader.id, follower_id)
+                    follower.copy_result(
+                        leader,
+                        str(transcript_store.text_path(follower_id)),
+                        str(transcript_store.segments_path(follower_id))
+                    )
+                    export_sink.add(follower)
+                else:
+                    follower.copy_result(leader, None, None)
+            except Exception as e:
+                follower.error = f"Не удалось получить результат задачи {leader.id}: {e}"
+                follower.completed_at = time.time()
+                follower.status = TaskStatus.FAILED
+            finally:
+                if follower.rate_limited:
+                    await rate_limiter.release(follower.client_id)
+        
+        if follower_ids:
+            logger.info(f"Результат задачи {leader.id} передан {len(follower_ids)} объединенным задачам")
+            
+    def _forget_fingerprint(self, leader: TaskRecord) -> None:
+        """Задача больше не выполняется: одинаковые задачи к ней не присоединяются"""
+        if leader.fingerprint and self._inflight.get(leader.fingerprint) == leader.id:
+            del self._inflight[leader.fingerprint]
+            
+    async def shutdown(self, timeout: float) -> None:
+        """
+        Останавливает прием задач, дожидается выполняющихся и сохраняет все задачи
+        
+        Задачи, не завершившиеся за timeout, прерываются; сконвертированный
+        файл сохраняется вместе с контрольной точкой, чтобы после
+        перезапуска не конвертировать аудио повторно. Завершенные задачи
+        тоже сохраняются: их результаты остаются доступны после перезапуска.
+        
+        Args:
+            timeout: Сколько ждать выполняющиеся задачи, сек
+        """
+        self.accepting = False
+        interrupted = await self.scheduler.drain(timeout)
+        
+        keys: Dict[str, List[str]] = {}
+        for (_, key), task_id in self._idempotency.items():
+            keys.setdefault(task_id, []).append(key)
+            
+        def records():
+            for task in self.tasks.values():
+                data = task.to_checkpoint()
+                converted = task.stages.get("converted")
+                data["stages"] = {"converted": converted.to_dict()} if converted is not None else {}
+                data["preprocessing"] = task.preprocessing.to_dict() if task.preprocessing else None
+                data["idempotency_keys"] = keys.get(task.id, [])
+                yield data
+                
+        conversion_pool.shutdown()
+        remote_source.shutdown()
+        unfinished = sum(1 for task in self.tasks.values() if not task.is_finished)
+        try:
+            saved = checkpoint_store.save(records())
+        except OSError as e:
+            logger.error(f"Не удалось сохранить задачи: {e}")
+            return
+            
+        logger.info(
+            f"Остановка: прервано задач {len(interrupted)}, сохранено {saved}, "
+            f"из них продолжатся после запуска {unfinished}"
+        )
+        
+    def restore(self) -> int:
+        """
+        Восстанавливает задачи, сохраненные при прошлой остановке
+        
+        Незавершенные задачи снова ставятся в очередь с прежними ID, ключами
+        идемпотентности и временем ожидания (для старения в очереди),
+        объединенные задачи снова ждут ведущую.
+        
+        Returns:
+            Число задач, поставленных в очередь
+        """
+        restored: List[TaskRecord] = []
+        for path, records in checkpoint_store.claim():
+            for data in records:
+                try:
+                    task = TaskRecord.from_checkpoint(data)
+                    converted = data.get("stages", {}).get("converted")
+                    if converted:
+                        task.stages["converted"] = ConvertedAudio.from_dict(converted)
+                    if data.get("preprocessing"):
+                        task.preprocessing = TrimStats.from_dict(data["preprocessing"])
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Не удалось восстановить задачу из {path.name}: {e}")
+                    continue
+                self.tasks[task.id] = task
+                for key in data.get("idempotency_keys", ()):
+                    self._idempotency[(task.client_id, key)] = task.id
+                if not task.is_finished:
+                    restored.append(task)
+            checkpoint_store.discard(path)
+            
+        now = time.time()
+        # Сначала ведущие задачи, затем объединенные с ними
+        restored.sort(key=lambda task: task.leader_id is not None)
+        for task in restored:
+            leader = self.tasks.get(task.leader_id) if task.leader_id else None
+            if leader is not None and not leader.is_finished:
+                self._followers.setdefault(leader.id, []).append(task.id)
+                continue
+            task.leader_id = None
+            self.scheduler.submit(
+                task.id,
+                task.client_id,
+                task.audio_duration or 0.0,
+                task.priority,
+                waited=max(now - task.created_at, 0.0)
+            )
+            if task.fingerprint:
+                self._inflight[task.fingerprint] = task.id
+                
+        if restored:
+            logger.info(f"Восстановлено незавершенных задач: {len(restored)}")
+        return len(restored)
     
     def cleanup_old_tasks(self, max_age_hours: int = 24):
         """
@@ -116,17 +555,48 @@ class TaskService:
         Args:
             max_age_hours: Максимальный возраст задач в часах
         """
-        current_time = datetime.utcnow()
+        current_time = time.time()
         tasks_to_remove = []
         
         for task_id, task in self.tasks.items():
-            age = current_time - task["created_at"]
-            if age.total_seconds() > max_age_hours * 3600:
+            age = current_time - task.created_at
+            if age > max_age_hours * 3600:
                 tasks_to_remove.append(task_id)
         
         for task_id in tasks_to_remove:
-            del self.tasks[task_id]
+            task = self.tasks.pop(task_id)
+            payload = self._status_cache.pop(task_id, None)
+            if payload is not None:
+                self._status_cache_bytes -= len(payload)
+            transcript_store.delete(task_id)
             logger.info(f"Удалена старая задача {task_id}")
+            
+        if tasks_to_remove:
+            self._idempotency = {
+                key: task_id for key, task_id in self._idempotency.items() if task_id in self.tasks
+            }
+            # Отпечатки и объединения только выполняющихся задач
+            self._inflight = {
+                fingerprint: task_id for fingerprint, task_id in self._inflight.items()
+                if task_id in self.tasks and not self.tasks[task_id].is_finished
+            }
+            self._followers = {
+                leader_id: [follower_id for follower_id in follower_ids if follower_id in self.tasks]
+                for leader_id, follower_ids in self._followers.items()
+                if leader_id in self.tasks
+            }
+
+
+def _check_ffmpeg() -> None:
+    """Находит ffmpeg (pydub ищет его при импорте) и загружает его в кэш ОС"""
+    from pydub import AudioSegment
+    
+    subprocess.run(
+        [AudioSegment.converter, "-version"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True
+    )
 
 
 # Глобальный экземпляр сервиса задач
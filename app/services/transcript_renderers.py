@@ -0,0 +1,96 @@
+"""
+Потоковые рендеры транскриптов (TXT, SRT, WebVTT, JSON)
+
+Каждый рендер — генератор строк по одному фрагменту, поэтому длинные
+транскрипты не собираются в одну большую строку.
+"""
+
+import json
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from app.models.schemas import TranscriptFormat
+from app.models.transcript import Segment
+
+
+# Максимальная длительность одного субтитра, если известны слова
+MAX_CUE_SECONDS = 6.0
+MAX_CUE_WORDS = 14
+
+
+def _format_time(seconds: float, separator: str) -> str:
+    """Время в формате HH:MM:SS<sep>mmm"""
+    millis = int(round(max(seconds, 0.0) * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def _speaker_prefix(channel) -> str:
+    """Метка канала (говорящего) перед текстом"""
+    return f"[{channel}] " if channel is not None else ""
+
+
+def _iter_cues(segments: Iterable[Segment]) -> Iterator[Tuple[float, float, str]]:
+    """Разбивает фрагменты на субтитры удобной длины (по словам, если они есть)"""
+    for segment in segments:
+        if not segment.text:
+            continue
+
+        prefix = _speaker_prefix(segment.channel)
+        if not segment.words:
+            yield segment.start, segment.end, prefix + segment.text
+            continue
+
+        cue: List = []
+        for word in segment.words:
+            if cue and (
+                word.end - cue[0].start > MAX_CUE_SECONDS or len(cue) >= MAX_CUE_WORDS
+            ):
+                yield cue[0].start, cue[-1].end, prefix + " ".join(w.text for w in cue)
+                cue = []
+            cue.append(word)
+        if cue:
+            yield cue[0].start, cue[-1].end, prefix + " ".join(w.text for w in cue)
+
+
+def render_text(task_id: str, segments: Iterable[Segment]) -> Iterator[str]:
+    """Простой текст: одна фраза на строку"""
+    for segment in segments:
+        if segment.text:
+            yield f"{_speaker_prefix(segment.channel)}{segment.text}\n"
+
+
+def render_srt(task_id: str, segments: Iterable[Segment]) -> Iterator[str]:
+    """Субтитры SubRip (SRT)"""
+    for index, (start, end, text) in enumerate(_iter_cues(segments), 1):
+        yield (
+            f"{index}\n"
+            f"{_format_time(start, ',')} --> {_format_time(end, ',')}\n"
+            f"{text}\n\n"
+        )
+
+
+def render_vtt(task_id: str, segments: Iterable[Segment]) -> Iterator[str]:
+    """Субтитры WebVTT"""
+    yield "WEBVTT\n\n"
+    for start, end, text in _iter_cues(segments):
+        yield f"{_format_time(start, '.')} --> {_format_time(end, '.')}\n{text}\n\n"
+
+
+def render_json(task_id: str, segments: Iterable[Segment]) -> Iterator[str]:
+    """JSON с фразами, словами, временем и уверенностью"""
+    yield f'{{"task_id":{json.dumps(task_id)},"segments":['
+    separator = ""
+    for segment in segments:
+        yield separator + json.dumps(segment.to_dict(), ensure_ascii=False)
+        separator = ","
+    yield "]}"
+
+
+RENDERERS: Dict[TranscriptFormat, Tuple[Callable[[str, Iterable[Segment]], Iterator[str]], str, str]] = {
+    TranscriptFormat.TEXT: (render_text, "text/plain; charset=utf-8", "txt"),
+    TranscriptFormat.SRT: (render_srt, "application/x-subrip; charset=utf-8", "srt"),
+    TranscriptFormat.VTT: (render_vtt, "text/vtt; charset=utf-8", "vtt"),
+    TranscriptFormat.JSON: (render_json, "application/json", "json"),
+}
@@ -0,0 +1,248 @@
+"""
+Хранилище транскриптов в OUTPUT_DIR
+
+Для каждой задачи пишутся три файла (дозаписью; save() заменяет их целиком):
+
+* ``{task_id}.txt`` — текст, одна фраза на строку (отдается с поддержкой Range);
+* ``{task_id}.segments.jsonl`` — компактные фрагменты со словами и временем;
+* ``{task_id}.idx`` — индекс фиксированной ширины: смещения фразы в обоих
+  файлах и ее время, что позволяет листать фрагменты без чтения файла целиком.
+
+Чтение идет через mmap, поэтому многочасовые транскрипты не загружаются
+в Python-строки.
+"""
+
+import mmap
+import os
+import shutil
+import struct
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Iterable, Optional, Tuple
+
+from app.core.config import settings
+from app.models.transcript import Segment, Transcript
+
+logger = logging.getLogger("speech_service.store")
+
+INDEX_MAGIC = b"STIDX\x00\x01\x00"
+# text_offset, text_length, segment_offset, segment_length, start, end
+INDEX_RECORD = struct.Struct("<QIQIdd")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class TranscriptWriter:
+    """Дозапись фрагментов транскрипта в хранилище"""
+
+    def __init__(self, text_path: Path, segments_path: Path, index_path: Path):
+        new_index = not index_path.exists() or index_path.stat().st_size == 0
+        self._text = open(text_path, "ab")
+        self._segments = open(segments_path, "ab")
+        self._index = open(index_path, "ab")
+        if new_index:
+            self._index.write(INDEX_MAGIC)
+
+    def append(self, segment: Segment) -> None:
+        """Дописывает один фрагмент"""
+        text = segment.text.replace("\n", " ").encode("utf-8")
+        compact = segment.to_compact().encode("utf-8")
+
+        text_offset = self._text.tell()
+        segment_offset = self._segments.tell()
+
+        self._text.write(text + b"\n")
+        self._segments.write(compact + b"\n")
+        self._index.write(INDEX_RECORD.pack(
+            text_offset, len(text), segment_offset, len(compact), segment.start, segment.end
+        ))
+
+    def extend(self, segments: Iterable[Segment]) -> None:
+        """Дописывает несколько фрагментов"""
+        for segment in segments:
+            self.append(segment)
+
+    def flush(self) -> None:
+        """Сбрасывает буферы на диск (для частичных результатов)"""
+        # Индекс пишется последним, чтобы читатели не увидели запись без данных
+        self._text.flush()
+        self._segments.flush()
+        self._index.flush()
+
+    def close(self) -> None:
+        """Закрывает файлы"""
+        for f in (self._text, self._segments, self._index):
+            f.close()
+
+    def __enter__(self) -> "TranscriptWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class TranscriptStore:
+    """Индексированное хранилище транскриптов на диске"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def text_path(self, task_id: str) -> Path:
+        """Путь к текстовому файлу"""
+        return self.root / f"{task_id}.txt"
+
+    def segments_path(self, task_id: str) -> Path:
+        """Путь к файлу фрагментов"""
+        return self.root / f"{task_id}.segments.jsonl"
+
+    def index_path(self, task_id: str) -> Path:
+        """Путь к индексу"""
+        return self.root / f"{task_id}.idx"
+
+    def writer(self, task_id: str) -> TranscriptWriter:
+        """Открывает транскрипт задачи на дозапись"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        return TranscriptWriter(
+            self.text_path(task_id),
+            self.segments_path(task_id),
+            self.index_path(task_id)
+        )
+
+    def save(self, task_id: str, transcript: Transcript) -> None:
+        """
+        Сохраняет транскрипт целиком, заменяя прежний
+
+        Файлы пишутся во временные и подменяются, поэтому повтор задачи
+        (после ошибки или перезапуска) не дописывает транскрипт второй раз.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        paths = (self.text_path(task_id), self.segments_path(task_id), self.index_path(task_id))
+        temp_paths = tuple(path.with_name(f".{path.name}.{os.getpid()}.tmp") for path in paths)
+        try:
+            with TranscriptWriter(*temp_paths) as writer:
+                writer.extend(transcript)
+            # Индекс подменяется последним: по нему читатели находят фрагменты
+            for temp_path, path in zip(temp_paths, paths):
+                os.replace(temp_path, path)
+        finally:
+            for temp_path in temp_paths:
+                if temp_path.exists():
+                    os.remove(temp_path)
+
+    def exists(self, task_id: str) -> bool:
+        """Есть ли сохраненный транскрипт задачи"""
+        return self.index_path(task_id).exists()
+
+    def link(self, source_id: str, task_id: str) -> None:
+        """Делает результат задачи source_id доступным под task_id (жесткие ссылки, без копирования)"""
+        for source, target in (
+            (self.text_path(source_id), self.text_path(task_id)),
+            (self.segments_path(source_id), self.segments_path(task_id)),
+            (self.index_path(source_id), self.index_path(task_id)),
+        ):
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+                
+    def delete(self, task_id: str) -> None:
+        """Удаляет файлы транскрипта"""
+        for path in (self.text_path(task_id), self.segments_path(task_id), self.index_path(task_id)):
+            if path.exists():
+                os.remove(path)
+
+    def count(self, task_id: str) -> int:
+        """Количество фрагментов в транскрипте"""
+        size = self.index_path(task_id).stat().st_size
+        return max(size - len(INDEX_MAGIC), 0) // INDEX_RECORD.size
+
+    def text_size(self, task_id: str) -> int:
+        """Размер текстового файла в байтах"""
+        return self.text_path(task_id).stat().st_size
+
+    def read_text(self, task_id: str) -> str:
+        """Полный текст (фразы через пробел, как в поле result)"""
+        with open(self.text_path(task_id), "r", encoding="utf-8") as f:
+            return " ".join(line.rstrip("\n") for line in f if line.strip())
+
+    def iter_segments(self, task_id: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Segment]:
+        """Фрагменты с номерами [start, stop) по одному"""
+        for raw in self.iter_segments_raw(task_id, start, stop):
+            yield Segment.from_compact(raw.decode("utf-8"))
+
+    def iter_segments_raw(self, task_id: str, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """Компактные JSON-фрагменты [start, stop) без разбора, по индексу"""
+        total = self.count(task_id)
+        stop = total if stop is None else min(stop, total)
+        if start >= stop:
+            return
+
+        with _mapped(self.index_path(task_id)) as index, _mapped(self.segments_path(task_id)) as segments:
+            for number in range(start, stop):
+                position = len(INDEX_MAGIC) + number * INDEX_RECORD.size
+                _, _, offset, length, _, _ = INDEX_RECORD.unpack_from(index, position)
+                yield segments[offset:offset + length]
+
+    def iter_text_range(self, task_id: str, start: int, end: int) -> Iterator[bytes]:
+        """Байты текстового файла [start, end] (включительно) блоками через mmap"""
+        with _mapped(self.text_path(task_id)) as text:
+            position = start
+            while position <= end:
+                chunk_end = min(position + READ_CHUNK_SIZE, end + 1)
+                yield text[position:chunk_end]
+                position = chunk_end
+
+
+@contextmanager
+def _mapped(path: Path):
+    """Отображает файл в память только для чтения"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range (одиночный диапазон байт)
+
+    Args:
+        range_header: Значение заголовка Range
+        size: Размер ресурса
+
+    Returns:
+        (start, end) включительно или None если заголовка нет
+
+    Raises:
+        ValueError: Если диапазон некорректен или не пересекается с ресурсом
+    """
+    if not range_header:
+        return None
+
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError(f"Неподдерживаемый диапазон: {range_header}")
+
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+    else:
+        # Суффиксный диапазон: последние N байт
+        length = int(last)
+        start = max(size - length, 0)
+        end = size - 1
+
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"Диапазон вне файла: {range_header}")
+    return start, end
+
+
+# Глобальное хранилище транскриптов
+transcript_store = TranscriptStore(settings.OUTPUT_DIR)
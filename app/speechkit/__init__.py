@@ -0,0 +1,27 @@
+"""
+Клиент синхронного распознавания Yandex SpeechKit
+
+Используется сервисом и CLI:
+
+    from app.speechkit import SpeechKitClient
+
+    client = SpeechKitClient()
+    transcript = await client.recognize("input/audio.ogg", "ru-RU")
+    async for result in client.recognize_many(paths, concurrency=8):
+        ...
+
+Для скриптов без asyncio — SyncSpeechKitClient с теми же методами.
+"""
+
+from app.speechkit.capabilities import CapabilityCache
+from app.speechkit.client import ENCODINGS, RecognitionResult, SpeechKitClient, SpeechKitError
+from app.speechkit.sync import SyncSpeechKitClient
+
+__all__ = [
+    "CapabilityCache",
+    "ENCODINGS",
+    "RecognitionResult",
+    "SpeechKitClient",
+    "SpeechKitError",
+    "SyncSpeechKitClient",
+]
@@ -0,0 +1,78 @@
+"""
+Кэш возможностей endpoint'ов SpeechKit
+"""
+
+import os
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger("speech_service.speechkit")
+
+
+class CapabilityCache:
+    """
+    Какие кодировки поддерживает каждый endpoint
+
+    Удачная и отвергнутые пары хранятся в JSON-файле с TTL, поэтому
+    следующие запуски сразу идут в проверенную пару, а не перебирают
+    все заново.
+    """
+
+    def __init__(self, path: Path, ttl: float):
+        self.path = Path(path)
+        self.ttl = ttl
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries: Dict[str, Dict[str, Any]] = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def order(self, endpoints: List[str], encodings: List[str]) -> List[Tuple[str, str]]:
+        """Пары endpoint/кодировка для перебора: сначала удачная, без отвергнутых"""
+        now = time.time()
+        known, rest = [], []
+        for endpoint in endpoints:
+            supported = self._entries.get(endpoint, {}).get("supported")
+            for encoding in encodings:
+                if self.rejected(endpoint, encoding):
+                    continue
+                if supported and supported[0] == encoding and supported[1] > now:
+                    known.append((endpoint, encoding))
+                else:
+                    rest.append((endpoint, encoding))
+        return known + rest
+
+    def rejected(self, endpoint: str, encoding: str) -> bool:
+        """Отвергнута ли пара (или endpoint целиком) в пределах TTL"""
+        rejected = self._entries.get(endpoint, {}).get("rejected", {})
+        now = time.time()
+        return rejected.get("*", 0) > now or rejected.get(encoding, 0) > now
+
+    def remember(self, endpoint: str, encoding: str) -> None:
+        """Запоминает удачную пару"""
+        entry = self._entries.setdefault(endpoint, {})
+        entry["supported"] = [encoding, time.time() + self.ttl]
+        entry.get("rejected", {}).pop(encoding, None)
+        self._save()
+
+    def reject(self, endpoint: str, encoding: str = "*") -> None:
+        """Запоминает неподдерживаемую кодировку ('*' — endpoint целиком)"""
+        entry = self._entries.setdefault(endpoint, {})
+        entry.setdefault("rejected", {})[encoding] = time.time() + self.ttl
+        supported = entry.get("supported")
+        if supported and encoding in ("*", supported[0]):
+            del entry["supported"]
+        self._save()
+
+    def _save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш возможностей SpeechKit: {e}")
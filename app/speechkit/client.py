@@ -0,0 +1,591 @@
+"""
+Асинхронный клиент синхронного распознавания Yandex SpeechKit
+
+Общий для сервиса и CLI: подготовка тела запроса, выбор пары
+endpoint/кодировка, отправка (частями, если файл больше лимита запроса)
+и разбор ответа в Transcript.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from functools import partial
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.models.preprocessing import OffsetMap
+from app.models.transcript import Transcript, parse_recognition_response
+from app.speechkit.capabilities import CapabilityCache
+
+logger = logging.getLogger("speech_service.speechkit")
+
+# Кодировки тела запроса: формат SpeechKit и частота PCM (для OGG Opus частота
+# выбирается планом кодирования). Тело всегда двоичное.
+ENCODINGS: Dict[str, Tuple[str, Optional[int]]] = {
+    "oggopus": ("oggopus", None),
+    "lpcm16": ("lpcm", 16000),
+    "lpcm8": ("lpcm", 8000),
+}
+
+# Частота единственного декодирования источника при переборе кодировок
+DECODE_RATE = 48000
+
+# Ответы, после которых пара endpoint/кодировка запоминается как неподдерживаемая
+ENDPOINT_MISSING = (404, 405)
+ENCODING_REJECTED = (415,)
+AUTH_FAILED = (401, 403)
+
+# Часть тела запроса: файл, начало и конец в секундах от начала аудио
+Part = Tuple[str, float, float]
+
+Source = Union[str, "os.PathLike[str]"]
+
+
+class SpeechKitError(Exception):
+    """Ошибочный ответ SpeechKit"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"API ошибка: {status} - {message}")
+        self.status = status
+
+
+class RecognitionResult:
+    """Результат распознавания одного источника в recognize_many"""
+
+    __slots__ = ("index", "source", "transcript", "error", "seconds")
+
+    def __init__(
+        self,
+        index: int,
+        source: Source,
+        transcript: Optional[Transcript] = None,
+        error: Optional[BaseException] = None,
+        seconds: float = 0.0
+    ):
+        self.index = index
+        self.source = source
+        self.transcript = transcript
+        self.error = error
+        # Время от начала обработки источника до результата
+        self.seconds = seconds
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class SpeechKitClient:
+    """
+    Асинхронный клиент SpeechKit
+
+    HTTP-запросы идут через пул соединений requests в собственном пуле
+    потоков клиента (по потоку на разрешенный одновременный запрос): долгие
+    ответы SpeechKit не занимают пул исполнителей, где идут конвертация и
+    работа с файлами. Число одновременных запросов ограничено для всех
+    вызовов клиента.
+    С одним endpoint и одной кодировкой (как в сервисе) файл кодируется
+    в OGG Opus прямо из источника. С несколькими источник декодируется
+    один раз, а пары перебираются в порядке кэша возможностей.
+    """
+
+    def __init__(
+        self,
+        iam_token: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        endpoints: Optional[List[str]] = None,
+        encodings: Optional[List[str]] = None,
+        capabilities: Optional[CapabilityCache] = None,
+        max_concurrent_requests: Optional[int] = None,
+        timeout: Optional[float] = None,
+        executor: Optional[Executor] = None,
+        work_dir: Optional[str] = None
+    ):
+        self.iam_token = settings.YANDEX_CLOUD_IAM_TOKEN if iam_token is None else iam_token
+        self.folder_id = settings.YANDEX_FOLDER_ID if folder_id is None else folder_id
+        self.endpoints = list(endpoints or [settings.YANDEX_STT_URL])
+        self.encodings = list(encodings or ["oggopus"])
+        self.capabilities = capabilities
+        self.max_concurrent_requests = max_concurrent_requests or settings.MAX_CONCURRENT_REQUESTS
+        self.timeout = timeout or settings.API_TIMEOUT
+        # Блокирующая работа с файлами (ffmpeg, кодирование) выполняется вне event loop
+        self.executor = executor
+        self.work_dir = work_dir or settings.UPLOAD_DIR
+        # Общий лимит одновременных запросов к SpeechKit
+        self.upstream_limit = asyncio.Semaphore(self.max_concurrent_requests)
+        # Конвертации в recognize / recognize_many (нагружают CPU)
+        self.convert_limit = asyncio.Semaphore(os.cpu_count() or 1)
+        self._session = None
+        self._http_executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def session(self):
+        """HTTP-сессия с пулом соединений к SpeechKit (создается при первом запросе)"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=self.max_concurrent_requests)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    @property
+    def http_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков HTTP-запросов по лимиту одновременных запросов (создается при первом запросе)"""
+        if self._http_executor is None:
+            self._http_executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_requests, thread_name_prefix="speechkit-http"
+            )
+        return self._http_executor
+
+    def warmup(self) -> None:
+        """Открывает соединение с SpeechKit заранее (блокирующий вызов; ошибки не критичны)"""
+        parts = urlsplit(self.endpoints[0])
+        try:
+            # Любой ответ оставляет в пуле готовое (TLS) соединение
+            self.session.head(f"{parts.scheme}://{parts.netloc}/", timeout=5)
+        except Exception as e:
+            logger.warning(f"Не удалось заранее подключиться к SpeechKit: {e}")
+
+    def close(self) -> None:
+        """Закрывает соединения"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self._http_executor is not None:
+            self._http_executor.shutdown(wait=False)
+            self._http_executor = None
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Выполняет блокирующую функцию в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def send(
+        self,
+        audio_data: bytes,
+        language: str,
+        duration: float,
+        offset: float = 0.0,
+        channel: Optional[str] = None,
+        allow_empty: bool = False,
+        endpoint: Optional[str] = None,
+        encoding: str = "oggopus"
+    ) -> Transcript:
+        """
+        Отправляет одно тело запроса на распознавание
+
+        Args:
+            audio_data: Аудио в кодировке encoding
+            language: Язык распознавания
+            duration: Длительность аудио (для ответа без временных меток)
+            offset: Смещение аудио от начала записи, сек
+            channel: Метка канала для фраз
+            allow_empty: Не считать ошибкой пустой результат
+            endpoint: URL распознавания (по умолчанию первый)
+            encoding: Ключ ENCODINGS
+
+        Raises:
+            SpeechKitError: При ответе с ошибкой
+        """
+        audio_format, sample_rate = ENCODINGS[encoding]
+        headers = {"Authorization": f"Bearer {self.iam_token}"}
+        if audio_format == "oggopus":
+            headers["Content-Type"] = "audio/ogg"
+
+        params: Dict[str, Any] = {
+            "topic": "general",
+            "folderId": self.folder_id,
+            "lang": language,
+            "format": audio_format,
+        }
+        if sample_rate:
+            params["sampleRateHertz"] = sample_rate
+
+        logger.info("Отправляю запрос к Yandex SpeechKit API...")
+
+        loop = asyncio.get_running_loop()
+        async with self.upstream_limit:
+            response = await loop.run_in_executor(self.http_executor, partial(
+                self.session.post,
+                endpoint or self.endpoints[0],
+                headers=headers,
+                params=params,
+                data=audio_data,
+                timeout=self.timeout
+            ))
+
+        if response.status_code != 200:
+            raise SpeechKitError(response.status_code, response.text)
+
+        transcript = parse_recognition_response(response.json(), offset=offset, duration=duration, channel=channel)
+        if not transcript and not allow_empty:
+            raise Exception("Не удалось распознать речь в файле")
+        return transcript
+
+    async def recognize_file(
+        self,
+        ogg_path: str,
+        language: str,
+        duration: float,
+        endpoint: Optional[str] = None
+    ) -> Transcript:
+        """
+        Распознает готовый OGG Opus; файл больше лимита запроса по размеру
+        или длительности (UTTERANCE_MAX_SECONDS) отправляется частями
+
+        Args:
+            ogg_path: Файл OGG Opus
+            language: Язык распознавания
+            duration: Длительность файла, сек
+            endpoint: URL распознавания (по умолчанию первый)
+        """
+        size = os.path.getsize(ogg_path)
+        logger.info(f"Размер OGG файла: {size} байт")
+        if size <= settings.STT_MAX_REQUEST_BYTES and duration <= settings.UTTERANCE_MAX_SECONDS:
+            with open(ogg_path, "rb") as f:
+                audio_data = f.read()
+            return await self.send(audio_data, language, duration, endpoint=endpoint)
+
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as parts_dir:
+            parts = await self._run_blocking(split_opus, ogg_path, size, duration, parts_dir)
+            return await self._send_parts(parts, language, endpoint, "oggopus")
+
+    async def recognize(
+        self,
+        source: Source,
+        language: str = "ru-RU",
+        trim_silence: bool = False,
+        duration: Optional[float] = None
+    ) -> Transcript:
+        """
+        Распознает аудиофайл любого формата
+
+        Args:
+            source: Путь к файлу
+            language: Язык распознавания
+            trim_silence: Вырезать тишину перед отправкой (VAD)
+            duration: Длительность файла, если известна (для выбора битрейта)
+
+        Returns:
+            Результат с временем по исходному файлу
+        """
+        os.makedirs(self.work_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as workdir:
+            if self.capabilities is None and len(self.endpoints) == 1 and self.encodings == ["oggopus"]:
+                transcript, offset_map = await self._recognize_direct(str(source), language, trim_silence, duration, workdir)
+            else:
+                transcript, offset_map = await self._negotiate(str(source), language, trim_silence, workdir)
+        if offset_map:
+            transcript.remap_times(offset_map.to_original)
+        return transcript
+
+    async def recognize_many(
+        self,
+        sources: Union[Iterable[Source], AsyncIterable[Source]],
+        language: str = "ru-RU",
+        concurrency: int = 4,
+        ordered: bool = False,
+        trim_silence: bool = False
+    ) -> AsyncIterator[RecognitionResult]:
+        """
+        Распознает поток файлов с ограниченной параллельностью
+
+        Источники читаются по мере освобождения мест, поэтому конвертация
+        одних файлов идет, пока другие отправляются. Ошибки не прерывают
+        поток: они возвращаются в RecognitionResult.error.
+
+        Args:
+            sources: Пути к файлам (обычный или асинхронный итератор)
+            language: Язык распознавания
+            concurrency: Файлов в обработке одновременно
+            ordered: Возвращать результаты в порядке источников (иначе — по готовности)
+            trim_silence: Вырезать тишину перед отправкой (VAD)
+
+        Yields:
+            Результат по каждому источнику
+        """
+        exhausted_marker = object()
+        if isinstance(sources, AsyncIterable):
+            iterator = sources.__aiter__()
+
+            async def next_source():
+                try:
+                    return await iterator.__anext__()
+                except StopAsyncIteration:
+                    return exhausted_marker
+        else:
+            sync_iterator = iter(sources)
+
+            async def next_source():
+                return next(sync_iterator, exhausted_marker)
+
+        async def run(index: int, source: Source) -> RecognitionResult:
+            started = time.perf_counter()
+            try:
+                transcript = await self.recognize(source, language, trim_silence)
+                return RecognitionResult(index, source, transcript, seconds=time.perf_counter() - started)
+            except Exception as e:
+                return RecognitionResult(index, source, error=e, seconds=time.perf_counter() - started)
+
+        pending = set()
+        # Ожидание следующего источника: асинхронный поток (например, новые файлы
+        # в папке) может долго молчать, а готовые результаты отдаются без задержки
+        fetching: Optional[asyncio.Future] = None
+        # Готовые результаты, ждущие более ранних (только в режиме ordered)
+        finished: Dict[int, RecognitionResult] = {}
+        next_index = 0
+        next_yield = 0
+        exhausted = False
+        try:
+            while True:
+                # Готовые, но не отданные результаты тоже занимают места: память ограничена
+                if fetching is None and not exhausted and len(pending) + len(finished) < concurrency:
+                    fetching = asyncio.ensure_future(next_source())
+                waiting = pending | {fetching} if fetching is not None else pending
+                if not waiting:
+                    break
+
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if fetching in done:
+                    done.discard(fetching)
+                    source = fetching.result()
+                    fetching = None
+                    if source is exhausted_marker:
+                        exhausted = True
+                    else:
+                        pending.add(asyncio.ensure_future(run(next_index, source)))
+                        next_index += 1
+                pending -= done
+                for future in done:
+                    result = future.result()
+                    if not ordered:
+                        yield result
+                    else:
+                        finished[result.index] = result
+                while next_yield in finished:
+                    yield finished.pop(next_yield)
+                    next_yield += 1
+        finally:
+            if fetching is not None:
+                fetching.cancel()
+            for future in pending:
+                future.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _recognize_direct(
+        self,
+        source: str,
+        language: str,
+        trim_silence: bool,
+        duration: Optional[float],
+        workdir: str
+    ) -> Tuple[Transcript, Optional[OffsetMap]]:
+        """Кодирует источник в OGG Opus (одно декодирование) и отправляет"""
+        from app.services.audio_stream import encode_opus_stream
+
+        ogg_path = os.path.join(workdir, "audio.ogg")
+        async with self.convert_limit:
+            processed, offset_map, _ = await self._run_blocking(
+                encode_opus_stream, source, trim_silence, ogg_path, duration_hint=duration
+            )
+        return await self.recognize_file(ogg_path, language, processed), offset_map
+
+    async def _negotiate(
+        self,
+        source: str,
+        language: str,
+        trim_silence: bool,
+        workdir: str
+    ) -> Tuple[Transcript, Optional[OffsetMap]]:
+        """
+        Перебирает пары endpoint/кодировка, начиная с проверенной
+
+        Источник декодируется один раз в моно WAV; части в каждой кодировке
+        готовятся из него при первой нужде и переиспользуются для всех endpoint.
+        """
+        capabilities = self.capabilities
+        pairs = (
+            capabilities.order(self.endpoints, self.encodings) if capabilities is not None
+            else [(endpoint, encoding) for endpoint in self.endpoints for encoding in self.encodings]
+        )
+
+        wav_path = os.path.join(workdir, "decoded.wav")
+        async with self.convert_limit:
+            duration, offset_map = await self._run_blocking(decode_wav, source, trim_silence, wav_path)
+
+        prepared: Dict[str, List[Part]] = {}
+        errors = []
+        for endpoint, encoding in pairs:
+            if capabilities is not None and capabilities.rejected(endpoint, encoding):
+                # Endpoint отвергнут на предыдущей попытке этого же вызова
+                continue
+            if encoding not in prepared:
+                async with self.convert_limit:
+                    prepared[encoding] = await self._run_blocking(prepare_parts, wav_path, duration, encoding, workdir)
+            first, *rest = prepared[encoding]
+            try:
+                head = await self._send_part(first, language, endpoint, encoding)
+            except SpeechKitError as e:
+                logger.warning(f"{endpoint} ({encoding}): {e}")
+                errors.append(f"{encoding}@{endpoint}: {e.status}")
+                if e.status in AUTH_FAILED:
+                    raise
+                if capabilities is not None:
+                    if e.status in ENDPOINT_MISSING:
+                        capabilities.reject(endpoint)
+                    elif e.status in ENCODING_REJECTED:
+                        capabilities.reject(endpoint, encoding)
+                # Остальные ошибки (400, 5xx) не запоминаются: они могут быть разовыми
+                continue
+            except OSError as e:
+                # Сеть: пробуем следующую пару, но не запоминаем
+                logger.warning(f"{endpoint} ({encoding}): {e}")
+                errors.append(f"{encoding}@{endpoint}: {e}")
+                continue
+
+            logger.info(f"{endpoint} принимает {encoding}")
+            if capabilities is not None:
+                capabilities.remember(endpoint, encoding)
+            # Остальные части — той же парой, она уже проверена
+            tail = await self._send_parts(rest, language, endpoint, encoding, allow_empty=True) if rest else Transcript()
+            transcript = Transcript([*head, *tail])
+            if not transcript:
+                raise Exception("Не удалось распознать речь в файле")
+            return transcript, offset_map
+
+        raise Exception(f"Ни одна пара endpoint/кодировка не сработала: {'; '.join(errors) or 'все отвергнуты кэшем'}")
+
+    async def _send_part(self, part: Part, language: str, endpoint: Optional[str], encoding: str) -> Transcript:
+        path, start, end = part
+        with open(path, "rb") as f:
+            audio_data = f.read()
+        return await self.send(
+            audio_data, language, end - start, offset=start, allow_empty=True, endpoint=endpoint, encoding=encoding
+        )
+
+    async def _send_parts(
+        self,
+        parts: List[Part],
+        language: str,
+        endpoint: Optional[str],
+        encoding: str,
+        allow_empty: bool = False
+    ) -> Transcript:
+        """Распознает части параллельно (в пределах общего лимита) и склеивает по времени"""
+        logger.info(f"Отправка {len(parts)} частями")
+        results = await asyncio.gather(*(self._send_part(part, language, endpoint, encoding) for part in parts))
+        transcript = Transcript(segment for result in results for segment in result)
+        if not transcript and not allow_empty:
+            raise Exception("Не удалось распознать речь в файле")
+        return transcript
+
+
+def split_opus(ogg_path: str, size: int, duration: float, output_dir: str) -> List[Part]:
+    """
+    Делит OGG Opus на части до STT_MAX_REQUEST_BYTES и UTTERANCE_MAX_SECONDS
+    без перекодирования
+
+    Длительность части рассчитывается по среднему битрейту файла и
+    уменьшается, если какая-то часть все равно не поместилась (Opus — VBR).
+    """
+    from app.services.audio_stream import split_ogg
+
+    limit = settings.STT_MAX_REQUEST_BYTES
+    segment_seconds = min(duration * limit * settings.OPUS_SIZE_MARGIN / size, settings.UTTERANCE_MAX_SECONDS)
+    for _ in range(4):
+        parts = split_ogg(ogg_path, segment_seconds, output_dir)
+        largest = max(os.path.getsize(path) for path, _, _ in parts)
+        if largest <= limit:
+            break
+        segment_seconds *= limit * settings.OPUS_SIZE_MARGIN / largest
+    else:
+        raise Exception(f"Не удалось разделить файл на части до {limit} байт")
+
+    logger.info(f"Файл {size} байт, {duration:.0f} сек больше лимита запроса: части по {segment_seconds:.0f} сек")
+    # Хвост короче кадра Opus не распознать
+    return [part for part in parts if part[2] - part[1] >= 0.1]
+
+
+def decode_wav(source: str, trim_silence: bool, wav_path: str) -> Tuple[float, Optional[OffsetMap]]:
+    """
+    Декодирует источник в моно WAV DECODE_RATE (при необходимости только речь)
+
+    Returns:
+        Длительность WAV и карта смещений к исходному файлу
+    """
+    import wave
+    from app.services.audio_preprocess import offset_map_for, speech_regions
+    from app.services.audio_stream import iter_pcm_windows, scan_energy, select_regions
+
+    windows = iter_pcm_windows(source, DECODE_RATE)
+    offset_map = None
+    if trim_silence:
+        energy, total = scan_energy(windows, DECODE_RATE)
+        regions = speech_regions(energy, total, DECODE_RATE)
+        windows = iter_pcm_windows(source, DECODE_RATE)
+        if regions:
+            offset_map = offset_map_for(regions, DECODE_RATE)
+            windows = select_regions(windows, regions)
+
+    samples = 0
+    with wave.open(wav_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(DECODE_RATE)
+        for window in windows:
+            wav.writeframes(window.tobytes())
+            samples += len(window)
+    return samples / DECODE_RATE, offset_map
+
+
+def prepare_parts(wav_path: str, duration: float, encoding: str, workdir: str) -> List[Part]:
+    """
+    Готовит из декодированного WAV части в кодировке encoding, каждая не больше
+    лимита запроса по размеру и UTTERANCE_MAX_SECONDS по длительности
+    """
+    from app.services.audio_stream import encode_opus_stream, iter_pcm_windows
+
+    limit = settings.STT_MAX_REQUEST_BYTES
+    audio_format, sample_rate = ENCODINGS[encoding]
+    if audio_format == "oggopus":
+        ogg_path = os.path.join(workdir, f"{encoding}.ogg")
+        encode_opus_stream(wav_path, False, ogg_path, duration_hint=duration)
+        size = os.path.getsize(ogg_path)
+        if size <= limit and duration <= settings.UTTERANCE_MAX_SECONDS:
+            return [(ogg_path, 0.0, duration)]
+        # Не поместился в один запрос — части без перекодирования
+        parts_dir = os.path.join(workdir, encoding)
+        os.makedirs(parts_dir, exist_ok=True)
+        return split_opus(ogg_path, size, duration, parts_dir)
+
+    # LPCM: сырой int16 без заголовка, части по лимиту запроса (четному — по целым отсчетам)
+    part_bytes = min(limit - limit % 2, int(settings.UTTERANCE_MAX_SECONDS * sample_rate) * 2)
+    parts: List[Part] = []
+    part = None
+    written = 0
+    for window in iter_pcm_windows(wav_path, sample_rate):
+        data = memoryview(window.tobytes())
+        while data:
+            if part is None or part.tell() >= part_bytes:
+                if part is not None:
+                    part.close()
+                path = os.path.join(workdir, f"{encoding}_{len(parts):03d}.raw")
+                start = written / 2 / sample_rate
+                parts.append((path, start, start))
+                part = open(path, "wb")
+            taken = data[:part_bytes - part.tell()]
+            part.write(taken)
+            written += len(taken)
+            data = data[len(taken):]
+            parts[-1] = (parts[-1][0], parts[-1][1], written / 2 / sample_rate)
+    if part is not None:
+        part.close()
+    return parts
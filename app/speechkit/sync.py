@@ -0,0 +1,52 @@
+"""
+Синхронная обертка клиента SpeechKit для скриптов
+"""
+
+import asyncio
+from typing import Iterable, Iterator
+
+from app.models.transcript import Transcript
+from app.speechkit.client import RecognitionResult, SpeechKitClient, Source
+
+
+class SyncSpeechKitClient:
+    """
+    SpeechKitClient с блокирующими вызовами
+
+    Держит собственный event loop: все вызовы идут в одном loop, поэтому
+    общий лимит запросов и пул соединений клиента работают как в сервисе.
+    Не вызывается из работающего event loop.
+    """
+
+    def __init__(self, **options):
+        self._loop = asyncio.new_event_loop()
+        self.client = SpeechKitClient(**options)
+
+    def recognize(self, source: Source, language: str = "ru-RU", **options) -> Transcript:
+        """Распознает файл (параметры как у SpeechKitClient.recognize)"""
+        return self._loop.run_until_complete(self.client.recognize(source, language, **options))
+
+    def recognize_many(self, sources: Iterable[Source], language: str = "ru-RU", **options) -> Iterator[RecognitionResult]:
+        """Распознает файлы параллельно, результаты — по мере готовности (параметры как у recognize_many)"""
+        results = self.client.recognize_many(sources, language, **options)
+        try:
+            while True:
+                try:
+                    yield self._loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Прерванный перебор отменяет незавершенные распознавания
+            self._loop.run_until_complete(results.aclose())
+
+    def close(self) -> None:
+        """Закрывает соединения и event loop"""
+        self.client.close()
+        self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        self._loop.close()
+
+    def __enter__(self) -> "SyncSpeechKitClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,117 @@
+"""
+Распознавание файла, который еще записывается
+
+Файл декодируется по мере дописывания (iter_growing_pcm), потоковый VAD
+(SpeechSegmenter) закрывает реплики на паузах, и каждая закрытая реплика
+сразу отправляется в SpeechKit. Результаты отдаются по порядку реплик,
+поэтому после конца записи остается распознать только последнюю.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.models.transcript import Transcript
+from app.speechkit.client import SpeechKitClient
+
+logger = logging.getLogger("speech_service.speechkit")
+
+
+async def follow_file(
+    client: SpeechKitClient,
+    path: str,
+    language: str = "ru-RU",
+    idle_seconds: Optional[float] = None,
+    sample_rate: Optional[int] = None
+) -> AsyncIterator[Transcript]:
+    """
+    Распознает растущий файл по репликам
+
+    Args:
+        client: Клиент SpeechKit
+        path: Файл, в который идет запись (WAV, OGG)
+        language: Язык распознавания
+        idle_seconds: Пауза в росте файла, после которой запись считается
+            законченной (по умолчанию FOLLOW_IDLE_SECONDS)
+        sample_rate: Частота декодирования (по умолчанию FOLLOW_SAMPLE_RATE)
+
+    Yields:
+        Результат каждой реплики (время — от начала записи), по порядку
+    """
+    from app.services.audio_preprocess import SpeechSegmenter
+    from app.services.audio_stream import encode_pcm_opus, iter_growing_pcm
+
+    idle_seconds = settings.FOLLOW_IDLE_SECONDS if idle_seconds is None else idle_seconds
+    sample_rate = sample_rate or settings.FOLLOW_SAMPLE_RATE
+    loop = asyncio.get_running_loop()
+    endpoint = None
+    if client.capabilities is not None:
+        # Реплики отправляются в OGG Opus: берем endpoint, уже принимавший эту кодировку
+        pairs = client.capabilities.order(client.endpoints, ["oggopus"])
+        endpoint = pairs[0][0] if pairs else None
+
+    # Реплики из потока чтения: (начало, сигнал), исключение или None в конце
+    segments: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def read() -> None:
+        segmenter = SpeechSegmenter(sample_rate)
+        try:
+            for samples in iter_growing_pcm(path, sample_rate, idle_seconds, stop):
+                for segment in segmenter.feed(samples):
+                    loop.call_soon_threadsafe(segments.put_nowait, segment)
+            for segment in segmenter.flush():
+                loop.call_soon_threadsafe(segments.put_nowait, segment)
+            loop.call_soon_threadsafe(segments.put_nowait, None)
+        except Exception as e:
+            loop.call_soon_threadsafe(segments.put_nowait, e)
+
+    async def recognize(begin: int, samples) -> Transcript:
+        audio_data = await loop.run_in_executor(client.executor, encode_pcm_opus, samples, sample_rate)
+        return await client.send(
+            audio_data,
+            language,
+            len(samples) / sample_rate,
+            offset=begin / sample_rate,
+            allow_empty=True,
+            endpoint=endpoint
+        )
+
+    # Распознавания реплик по порядку: идут параллельно, отдаются последовательно
+    ordered: asyncio.Queue = asyncio.Queue()
+
+    async def dispatch() -> None:
+        while True:
+            item = await segments.get()
+            if item is None or isinstance(item, Exception):
+                ordered.put_nowait(item)
+                return
+            ordered.put_nowait(asyncio.ensure_future(recognize(*item)))
+
+    # Отдельный поток на всю запись, чтобы не занимать пул исполнителей
+    reader = threading.Thread(target=read, name="follow-reader", daemon=True)
+    reader.start()
+    dispatcher = asyncio.ensure_future(dispatch())
+    count = 0
+    try:
+        while True:
+            item = await ordered.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            transcript = await item
+            count += 1
+            yield transcript
+        logger.info(f"{path}: запись закончилась, распознано реплик: {count}")
+    finally:
+        stop.set()
+        dispatcher.cancel()
+        while not ordered.empty():
+            item = ordered.get_nowait()
+            if isinstance(item, asyncio.Future):
+                item.cancel()
+        await asyncio.gather(dispatcher, return_exceptions=True)
+        await loop.run_in_executor(None, reader.join)
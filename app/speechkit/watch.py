@@ -0,0 +1,327 @@
+"""
+Обработка папки: новые аудиофайлы из input/ распознаются в output/
+
+FolderWatcher следит за папкой через inotify (Linux, через ctypes; без
+него — периодическим обходом) и передает готовые файлы в
+SpeechKitClient.recognize_many с ограниченной параллельностью. Файл
+считается записанным, когда его размер и время изменения не менялись
+settle секунд. Транскрипты пишутся атомарно (временный файл и
+переименование), а обработанные файлы с размером и временем изменения
+хранятся в SQLite: после перезапуска неизменившиеся файлы пропускаются.
+"""
+
+import os
+import time
+import errno
+import ctypes
+import ctypes.util
+import asyncio
+import logging
+import sqlite3
+import struct
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.speechkit.client import RecognitionResult, SpeechKitClient
+
+logger = logging.getLogger("speech_service.watch")
+
+# Размер и время изменения (нс): неизменившийся файл повторно не распознается
+Signature = Tuple[int, int]
+
+STATE_NAME = ".watch_state.sqlite3"
+# Недописанные файлы программ записи и копирования
+TEMP_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".download")
+# Как часто проверяются файлы-кандидаты и обходится папка без inotify, сек
+TICK_SECONDS = 0.5
+POLL_SECONDS = 1.0
+
+# События inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Изменения файлов папки через inotify (только Linux)"""
+
+    def __init__(self, directory: Path):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify недоступен")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch {directory}")
+
+    def read(self) -> Tuple[list, bool]:
+        """Имена измененных файлов и признак переполнения очереди событий"""
+        names, overflow = [], False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names, overflow
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif length:
+                    names.append(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+                offset += length
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class WatchState:
+    """Обработанные файлы папки (SQLite)"""
+
+    def __init__(self, path: Path):
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, status TEXT, "
+            "output TEXT, error TEXT, seconds REAL, updated REAL)"
+        )
+        self.connection.commit()
+
+    def processed(self) -> Dict[str, Signature]:
+        """Успешно обработанные файлы и их подписи"""
+        rows = self.connection.execute("SELECT name, size, mtime_ns FROM files WHERE status = 'done'")
+        return {name: (size, mtime_ns) for name, size, mtime_ns in rows}
+
+    def record(
+        self,
+        name: str,
+        signature: Signature,
+        status: str,
+        output: Optional[str] = None,
+        error: Optional[str] = None,
+        seconds: float = 0.0
+    ) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, signature[0], signature[1], status, output, error, seconds, time.time())
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class FolderWatcher:
+    """
+    Распознает файлы, появляющиеся в папке
+
+    Пример:
+
+        client = SpeechKitClient()
+        watcher = FolderWatcher(client, "input", "output")
+        await watcher.run()          # до watcher.stop()
+    """
+
+    def __init__(
+        self,
+        client: SpeechKitClient,
+        input_dir: str,
+        output_dir: str,
+        language: str = "ru-RU",
+        concurrency: int = 8,
+        settle: float = 2.0,
+        state_path: Optional[str] = None,
+        poll: bool = False,
+        rescan_interval: float = 60.0,
+        on_result: Optional[Callable[[RecognitionResult, Optional[str]], None]] = None
+    ):
+        self.client = client
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.language = language
+        self.concurrency = concurrency
+        # Сколько секунд файл не должен меняться, чтобы считаться записанным
+        self.settle = settle
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.state = WatchState(Path(state_path) if state_path else self.output_dir / STATE_NAME)
+        self.poll = poll
+        # Полный обход папки: без inotify — раз в POLL_SECONDS, с ним — подстраховка от потерянных событий
+        self.rescan_interval = POLL_SECONDS if poll else rescan_interval
+        self.on_result = on_result
+        self.processed = self.state.processed()
+        # Файлы, которые могут быть готовы: имя -> подпись при прошлой проверке
+        self._candidates: Dict[str, Optional[Signature]] = {}
+        # Отправленные в распознавание: путь -> подпись
+        self._in_flight: Dict[str, Signature] = {}
+        self._queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._stopping = False
+        self._last_scan = 0.0
+        self.stats = {"done": 0, "failed": 0, "skipped": 0}
+
+    def stop(self) -> None:
+        """Прекращает прием новых файлов; начатые дораспознаются"""
+        if not self._stopping:
+            self._stopping = True
+            self._queue.put_nowait(None)
+
+    async def run(self) -> None:
+        """Следит за папкой и распознает файлы до stop()"""
+        loop = asyncio.get_running_loop()
+        inotify = None
+        if not self.poll:
+            try:
+                inotify = Inotify(self.input_dir)
+                loop.add_reader(inotify.fd, self._on_inotify, inotify)
+            except OSError as e:
+                logger.warning(f"inotify недоступен ({e}), папка будет проверяться обходом")
+                self.rescan_interval = POLL_SECONDS
+        logger.info(
+            f"Слежение за {self.input_dir} -> {self.output_dir} "
+            f"({'inotify' if inotify else 'обход'}, параллельно {self.concurrency}, уже обработано {len(self.processed)})"
+        )
+
+        ticker = asyncio.ensure_future(self._tick_loop())
+        try:
+            async for result in self.client.recognize_many(self._sources(), self.language, self.concurrency):
+                self._finish(result)
+        finally:
+            ticker.cancel()
+            if inotify is not None:
+                loop.remove_reader(inotify.fd)
+                inotify.close()
+            self.state.close()
+            logger.info(f"Слежение остановлено: {self.stats}")
+
+    async def _sources(self) -> AsyncIterator[str]:
+        """Готовые файлы по мере появления"""
+        while True:
+            path = await self._queue.get()
+            if path is None:
+                return
+            yield path
+
+    def _on_inotify(self, inotify: Inotify) -> None:
+        names, overflow = inotify.read()
+        if overflow:
+            # События потеряны: следующий тик обойдет папку целиком
+            logger.warning("Очередь событий inotify переполнена, папка будет обойдена заново")
+            self._last_scan = 0.0
+        for name in names:
+            if self._watched(name):
+                self._candidates.setdefault(name, None)
+
+    async def _tick_loop(self) -> None:
+        while not self._stopping:
+            now = time.monotonic()
+            if now - self._last_scan >= self.rescan_interval:
+                self._last_scan = now
+                self._scan()
+            self._check_candidates()
+            await asyncio.sleep(TICK_SECONDS)
+
+    def _scan(self) -> None:
+        """Обход папки: новые и изменившиеся файлы становятся кандидатами"""
+        try:
+            entries = list(os.scandir(self.input_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name in self._candidates or not self._watched(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if not entry.is_file():
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            path = str(self.input_dir / entry.name)
+            if self.processed.get(entry.name) != signature and self._in_flight.get(path) != signature:
+                self._candidates[entry.name] = None
+
+    def _check_candidates(self) -> None:
+        """Кандидаты, не менявшиеся settle секунд, уходят в распознавание"""
+        now = time.time()
+        for name, previous in list(self._candidates.items()):
+            path = str(self.input_dir / name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._candidates[name]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            self._candidates[name] = signature
+            if signature != previous or now - stat.st_mtime_ns / 1e9 < self.settle:
+                # Файл еще записывается
+                continue
+            if path in self._in_flight:
+                # Изменился во время распознавания: проверим после его завершения
+                continue
+            del self._candidates[name]
+            if self.processed.get(name) == signature:
+                self.stats["skipped"] += 1
+                continue
+            self._in_flight[path] = signature
+            self._queue.put_nowait(path)
+
+    def _finish(self, result: RecognitionResult) -> None:
+        """Сохраняет транскрипт и состояние файла"""
+        path = str(result.source)
+        name = Path(path).name
+        signature = self._in_flight.pop(path)
+        output = None
+        error = result.error
+        if result.ok and result.transcript.text:
+            try:
+                # Имя с расширением: call.wav и call.mp3 не перезаписывают транскрипты друг друга
+                output = str(write_atomic(self.output_dir / f"{name}_transcript.txt", result.transcript.text))
+            except OSError as e:
+                error = e
+        if error is None:
+            self.state.record(name, signature, "done", output, seconds=result.seconds)
+            self.processed[name] = signature
+            self.stats["done"] += 1
+            logger.info(f"{name} -> {output or 'речь не распознана'} ({result.seconds:.1f} сек)")
+        else:
+            # Неизменившийся файл с ошибкой повторяется только после перезапуска
+            self.state.record(name, signature, "failed", error=str(error), seconds=result.seconds)
+            self.processed[name] = signature
+            self.stats["failed"] += 1
+            logger.error(f"{name}: {error}")
+        if self.on_result is not None:
+            self.on_result(result, output)
+
+    @staticmethod
+    def _watched(name: str) -> bool:
+        lower = name.lower()
+        return (
+            not name.startswith(".")
+            and not lower.endswith(TEMP_SUFFIXES)
+            and Path(lower).suffix in settings.ALLOWED_EXTENSIONS
+        )
+
+
+def write_atomic(path: Path, text: str) -> Path:
+    """Записывает файл целиком или не записывает вовсе"""
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return path
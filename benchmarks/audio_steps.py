@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки дорогих шагов обработки одной задачи
+
+Шаги (как в speech_service и app.speechkit):
+    decode        — AudioSegment.from_file
+    downmix       — set_channels(1).set_frame_rate(48000)
+    opus_export   — экспорт в OGG Opus
+    b64_ogg       — base64.b64encode OGG (прежний _try_ogg_approach в speech_to_text)
+    wav8k_b64     — WAV 8 кГц + base64 (прежний _try_wav_approach в speech_to_text)
+    parse_rich    — parse_recognition_response (структурированный результат)
+
+Для каждого шага — время (min/median по повторам) и пик памяти
+Python-аллокаций (tracemalloc). Память дочернего ffmpeg не учитывается.
+
+Запуск:
+    python -m benchmarks.audio_steps run --formats wav,mp3 --durations 5,30 --repeat 3
+    python -m benchmarks.audio_steps compare old.json new.json
+"""
+
+import argparse
+import base64
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from pydub import AudioSegment
+
+from benchmarks.corpus import DURATIONS, FORMATS, ensure_file
+from benchmarks.harness import RESULTS_DIR, _git_commit
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Tuple[Any, Dict[str, float]]:
+    """
+    Замеряет время и пик памяти функции
+
+    Args:
+        func: Измеряемая функция без аргументов
+        repeat: Количество повторов
+
+    Returns:
+        Результат последнего вызова и метрики
+    """
+    timings: List[float] = []
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, {
+        "min_ms": round(min(timings) * 1000, 2),
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def synthetic_response(duration: float) -> Dict[str, Any]:
+    """Ответ API в формате chunks со словами (≈2 слова в секунду, фраза на 10 сек)"""
+    chunks = []
+    for phrase_start in range(0, int(duration), 10):
+        words = [
+            {
+                "startTime": f"{phrase_start + i * 0.5:.2f}s",
+                "endTime": f"{phrase_start + i * 0.5 + 0.4:.2f}s",
+                "word": f"слово{i}",
+                "confidence": 0.93
+            }
+            for i in range(20)
+        ]
+        chunks.append({
+            "alternatives": [{"words": words, "text": " ".join(w["word"] for w in words), "confidence": 0.93}],
+            "channelTag": "1"
+        })
+    return {"result": {"chunks": chunks}}
+
+
+def _opus_bytes(audio: AudioSegment) -> bytes:
+    """Экспорт в OGG Opus в память"""
+    buffer = io.BytesIO()
+    audio.export(buffer, format="ogg", codec="libopus")
+    return buffer.getvalue()
+
+
+def _wav8k_bytes(audio: AudioSegment) -> bytes:
+    """Экспорт в WAV 8 кГц в память"""
+    buffer = io.BytesIO()
+    audio.set_frame_rate(8000).export(buffer, format="wav")
+    return buffer.getvalue()
+
+
+def bench_file(path: Path, duration: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Прогоняет все шаги на одном файле"""
+    from app.models.transcript import parse_recognition_response
+
+    steps: Dict[str, Dict[str, float]] = {}
+
+    audio, steps["decode"] = measure(lambda: AudioSegment.from_file(str(path)), repeat)
+    mono, steps["downmix"] = measure(lambda source=audio: source.set_channels(1).set_frame_rate(48000), repeat)
+    # Исходный сигнал больше не нужен: следующие шаги меряются без него в памяти
+    del audio
+
+    ogg, steps["opus_export"] = measure(lambda: _opus_bytes(mono), repeat)
+    _, steps["b64_ogg"] = measure(lambda: base64.b64encode(ogg).decode("utf-8"), repeat)
+    _, steps["wav8k_b64"] = measure(lambda: base64.b64encode(_wav8k_bytes(mono)).decode("utf-8"), repeat)
+
+    response = synthetic_response(duration)
+    _, steps["parse_rich"] = measure(lambda: parse_recognition_response(response), repeat)
+
+    steps["opus_export"]["output_kb"] = round(len(ogg) / 1024, 1)
+    return steps
+
+
+def run(formats: List[str], durations: List[int], repeat: int) -> Dict:
+    """Прогоняет корпус и возвращает отчет"""
+    cases = {}
+    for duration in durations:
+        for fmt in formats:
+            path = ensure_file(fmt, duration)
+            name = f"{fmt}_{duration}s"
+            print(f"▶ {name}")
+            cases[name] = bench_file(path, duration, repeat)
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": repeat,
+        "cases": cases,
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Печатает изменение медианного времени и памяти по шагам"""
+    old = json.loads(Path(old_path).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))
+
+    print(f"{old['commit']} → {new['commit']}")
+    for case in sorted(set(old["cases"]) & set(new["cases"])):
+        print(f"\n{case}")
+        for step, after in new["cases"][case].items():
+            before = old["cases"][case].get(step)
+            if not before:
+                continue
+            delta = (after["median_ms"] - before["median_ms"]) / before["median_ms"] * 100 if before["median_ms"] else 0.0
+            print(
+                f"  {step:<12} {before['median_ms']:>10.2f} → {after['median_ms']:<10.2f} ms {delta:+6.1f}%"
+                f"   {before['peak_mb']:>7.2f} → {after['peak_mb']:<7.2f} MB"
+            )
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Микробенчмарки аудио-шагов")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Прогнать микробенчмарки")
+    run_parser.add_argument("--formats", default=",".join(FORMATS))
+    run_parser.add_argument("--durations", default=",".join(map(str, DURATIONS)), help="Секунды через запятую")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--output", help="Файл результатов (по умолчанию benchmarks/results/micro-...)")
+
+    compare_parser = sub.add_parser("compare", help="Сравнить два прогона")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args.old, args.new)
+        return
+
+    report = run(args.formats.split(","), [int(d) for d in args.durations.split(",")], args.repeat)
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"micro-{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n📝 Результаты: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Проверка кэша конвертации: тот же файл на разных языках и вытеснение
+
+Поднимает мок SpeechKit и сервис, затем по очереди отправляет один и тот же
+файл на нескольких языках (задачи не объединяются: отпечаток включает язык)
+и печатает время каждой задачи. Первая конвертирует файл, остальные должны
+взять его из кэша. Затем прогоняет несколько разных файлов с маленьким
+CONVERT_CACHE_MAX_BYTES и проверяет, что каталог кэша не превышает лимит.
+Код выхода 1, если ожидания не выполнены.
+
+Запуск:
+    python -m benchmarks.convert_cache --duration 30 --languages ru-RU,en-US,tr-TR
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.harness import _free_port, _wait_ready
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _run_task(client: httpx.Client, audio: bytes, language: str) -> float:
+    """Отправляет файл и ждет результата, возвращает время задачи, сек"""
+    started = time.perf_counter()
+    response = client.post(
+        "/api/v1/transcribe",
+        files={"file": ("audio.wav", audio)},
+        data={"language": language}
+    )
+    response.raise_for_status()
+    task_id = response.json()["task_id"]
+    while True:
+        status = client.get(f"/api/v1/transcribe/{task_id}").json()
+        if status["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.05)
+    if status["status"] != "completed":
+        raise RuntimeError(f"Задача {task_id}: {status['error']}")
+    return time.perf_counter() - started
+
+
+def run(duration: int, languages: List[str], eviction_files: int, max_bytes: int) -> Dict:
+    """Прогоняет сценарии и возвращает сводку"""
+    audio = ensure_file("wav", duration).read_bytes()
+    mock_port, service_port = _free_port(), _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_speechkit", "--port", str(mock_port), "--latency", "fixed:50"],
+        stdout=subprocess.DEVNULL
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        cache_dir = Path(workdir) / "cache"
+        env = {
+            **os.environ,
+            "YANDEX_CLOUD_IAM_TOKEN": "benchmark",
+            "YANDEX_FOLDER_ID": "benchmark",
+            "YANDEX_STT_URL": f"{mock_url}/speech/v1/stt:recognize",
+            "UPLOAD_DIR": str(Path(workdir) / "uploads"),
+            "OUTPUT_DIR": str(Path(workdir) / "outputs"),
+            "CHECKPOINT_DIR": str(Path(workdir) / "checkpoints"),
+            "EXPORT_DIR": str(Path(workdir) / "exports"),
+            "CONVERT_CACHE_DIR": str(cache_dir),
+            "CONVERT_CACHE_MAX_BYTES": str(max_bytes),
+            "RATE_LIMIT_ENABLED": "false",
+            "SCHED_MAX_WAIT_SECONDS": "0",
+        }
+        service = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(service_port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_ready(f"{mock_url}/_stats")
+            _wait_ready(f"http://127.0.0.1:{service_port}/health")
+            with httpx.Client(base_url=f"http://127.0.0.1:{service_port}", timeout=60.0) as client:
+                timings = {language: _run_task(client, audio, language) for language in languages}
+                # Разные файлы (уникальный хвост) вытесняют друг друга при маленьком лимите
+                for i in range(eviction_files):
+                    _run_task(client, audio + i.to_bytes(4, "big"), languages[0])
+            cache_bytes = _dir_size(cache_dir)
+        finally:
+            service.terminate()
+            service.wait(timeout=30)
+            mock.terminate()
+            mock.wait(timeout=10)
+
+    return {"timings": timings, "cache_bytes": cache_bytes}
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Проверка кэша конвертации")
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--languages", default="ru-RU,en-US,tr-TR")
+    parser.add_argument("--eviction-files", type=int, default=6)
+    parser.add_argument("--max-bytes", type=int, default=0, help="Лимит кэша (0 — на 2.5 записи)")
+    args = parser.parse_args()
+
+    languages = args.languages.split(",")
+    # Opus ~ 4-5KB на секунду аудио: лимит на пару записей
+    max_bytes = args.max_bytes or int(args.duration * 5000 * 2.5)
+    summary = run(args.duration, languages, args.eviction_files, max_bytes)
+
+    timings = summary["timings"]
+    first, *rest = timings.values()
+    for language, seconds in timings.items():
+        print(f"{language:<8} {seconds * 1000:8.0f} ms")
+    print(f"Кэш после {args.eviction_files} разных файлов: {summary['cache_bytes']} байт (лимит {max_bytes})")
+
+    ok = all(seconds < first for seconds in rest) and summary["cache_bytes"] <= max_bytes
+    print("✅ кэш работает" if ok else "❌ ожидания не выполнены")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
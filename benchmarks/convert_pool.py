@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность конвертации в OGG Opus: потоки против процессов
+
+Конвертирует N копий файла корпуса с заданной параллельностью двумя способами:
+
+    threads    — конвертация в пуле потоков API-процесса (CONVERT_PROCESSES=false);
+    processes  — долгоживущие процессы конвертации, которые сами пишут
+                 результат в файл (CONVERT_PROCESSES=true).
+
+Для каждого способа печатает файлы/сек, секунды аудио в секунду и
+наибольшую задержку event loop во время прогона (насколько конвертация
+мешает обслуживать остальные запросы). Процессы запускаются до замера.
+
+Запуск:
+    python -m benchmarks.convert_pool --format wav --duration 30 --files 32 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.corpus import ensure_file
+
+
+async def _loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Наибольшее опоздание пробуждения event loop, сек"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_mode(mode: str, source: Path, files: int, concurrency: int, workers: int) -> Dict:
+    """Конвертирует files файлов, не более concurrency одновременно"""
+    from app.services.audio_stream import encode_opus_stream
+    from app.services.conversion_pool import ConversionPool
+
+    threads = ThreadPoolExecutor(max_workers=concurrency)
+    pool = ConversionPool(workers)
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(concurrency)
+    durations = []
+
+    if mode == "processes":
+        await pool.warmup()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        async def convert(index: int) -> None:
+            output = str(Path(workdir) / f"{index}.ogg")
+            async with limit:
+                if mode == "processes":
+                    duration, _, _ = await pool.convert(str(source), False, output)
+                else:
+                    duration, _, _ = await loop.run_in_executor(threads, encode_opus_stream, str(source), False, output)
+            durations.append(duration)
+            os.remove(output)
+
+        stop = asyncio.Event()
+        lag = asyncio.create_task(_loop_lag(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(convert(i) for i in range(files)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        worst_lag = await lag
+
+    pool.shutdown()
+    threads.shutdown()
+    return {
+        "files_per_s": round(files / elapsed, 2),
+        "audio_x_realtime": round(sum(durations) / elapsed, 1),
+        "elapsed_s": round(elapsed, 2),
+        "loop_lag_max_ms": round(worst_lag * 1000, 1),
+    }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Конвертация: потоки против процессов")
+    parser.add_argument("--format", default="wav")
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--files", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--workers", type=int, default=0, help="Процессов (0 — по числу ядер)")
+    args = parser.parse_args()
+
+    source = ensure_file(args.format, args.duration)
+    print(f"{source.name}: {args.files} файлов, параллельно {args.concurrency}, ядер {os.cpu_count()}")
+    for mode in ("threads", "processes"):
+        summary = asyncio.run(run_mode(mode, source, args.files, args.concurrency, args.workers))
+        print(f"{mode:<10} {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Профилирование под нагрузкой: /debug/profile и /debug/tasks
+
+Поднимает мок SpeechKit и сервис с DEBUG_TOKEN и дважды подает одинаковую
+нагрузку (benchmarks.loadgen): без профилирования и с профилированием на
+все время прогона; во время второго прогона опрашивается /debug/tasks.
+Проверяется:
+
+    overhead    — задержка e2e (p50) с профилированием против без него
+                  и доля времени, потраченная на выборки;
+    collapsed   — ответ в формате свернутых стеков, есть корень event-loop
+                  и стеки обработки задачи;
+    stages      — /debug/tasks показывает задачи распознавания с этапом;
+    busy/token  — второе одновременное профилирование получает 409,
+                  неверный токен — 403.
+
+Код выхода 1, если проверки не прошли или p50 вырос больше чем на --max-slowdown.
+
+Запуск:
+    python -m benchmarks.debug_profile --rps 4 --duration 20
+"""
+
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from typing import Dict
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.harness import running_service
+from benchmarks.loadgen import run_load
+
+TOKEN = "benchmark"
+
+
+async def profiled_run(service_url: str, audio_path: str, args) -> Dict:
+    """Нагрузка, во время которой идет профилирование и опрос /debug/tasks"""
+    headers = {"X-Debug-Token": TOKEN}
+    stages: Counter = Counter()
+
+    async with httpx.AsyncClient(base_url=service_url, timeout=args.duration + 30) as client:
+        async def poll_tasks():
+            while True:
+                await asyncio.sleep(1.0)
+                view = (await client.get("/debug/tasks", headers=headers)).json()
+                for coroutine in view["coroutines"]:
+                    if "task_id" in coroutine:
+                        stages[coroutine["stage"]] += 1
+
+        profile = asyncio.ensure_future(
+            client.get("/debug/profile", params={"seconds": args.duration}, headers=headers)
+        )
+        await asyncio.sleep(0.5)
+        busy = (await client.get("/debug/profile", params={"seconds": 1}, headers=headers)).status_code
+        forbidden = (await client.get("/debug/tasks", headers={"X-Debug-Token": "wrong"})).status_code
+        poller = asyncio.ensure_future(poll_tasks())
+        try:
+            load = await run_load(service_url, audio_path, args.rps, args.duration)
+        finally:
+            poller.cancel()
+        response = await profile
+
+    lines = response.text.splitlines()
+    parsed = [line.rsplit(" ", 1) for line in lines]
+    return {
+        "load": load,
+        "busy_status": busy,
+        "forbidden_status": forbidden,
+        "stages": dict(stages),
+        "samples": int(response.headers["X-Profile-Samples"]),
+        "overhead_share": float(response.headers["X-Profile-Overhead-Seconds"]) / float(response.headers["X-Profile-Seconds"]),
+        "collapsed_ok": bool(parsed) and all(len(item) == 2 and item[1].isdigit() for item in parsed),
+        "event_loop": any(line.startswith("event-loop;") for line in lines),
+        "process_task": any("_process_task" in line for line in lines),
+        "stacks": len(lines),
+    }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Профилирование под нагрузкой")
+    parser.add_argument("--format", default="mp3", choices=["wav", "mp3", "ogg"])
+    parser.add_argument("--audio-duration", type=int, default=5, help="Длительность файла корпуса, сек")
+    parser.add_argument("--rps", type=float, default=4.0)
+    parser.add_argument("--duration", type=float, default=20.0, help="Длительность каждого прогона, сек")
+    parser.add_argument("--max-slowdown", type=float, default=1.25, help="Допустимый рост p50 e2e")
+    args = parser.parse_args()
+
+    audio_path = str(ensure_file(args.format, args.audio_duration))
+    with running_service({"latency": "fixed:300"}, {"DEBUG_TOKEN": TOKEN}) as service:
+        baseline = asyncio.run(run_load(service["service_url"], audio_path, args.rps, args.duration))
+        profiled = asyncio.run(profiled_run(service["service_url"], audio_path, args))
+
+    base_p50 = baseline["e2e_latency"]["p50_ms"]
+    prof_p50 = profiled["load"]["e2e_latency"]["p50_ms"]
+    expected_samples = args.duration * 100
+    summary = {
+        "baseline_p50_ms": base_p50,
+        "profiled_p50_ms": prof_p50,
+        "baseline_rps": baseline["throughput_rps"],
+        "profiled_rps": profiled["load"]["throughput_rps"],
+        "samples": profiled["samples"],
+        "overhead_share": round(profiled["overhead_share"], 4),
+        "stacks": profiled["stacks"],
+        "stages": profiled["stages"],
+        "busy_status": profiled["busy_status"],
+        "forbidden_status": profiled["forbidden_status"],
+    }
+    ok = (
+        profiled["collapsed_ok"]
+        and profiled["event_loop"]
+        and profiled["process_task"]
+        and profiled["samples"] >= 0.8 * expected_samples
+        and bool(profiled["stages"])
+        and profiled["busy_status"] == 409
+        and profiled["forbidden_status"] == 403
+        and profiled["load"]["failed"] == 0
+        and prof_p50 is not None and base_p50 is not None
+        and prof_p50 <= base_p50 * args.max_slowdown
+    )
+    print(f"{'✅' if ok else '❌'} {summary}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Проверка идемпотентности и объединения одинаковых задач под нагрузкой
+
+Поднимает мок SpeechKit и сервис, затем одновременно отправляет N
+одинаковых загрузок в трех режимах:
+
+    coalesce     — без Idempotency-Key: N разных задач, один вызов SpeechKit;
+    idempotent   — с одним Idempotency-Key: одна задача на все N запросов;
+    distinct     — разные файлы: N задач и N вызовов (контроль).
+
+Для каждого режима проверяется число задач, вызовов мока и совпадение
+результатов. Код выхода 1, если ожидания не выполнены.
+
+Запуск:
+    python -m benchmarks.dedup --audio input/audio.ogg --concurrency 20
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.harness import running_service
+
+
+async def _submit_all(client: httpx.AsyncClient, payloads: List[bytes], filename: str, headers: Dict[str, str]) -> List[str]:
+    """Одновременно отправляет загрузки и возвращает ID задач"""
+    responses = await asyncio.gather(*[
+        client.post("/api/v1/transcribe", files={"file": (filename, payload)}, headers=headers)
+        for payload in payloads
+    ])
+    for response in responses:
+        response.raise_for_status()
+    return [response.json()["task_id"] for response in responses]
+
+
+async def _wait_results(client: httpx.AsyncClient, task_ids: List[str], timeout: float = 120.0) -> List[str]:
+    """Ждет завершения задач и возвращает их результаты"""
+    results: Dict[str, str] = {}
+    deadline = time.perf_counter() + timeout
+    while len(results) < len(set(task_ids)) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.2)
+        for task_id in set(task_ids) - set(results):
+            status = (await client.get(f"/api/v1/transcribe/{task_id}")).json()
+            if status["status"] in ("completed", "failed"):
+                results[task_id] = status["result"] or status["error"]
+    return [results.get(task_id, "<timeout>") for task_id in task_ids]
+
+
+async def run_mode(service: Dict, audio: bytes, filename: str, mode: str, concurrency: int) -> Dict:
+    """Прогоняет один режим и возвращает сводку"""
+    httpx.post(f"{service['mock_url']}/_reset")
+    headers = {"Idempotency-Key": uuid.uuid4().hex} if mode == "idempotent" else {}
+    # Уникальный хвост делает файлы разными, но остается валидным для контейнера
+    salt = uuid.uuid4().bytes
+    if mode == "distinct":
+        payloads = [audio + salt + i.to_bytes(4, "big") for i in range(concurrency)]
+    else:
+        payloads = [audio + salt] * concurrency
+
+    async with httpx.AsyncClient(base_url=service["service_url"], timeout=120.0) as client:
+        started = time.perf_counter()
+        task_ids = await _submit_all(client, payloads, filename, headers)
+        results = await _wait_results(client, task_ids)
+        elapsed = time.perf_counter() - started
+
+    upstream = httpx.get(f"{service['mock_url']}/_stats").json()
+    return {
+        "tasks": len(set(task_ids)),
+        "upstream_calls": upstream["recognize_calls"],
+        "distinct_results": len(set(results)),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+EXPECTED = {
+    "coalesce": lambda n, r: r["tasks"] == n and r["upstream_calls"] == 1 and r["distinct_results"] == 1,
+    "idempotent": lambda n, r: r["tasks"] == 1 and r["upstream_calls"] == 1,
+    "distinct": lambda n, r: r["tasks"] == n and r["upstream_calls"] == n,
+}
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Проверка объединения одинаковых задач")
+    parser.add_argument("--audio", default="input/audio.ogg")
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    audio = Path(args.audio).read_bytes()
+    ok = True
+    with running_service({"latency": "fixed:500"}) as service:
+        for mode, check in EXPECTED.items():
+            summary = asyncio.run(run_mode(service, audio, Path(args.audio).name, mode, args.concurrency))
+            passed = check(args.concurrency, summary)
+            ok = ok and passed
+            print(f"{'✅' if passed else '❌'} {mode:<11} {summary}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Распознавание растущего файла (follow_file) против распознавания после записи
+
+Поднимает мок SpeechKit и имитирует программу записи звонка: файл корпуса
+дописывается в реальном времени (ускорение --speed), с заглушкой размера в
+заголовке WAV, которая в конце заменяется итоговым размером (как делают
+программы записи); для OGG конец — страница EOS. Сравниваются:
+
+    follow — follow_file во время записи: реплики распознаются по мере
+             закрытия, замеряется время от последнего байта до последнего
+             результата;
+    after  — после записи файл распознается целиком (client.recognize);
+    api    — то же через сервис: GET /api/v1/transcribe/follow (NDJSON),
+             запись идет в FOLLOW_DIR; проверяется, что фрагменты идут по
+             возрастанию времени и не пересекаются (ничего не распознано дважды).
+
+Код выхода 1, если в режиме follow нет реплик, результат позже режима after
+или конец записи не распознан по заголовку/EOS (пришлось ждать паузу роста).
+
+Запуск:
+    python -m benchmarks.follow_file --format wav --duration 120 --speed 4
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.harness import _free_port, _wait_ready, running_service
+
+# Пауза роста, после которой follow_file считает запись законченной: должна не понадобиться
+IDLE_SECONDS = 30.0
+
+
+async def record(source: bytes, target: Path, bytes_per_second: float, placeholder: bool) -> float:
+    """Дописывает source в target с заданной скоростью; возвращает время последнего байта"""
+    data_at = source.find(b"data") + 8 if placeholder else 0
+    with open(target, "wb") as f:
+        if placeholder:
+            header = bytearray(source[:data_at])
+            header[data_at - 4:data_at] = b"\xff\xff\xff\xff"
+            f.write(header)
+        step = max(int(bytes_per_second / 10), 1)
+        started = time.perf_counter()
+        for position in range(data_at, len(source), step):
+            f.write(source[position:position + step])
+            f.flush()
+            delay = started + (position - data_at + step) / bytes_per_second - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if placeholder:
+            # Программа записи вписывает итоговый размер после последнего кадра
+            f.seek(data_at - 4)
+            f.write(source[data_at - 4:data_at])
+    return time.perf_counter()
+
+
+async def run(mock_url: str, path: Path, speed: float) -> Dict:
+    from app.speechkit import SpeechKitClient
+    from app.speechkit.tail import follow_file
+
+    source = path.read_bytes()
+    bytes_per_second = len(source) / float(path.stem.split("_")[1].rstrip("s")) * speed
+    with tempfile.TemporaryDirectory() as workdir:
+        client = SpeechKitClient(
+            iam_token="benchmark", folder_id="benchmark",
+            endpoints=[f"{mock_url}/speech/v1/stt:recognize"], work_dir=workdir
+        )
+        target = Path(workdir) / f"call{path.suffix}"
+        target.touch()
+        writer = asyncio.ensure_future(record(source, target, bytes_per_second, path.suffix == ".wav"))
+
+        segments = 0
+        first = None
+        started = time.perf_counter()
+        async for transcript in follow_file(client, str(target), idle_seconds=IDLE_SECONDS):
+            segments += len(transcript.segments)
+            first = first or time.perf_counter() - started
+        follow_done = time.perf_counter()
+        last_byte = await writer
+
+        after_started = time.perf_counter()
+        await client.recognize(str(target))
+        after_s = time.perf_counter() - after_started
+        client.close()
+
+    return {
+        "recording_s": round(last_byte - started, 1),
+        "segments": segments,
+        "first_result_s": round(first or 0.0, 2),
+        "follow_after_hangup_s": round(follow_done - last_byte, 2),
+        "after_hangup_s": round(after_s, 2),
+    }
+
+
+async def run_api(path: Path, speed: float) -> Dict:
+    """Запись в FOLLOW_DIR сервиса и чтение реплик из потокового ответа"""
+    source = path.read_bytes()
+    bytes_per_second = len(source) / float(path.stem.split("_")[1].rstrip("s")) * speed
+    with tempfile.TemporaryDirectory() as follow_dir:
+        env = {"FOLLOW_DIR": follow_dir, "FOLLOW_IDLE_SECONDS": str(IDLE_SECONDS)}
+        with running_service(env=env) as service:
+            target = Path(follow_dir) / f"call{path.suffix}"
+            target.touch()
+            writer = asyncio.ensure_future(record(source, target, bytes_per_second, path.suffix == ".wav"))
+            segments = []
+            async with httpx.AsyncClient(timeout=None) as client:
+                async with client.stream(
+                    "GET", f"{service['service_url']}/api/v1/transcribe/follow", params={"path": target.name}
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if line:
+                            segments.append(json.loads(line))
+            follow_done = time.perf_counter()
+            last_byte = await writer
+
+    errors = [segment["error"] for segment in segments if "error" in segment]
+    ordered = all(a["end"] <= b["start"] + 1e-6 for a, b in zip(segments, segments[1:]))
+    return {
+        "segments": len(segments),
+        "errors": errors,
+        "ordered": ordered and not errors,
+        "follow_after_hangup_s": round(follow_done - last_byte, 2),
+    }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Распознавание растущего файла")
+    parser.add_argument("--format", default="wav", choices=["wav", "ogg"])
+    parser.add_argument("--duration", type=int, default=120)
+    parser.add_argument("--speed", type=float, default=4.0, help="Ускорение записи относительно реального времени")
+    parser.add_argument("--latency", default="fixed:300", help="Задержка мока (см. benchmarks.mock_speechkit)")
+    args = parser.parse_args()
+
+    path = ensure_file(args.format, args.duration)
+    port = _free_port()
+    mock_url = f"http://127.0.0.1:{port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_speechkit", "--port", str(port), "--latency", args.latency],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        _wait_ready(f"{mock_url}/_stats")
+        summary = asyncio.run(run(mock_url, path, args.speed))
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+
+    ok = (
+        summary["segments"] > 0
+        and summary["follow_after_hangup_s"] < summary["after_hangup_s"]
+        and summary["follow_after_hangup_s"] < IDLE_SECONDS
+    )
+    print(f"{'✅' if ok else '❌'} {path.name}: {summary}")
+
+    api = asyncio.run(run_api(path, args.speed))
+    api_ok = api["segments"] > 0 and api["ordered"] and api["follow_after_hangup_s"] < IDLE_SECONDS
+    print(f"{'✅' if api_ok else '❌'} api {path.name}: {api}")
+    sys.exit(0 if ok and api_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк сервиса против локального мока SpeechKit
+
+Для каждого сценария поднимаются мок (benchmarks.mock_speechkit) и сервис
+(uvicorn app.main:app) с YANDEX_STT_URL на мок, подается нагрузка
+(benchmarks.loadgen), параллельно снимаются RSS и CPU процесса сервиса.
+Результаты сохраняются в benchmarks/results/<время>-<коммит>.json.
+
+Запуск:
+    python -m benchmarks.harness run                       # все сценарии
+    python -m benchmarks.harness run --scenario baseline   # один сценарий
+    python -m benchmarks.harness compare old.json new.json # сравнение прогонов
+
+Снятие RSS/CPU читает /proc и работает только в Linux.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+from benchmarks.loadgen import run_load
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+SCENARIOS: Dict[str, Dict] = {
+    "baseline": {
+        "mock": {"latency": "lognormal:300,0.4"},
+        "rps": 2, "duration": 30,
+    },
+    "high_rps": {
+        "mock": {"latency": "lognormal:300,0.4"},
+        "rps": 10, "duration": 30,
+    },
+    "slow_upstream": {
+        "mock": {"latency": "lognormal:2000,0.6"},
+        "rps": 2, "duration": 30,
+    },
+    "errors_and_throttling": {
+        "mock": {"latency": "lognormal:300,0.4", "error_rate": 0.05, "throttle_rate": 0.1},
+        "rps": 4, "duration": 30,
+    },
+    "upstream_concurrency_cap": {
+        "mock": {"latency": "fixed:500", "max_concurrency": 4},
+        "rps": 8, "duration": 30,
+    },
+    "rate_limited": {
+        "mock": {"latency": "lognormal:300,0.4"},
+        "rps": 8, "duration": 30,
+        "env": {"RATE_LIMIT_ENABLED": "true", "RATE_LIMIT_RPS": "4", "RATE_LIMIT_BURST": "8"},
+    },
+}
+
+
+class ResourceSampler(threading.Thread):
+    """Периодически снимает RSS и CPU процесса из /proc"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.rss_samples: List[int] = []
+        self.cpu_start: Optional[float] = None
+        self.cpu_end: Optional[float] = None
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self._stop_event = threading.Event()
+        self._ticks = os.sysconf("SC_CLK_TCK")
+
+    def _cpu_seconds(self) -> float:
+        """utime + stime процесса в секундах"""
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def _rss_bytes(self) -> int:
+        """Текущий RSS процесса"""
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def run(self) -> None:
+        self.started_at = time.perf_counter()
+        self.cpu_start = self._cpu_seconds()
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.rss_samples.append(self._rss_bytes())
+                self.cpu_end = self._cpu_seconds()
+            except (FileNotFoundError, ProcessLookupError):
+                break
+        self.finished_at = time.perf_counter()
+
+    def stop(self) -> Dict:
+        """Останавливает снятие и возвращает сводку"""
+        self._stop_event.set()
+        self.join()
+        elapsed = max(self.finished_at - self.started_at, 1e-9)
+        cpu = (self.cpu_end or self.cpu_start or 0.0) - (self.cpu_start or 0.0)
+        rss = self.rss_samples or [0]
+        return {
+            "rss_peak_mb": round(max(rss) / 2**20, 1),
+            "rss_avg_mb": round(sum(rss) / len(rss) / 2**20, 1),
+            "cpu_seconds": round(cpu, 2),
+            "cpu_percent_avg": round(100 * cpu / elapsed, 1),
+        }
+
+
+def _free_port() -> int:
+    """Свободный TCP-порт на localhost"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    """Ждет, пока эндпоинт начнет отвечать 200"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} не ответил за {timeout} сек")
+
+
+def _git_commit() -> str:
+    """Короткий хеш текущего коммита"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+@contextmanager
+def running_service(mock: Optional[Dict] = None, env: Optional[Dict[str, str]] = None) -> Iterator[Dict]:
+    """
+    Поднимает мок SpeechKit и сервис, направленный на него
+
+    Args:
+        mock: Параметры мока (latency, error_rate, ...)
+        env: Дополнительные переменные окружения сервиса
+
+    Yields:
+        Адреса мока и сервиса и PID сервиса
+    """
+    mock_port, service_port = _free_port(), _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    service_url = f"http://127.0.0.1:{service_port}"
+
+    mock_args = [sys.executable, "-m", "benchmarks.mock_speechkit", "--port", str(mock_port)]
+    for key, value in (mock or {}).items():
+        mock_args += [f"--{key.replace('_', '-')}", str(value)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        service_env = {
+            **os.environ,
+            "YANDEX_CLOUD_IAM_TOKEN": "benchmark",
+            "YANDEX_FOLDER_ID": "benchmark",
+            "YANDEX_STT_URL": f"{mock_url}/speech/v1/stt:recognize",
+            "UPLOAD_DIR": str(Path(workdir) / "uploads"),
+            "OUTPUT_DIR": str(Path(workdir) / "outputs"),
+            # Нагрузка идет с одного адреса: лимиты клиентов включаются только в своем сценарии
+            "RATE_LIMIT_ENABLED": "false",
+            # Нагрузка повторяет один файл: без кэша конвертации замеры сопоставимы с прежними
+            "CONVERT_CACHE_ENABLED": "false",
+            **(env or {}),
+        }
+        service_args = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(service_port), "--log-level", "warning"
+        ]
+
+        mock_process = subprocess.Popen(mock_args, stdout=subprocess.DEVNULL)
+        service = subprocess.Popen(service_args, env=service_env, stdout=subprocess.DEVNULL)
+        try:
+            _wait_ready(f"{mock_url}/_stats")
+            _wait_ready(f"{service_url}/health")
+            yield {"mock_url": mock_url, "service_url": service_url, "pid": service.pid}
+        finally:
+            for process in (service, mock_process):
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+def run_scenario(name: str, scenario: Dict, audio_path: str, service_env: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Прогоняет один сценарий
+
+    Args:
+        name: Имя сценария
+        scenario: Параметры мока и нагрузки
+        audio_path: Аудиофайл для отправки
+        service_env: Дополнительные переменные окружения сервиса
+
+    Returns:
+        Сводка: нагрузка, ресурсы сервиса, счетчики мока
+    """
+    env = {**scenario.get("env", {}), **(service_env or {})}
+    with running_service(scenario.get("mock"), env) as service:
+        print(f"▶ {name}: {scenario['rps']} RPS × {scenario['duration']} сек")
+        sampler = ResourceSampler(service["pid"])
+        sampler.start()
+        load = asyncio.run(run_load(
+            service["service_url"],
+            audio_path,
+            scenario["rps"],
+            scenario["duration"],
+            fields=scenario.get("fields"),
+            headers=scenario.get("headers")
+        ))
+        resources = sampler.stop()
+        upstream = httpx.get(f"{service['mock_url']}/_stats").json()
+
+    return {"scenario": scenario, "load": load, "resources": resources, "upstream": upstream}
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Печатает изменения ключевых метрик между двумя прогонами"""
+    old = json.loads(Path(old_path).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))
+    metrics = [
+        ("load", "throughput_rps"),
+        ("load", "e2e_latency", "p50_ms"),
+        ("load", "e2e_latency", "p95_ms"),
+        ("load", "e2e_latency", "p99_ms"),
+        ("resources", "rss_peak_mb"),
+        ("resources", "cpu_seconds"),
+    ]
+
+    print(f"{old['commit']} → {new['commit']}")
+    for name in sorted(set(old["scenarios"]) & set(new["scenarios"])):
+        print(f"\n{name}")
+        for path in metrics:
+            before, after = old["scenarios"][name], new["scenarios"][name]
+            for key in path:
+                before, after = (before or {}).get(key), (after or {}).get(key)
+            if before is None or after is None:
+                continue
+            delta = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"  {'.'.join(path[1:]):<20} {before:>10} → {after:<10} {delta}")
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк сервиса")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Прогнать сценарии")
+    run_parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Сценарий (можно несколько)")
+    run_parser.add_argument("--audio", default="input/audio.ogg")
+    run_parser.add_argument("--output", help="Файл результатов (по умолчанию benchmarks/results/...)")
+
+    compare_parser = sub.add_parser("compare", help="Сравнить два прогона")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.old, args.new)
+        return
+
+    names = args.scenario or list(SCENARIOS)
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scenarios": {name: run_scenario(name, SCENARIOS[name], args.audio) for name in names},
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n📝 Результаты: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Генератор нагрузки на API распознавания
+
+Открытая модель нагрузки: задачи отправляются на POST /api/v1/transcribe
+с заданной частотой (RPS) независимо от скорости ответов, затем каждая
+задача опрашивается до завершения. Считаются пропускная способность и
+перцентили задержек отправки и полного цикла.
+
+Запуск:
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --audio input/audio.ogg --rps 5 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль q (0..100) методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max в миллисекундах"""
+    return {
+        "p50_ms": _ms(percentile(values, 50)),
+        "p95_ms": _ms(percentile(values, 95)),
+        "p99_ms": _ms(percentile(values, 99)),
+        "max_ms": _ms(max(values) if values else None),
+    }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    """Секунды в миллисекунды с округлением"""
+    return round(value * 1000, 1) if value is not None else None
+
+
+class LoadResult:
+    """Накопитель результатов прогона"""
+
+    def __init__(self):
+        self.submit_latencies: List[float] = []
+        self.e2e_latencies: List[float] = []
+        self.status_codes: Dict[str, int] = {}
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.polls = 0
+
+    def count_status(self, code: int) -> None:
+        """Учитывает HTTP-код ответа на отправку (0 — сетевая ошибка)"""
+        key = str(code)
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+
+    def to_dict(self, elapsed: float, submitted: int) -> Dict:
+        """Сводка прогона"""
+        return {
+            "submitted": submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": submitted - len(self.submit_latencies),
+            "polls": self.polls,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_rps": round(self.completed / elapsed, 3) if elapsed else 0.0,
+            "submit_latency": summarize(self.submit_latencies),
+            "e2e_latency": summarize(self.e2e_latencies),
+            "status_codes": self.status_codes,
+        }
+
+
+async def _run_job(
+    client: httpx.AsyncClient,
+    result: LoadResult,
+    audio: bytes,
+    filename: str,
+    fields: Dict[str, str],
+    headers: Dict[str, str],
+    poll_interval: float,
+    task_timeout: float
+) -> None:
+    """Отправляет одну задачу и опрашивает ее до завершения"""
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            "/api/v1/transcribe",
+            files={"file": (filename, audio)},
+            data=fields,
+            headers=headers
+        )
+    except httpx.HTTPError:
+        result.count_status(0)
+        return
+
+    result.count_status(response.status_code)
+    if response.status_code != 200:
+        return
+    result.submit_latencies.append(time.perf_counter() - started)
+
+    task_id = response.json()["task_id"]
+    deadline = started + task_timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(poll_interval)
+        result.polls += 1
+        try:
+            status = (await client.get(f"/api/v1/transcribe/{task_id}")).json()["status"]
+        except (httpx.HTTPError, ValueError, KeyError):
+            continue
+        if status == "completed":
+            result.completed += 1
+            result.e2e_latencies.append(time.perf_counter() - started)
+            return
+        if status == "failed":
+            result.failed += 1
+            return
+    result.timed_out += 1
+
+
+async def run_load(
+    base_url: str,
+    audio_path: str,
+    rps: float,
+    duration: float,
+    poll_interval: float = 0.5,
+    task_timeout: float = 120.0,
+    fields: Optional[Dict[str, str]] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    Подает нагрузку с частотой rps в течение duration секунд
+
+    Args:
+        base_url: Адрес сервиса
+        audio_path: Аудиофайл для отправки
+        rps: Задач в секунду
+        duration: Длительность подачи нагрузки
+        poll_interval: Интервал опроса статуса
+        task_timeout: Сколько ждать завершения одной задачи
+        fields: Дополнительные поля формы (language, trim_silence, ...)
+        headers: Дополнительные заголовки (X-API-Key, Idempotency-Key, ...)
+
+    Returns:
+        Сводка прогона
+    """
+    audio = Path(audio_path).read_bytes()
+    filename = Path(audio_path).name
+    result = LoadResult()
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=task_timeout, limits=limits) as client:
+        jobs = []
+        total = int(rps * duration)
+        started = time.perf_counter()
+        for i in range(total):
+            # Открытая модель: момент отправки не зависит от ответов
+            delay = started + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            jobs.append(asyncio.create_task(_run_job(
+                client, result, audio, filename, fields or {}, headers or {}, poll_interval, task_timeout
+            )))
+        await asyncio.gather(*jobs)
+        elapsed = time.perf_counter() - started
+
+    return result.to_dict(elapsed, total)
+
+
+def main():
+    """Запуск генератора нагрузки"""
+    parser = argparse.ArgumentParser(description="Генератор нагрузки на API распознавания")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--audio", default="input/audio.ogg")
+    parser.add_argument("--rps", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--language", default="ru-RU")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(
+        args.url, args.audio, args.rps, args.duration, args.poll_interval,
+        fields={"language": args.language}
+    ))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
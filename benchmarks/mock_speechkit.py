@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Локальный мок Yandex SpeechKit для нагрузочных тестов
+
+Эмулирует эндпоинты:
+    POST /speech/v1/stt:recognize             — синхронное распознавание
+    POST /speech/stt/v2/longRunningRecognize  — асинхронное распознавание
+    GET  /operations/{operation_id}           — статус операции
+    POST /iam/v1/tokens                       — выдача IAM-токена
+
+Задержки берутся из распределения (fixed, uniform, lognormal), часть
+запросов завершается ошибкой 500 или 429. Счетчики доступны на GET /_stats
+и сбрасываются через POST /_reset.
+
+Запуск:
+    python -m benchmarks.mock_speechkit --port 9000 --latency lognormal:300,0.5 --error-rate 0.01 --throttle-rate 0.02
+
+Сервис направляется на мок через YANDEX_STT_URL=http://127.0.0.1:9000/speech/v1/stt:recognize
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def parse_latency(spec: str, seed: Optional[int] = None) -> Callable[[], float]:
+    """
+    Разбирает описание распределения задержки (в миллисекундах)
+
+    Args:
+        spec: "fixed:200", "uniform:100,500" или "lognormal:<медиана>,<sigma>"
+        seed: Зерно генератора
+
+    Returns:
+        Функция, возвращающая очередную задержку в секундах
+    """
+    rng = random.Random(seed)
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        low, high = values
+        return lambda: rng.uniform(low, high) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        mu = math.log(median)
+        return lambda: rng.lognormvariate(mu, sigma) / 1000
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+class MockState:
+    """Настройки и счетчики мока"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:200",
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        max_concurrency: int = 0,
+        operation_polls: int = 2,
+        formats: Optional[List[str]] = None,
+        seed: Optional[int] = 42
+    ):
+        self.latency = parse_latency(latency, seed)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.operation_polls = operation_polls
+        # Принимаемые форматы тела (None — любые), остальные получают 415
+        self.formats = formats
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.operations: Dict[str, int] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Сбрасывает счетчики"""
+        self.stats = {
+            "recognize_calls": 0,
+            "recognize_bytes": 0,
+            "longrunning_calls": 0,
+            "operation_polls": 0,
+            "iam_tokens": 0,
+            "throttled": 0,
+            "errors": 0,
+            "max_in_flight": 0,
+        }
+
+    def failure(self) -> Optional[JSONResponse]:
+        """Решает, нужно ли ответить ошибкой вместо результата"""
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            self.stats["throttled"] += 1
+            return JSONResponse({"error_code": "RESOURCE_EXHAUSTED", "error_message": "Too many requests"}, 429)
+
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return JSONResponse({"error_code": "RESOURCE_EXHAUSTED", "error_message": "Quota exceeded"}, 429)
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return JSONResponse({"error_code": "INTERNAL", "error_message": "Mock failure"}, 500)
+        return None
+
+
+def fake_chunks(duration: float, channel: str = "0"):
+    """Ответ в формате v2 со словами и временными метками"""
+    words = []
+    position = 0.0
+    index = 0
+    while position + 0.4 <= max(duration, 0.4):
+        words.append({
+            "startTime": f"{position:.3f}s",
+            "endTime": f"{position + 0.35:.3f}s",
+            "word": f"слово{index}",
+            "confidence": 0.9
+        })
+        position += 0.5
+        index += 1
+    return [{
+        "alternatives": [{
+            "words": words,
+            "text": " ".join(w["word"] for w in words),
+            "confidence": 0.9
+        }],
+        "channelTag": channel
+    }]
+
+
+def create_app(state: MockState) -> FastAPI:
+    """Создает приложение мока"""
+    app = FastAPI(title="SpeechKit mock")
+
+    @app.post("/speech/v1/stt:recognize")
+    async def recognize(request: Request):
+        body = await request.body()
+        state.stats["recognize_calls"] += 1
+        state.stats["recognize_bytes"] += len(body)
+
+        audio_format = request.query_params.get("format", "oggopus")
+        if state.formats is not None and audio_format not in state.formats:
+            return JSONResponse({"error_code": "BAD_REQUEST", "error_message": f"Unsupported format {audio_format}"}, 415)
+
+        failure = state.failure()
+        if failure is not None:
+            return failure
+
+        state.in_flight += 1
+        state.stats["max_in_flight"] = max(state.stats["max_in_flight"], state.in_flight)
+        try:
+            await asyncio.sleep(state.latency())
+        finally:
+            state.in_flight -= 1
+        return {"result": f"распознанный текст {len(body)} байт"}
+
+    @app.post("/speech/stt/v2/longRunningRecognize")
+    async def long_running(request: Request):
+        await request.body()
+        state.stats["longrunning_calls"] += 1
+
+        failure = state.failure()
+        if failure is not None:
+            return failure
+
+        operation_id = uuid.uuid4().hex
+        state.operations[operation_id] = 0
+        return {"id": operation_id, "done": False}
+
+    @app.get("/operations/{operation_id}")
+    async def operation(operation_id: str):
+        state.stats["operation_polls"] += 1
+        if operation_id not in state.operations:
+            return JSONResponse({"error_code": "NOT_FOUND"}, 404)
+
+        await asyncio.sleep(state.latency())
+        state.operations[operation_id] += 1
+        if state.operations[operation_id] < state.operation_polls:
+            return {"id": operation_id, "done": False}
+        return {"id": operation_id, "done": True, "response": {"chunks": fake_chunks(5.0)}}
+
+    @app.post("/iam/v1/tokens")
+    async def iam_token():
+        state.stats["iam_tokens"] += 1
+        expires = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 12 * 3600))
+        return {"iamToken": f"mock-{uuid.uuid4().hex}", "expiresAt": expires}
+
+    @app.get("/_stats")
+    async def stats():
+        return {**state.stats, "in_flight": state.in_flight}
+
+    @app.post("/_reset")
+    async def reset():
+        state.reset()
+        return {"status": "reset"}
+
+    return app
+
+
+def main():
+    """Запуск мока"""
+    parser = argparse.ArgumentParser(description="Мок Yandex SpeechKit")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="lognormal:300,0.4", help="fixed:ms | uniform:a,b | lognormal:median,sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Больше одновременных запросов — 429 (0 = без лимита)")
+    parser.add_argument("--operation-polls", type=int, default=2, help="Через сколько опросов операция готова")
+    parser.add_argument("--formats", help="Принимаемые форматы через запятую, например lpcm (по умолчанию любые)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    state = MockState(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        max_concurrency=args.max_concurrency,
+        operation_polls=args.operation_polls,
+        formats=args.formats.split(",") if args.formats else None,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(state), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
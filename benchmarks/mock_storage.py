@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Локальное файловое хранилище для проверки распознавания по ссылке
+
+Отдает файлы каталога по пути /{bucket}/{key}: файлы верхнего уровня
+каталога — это бакеты, вложенные пути — ключи. Один и тот же адрес
+подходит и как обычная HTTP-ссылка, и как S3_ENDPOINT_URL для s3://bucket/key.
+
+Поддерживаются Range (206), ETag, HEAD и (с --access-key/--secret-key)
+проверка подписи AWS Signature V4. Счетчики запросов и отданных байтов
+доступны на GET /_stats и сбрасываются через POST /_reset.
+
+Запуск:
+    python -m benchmarks.mock_storage --root benchmarks/.corpus --port 9100 \\
+        --access-key test --secret-key secret
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from app.services.remote_source import sign_s3_request
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class StorageState:
+    """Каталог с файлами, ключи доступа и счетчики"""
+
+    def __init__(self, root: str, access_key: str = "", secret_key: str = "", region: str = "ru-central1"):
+        self.root = Path(root).resolve()
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.reset()
+
+    def reset(self) -> None:
+        """Сбрасывает счетчики"""
+        self.requests = 0
+        self.range_requests = 0
+        self.rejected = 0
+        self.bytes_served = 0
+
+    def stats(self) -> Dict:
+        """Счетчики для /_stats"""
+        return {
+            "requests": self.requests,
+            "range_requests": self.range_requests,
+            "rejected": self.rejected,
+            "bytes_served": self.bytes_served,
+        }
+
+    def check_signature(self, request: Request) -> bool:
+        """Проверяет подпись AWS Signature V4, если заданы ключи"""
+        if not self.access_key:
+            return True
+        amz_date = request.headers.get("x-amz-date", "")
+        try:
+            signed_at = datetime.strptime(amz_date, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return False
+        raw_path = request.scope.get("raw_path", b"").decode("ascii") or request.url.path
+        url = f"http://{request.headers.get('host', '')}{raw_path}"
+        if request.url.query:
+            url += f"?{request.url.query}"
+        # В подписи GET и HEAD совпадают с точностью до метода
+        expected = sign_s3_request(request.method, url, self.access_key, self.secret_key, self.region, now=signed_at)
+        return hmac.compare_digest(expected["Authorization"], request.headers.get("authorization", ""))
+
+    def resolve(self, path: str) -> Optional[Path]:
+        """Файл по пути запроса (вне каталога — None)"""
+        target = (self.root / path).resolve()
+        if self.root not in target.parents or not target.is_file():
+            return None
+        return target
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """Диапазон байтов [start, end] из заголовка Range"""
+    match = RANGE_RE.match(header or "")
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    return (start, end) if start <= end else None
+
+
+def create_app(state: StorageState) -> FastAPI:
+    """Создает приложение хранилища"""
+    app = FastAPI(title="Mock object storage")
+
+    @app.get("/_stats")
+    async def stats():
+        return state.stats()
+
+    @app.post("/_reset")
+    async def reset():
+        state.reset()
+        return state.stats()
+
+    @app.api_route("/{path:path}", methods=["GET", "HEAD"])
+    async def get_object(path: str, request: Request):
+        state.requests += 1
+        if not state.check_signature(request):
+            state.rejected += 1
+            return JSONResponse({"error": "SignatureDoesNotMatch"}, status_code=403)
+
+        target = state.resolve(path)
+        if target is None:
+            return JSONResponse({"error": "NoSuchKey"}, status_code=404)
+
+        stat = target.stat()
+        size = stat.st_size
+        etag = '"' + hashlib.md5(f"{target}:{size}:{stat.st_mtime_ns}".encode()).hexdigest() + '"'
+        headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+
+        byte_range = _parse_range(request.headers.get("range"), size)
+        if request.headers.get("range") and byte_range is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        if byte_range:
+            state.range_requests += 1
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            status = 206
+        else:
+            start, end = 0, size - 1
+            status = 200
+        headers["Content-Length"] = str(end - start + 1)
+
+        if request.method == "HEAD":
+            return Response(status_code=status, headers=headers)
+
+        def body():
+            with open(target, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    state.bytes_served += len(chunk)
+                    yield chunk
+
+        return StreamingResponse(body(), status_code=status, headers=headers, media_type="application/octet-stream")
+
+    return app
+
+
+def main():
+    """Запуск хранилища"""
+    parser = argparse.ArgumentParser(description="Локальное хранилище объектов")
+    parser.add_argument("--root", default=os.getcwd(), help="Каталог с бакетами")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--access-key", default="", help="Проверять подпись SigV4 этим ключом")
+    parser.add_argument("--secret-key", default="")
+    parser.add_argument("--region", default="ru-central1")
+    args = parser.parse_args()
+
+    state = StorageState(args.root, args.access_key, args.secret_key, args.region)
+    uvicorn.run(create_app(state), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
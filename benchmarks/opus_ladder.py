@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Размер запроса против качества по ступеням OPUS_LADDER
+
+Фиксированный корпус (30, 120 и 600 сек синтетической речи, плюс свои
+файлы через --audio) кодируется на каждой ступени лестницы. Для каждой
+ступени печатаются:
+
+    bytes     — размер OGG Opus;
+    est       — оценка estimate_opus_bytes, по которой ступень выбирается
+                до кодирования (должна быть не меньше bytes);
+    lsd       — log-spectral distance в полосе 100–4000 Гц между исходным
+                сигналом и декодированным Opus (оба на 16 кГц), дБ: чем
+                меньше, тем ближе к исходному. Заменяет оценку по
+                распознаванию, которое без сети недоступно.
+
+и ступень, которую plan_encoding выберет для файла при текущем лимите.
+С --recognize каждая ступень отправляется в SpeechKit (YANDEX_STT_URL,
+нужны токен и каталог) и текст сравнивается с текстом верхней ступени.
+
+Запуск:
+    python -m benchmarks.opus_ladder --durations 30,120,600 --audio input/audio.ogg
+"""
+
+import argparse
+import difflib
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from benchmarks.corpus import ensure_file
+
+QUALITY_RATE = 16000
+FFT_SIZE = 512
+BAND_HZ = (100, 4000)
+
+
+def _decode(path: str) -> np.ndarray:
+    """Моно сигнал файла на QUALITY_RATE"""
+    from app.services.audio_stream import iter_pcm_windows
+
+    windows = list(iter_pcm_windows(path, QUALITY_RATE))
+    return np.concatenate(windows).astype(np.float64) if windows else np.zeros(0)
+
+
+def _log_spectrum(signal: np.ndarray) -> np.ndarray:
+    """Логарифмический спектр мощности кадров в полосе BAND_HZ"""
+    hop = FFT_SIZE // 2
+    count = max(0, (len(signal) - FFT_SIZE) // hop + 1)
+    frames = np.lib.stride_tricks.sliding_window_view(signal, FFT_SIZE)[::hop][:count]
+    power = np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(FFT_SIZE, 1 / QUALITY_RATE)
+    band = (freqs >= BAND_HZ[0]) & (freqs <= BAND_HZ[1])
+    return 10 * np.log10(power[:, band] + 1e-3)
+
+
+def log_spectral_distance(reference: np.ndarray, decoded: np.ndarray) -> float:
+    """Средняя по кадрам LSD, дБ (кадры тишины исходника не учитываются)"""
+    length = min(len(reference), len(decoded))
+    ref, dec = _log_spectrum(reference[:length]), _log_spectrum(decoded[:length])
+    # Тишина и шум почти ничего не весят для распознавания, но дают большой разброс LSD
+    voiced = ref.max(axis=1) > ref.max() - 50
+    distance = np.sqrt(np.mean((ref[voiced] - dec[voiced]) ** 2, axis=1))
+    return float(distance.mean())
+
+
+def _recognize(path: str, language: str) -> str:
+    """Текст синхронного распознавания файла"""
+    import httpx
+    from app.core.config import settings
+
+    response = httpx.post(
+        settings.YANDEX_STT_URL,
+        params={"lang": language, "folderId": settings.YANDEX_FOLDER_ID, "format": "oggopus"},
+        headers={"Authorization": f"Bearer {settings.YANDEX_CLOUD_IAM_TOKEN}"},
+        content=Path(path).read_bytes(),
+        timeout=60.0
+    )
+    response.raise_for_status()
+    return response.json().get("result", "")
+
+
+def run_file(source: str, limit: int, recognize: Optional[str]) -> None:
+    """Кодирует файл на каждой ступени и печатает строку на ступень"""
+    from app.core.config import settings
+    from app.services.audio_stream import EncodingPlan, encode_opus_stream, estimate_opus_bytes, plan_encoding
+
+    reference = _decode(source)
+    duration = len(reference) / QUALITY_RATE
+    chosen = plan_encoding(duration, limit)
+    print(f"\n{Path(source).name}: {duration:.0f} сек, лимит {limit} байт -> {chosen}"
+          + ("" if chosen.fits else " (частями)"))
+    print(f"{'ступень':<16} {'bytes':>9} {'est':>9} {'lsd, дБ':>8} {'в лимит':>8}" + ("  текст" if recognize else ""))
+
+    top_text = None
+    with tempfile.TemporaryDirectory() as workdir:
+        for bitrate, sample_rate in settings.OPUS_LADDER:
+            plan = EncodingPlan(bitrate, sample_rate)
+            output = os.path.join(workdir, f"{bitrate}.ogg")
+            encode_opus_stream(source, False, output, plan=plan)
+            size = os.path.getsize(output)
+            lsd = log_spectral_distance(reference, _decode(output))
+            line = (
+                f"{str(plan):<16} {size:>9} {estimate_opus_bytes(duration, bitrate):>9} {lsd:>8.2f} "
+                f"{'да' if size <= limit else 'нет':>8}"
+            )
+            if recognize and size <= limit:
+                text = _recognize(output, recognize)
+                top_text = text if top_text is None else top_text
+                similarity = difflib.SequenceMatcher(None, top_text.split(), text.split()).ratio()
+                line += f"  {similarity:.2f} к верхней ступени"
+            print(line)
+
+
+def main():
+    """Точка входа"""
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Размер против качества по ступеням Opus")
+    parser.add_argument("--durations", default="30,120,600")
+    parser.add_argument("--audio", action="append", default=[], help="Свой файл (можно несколько раз)")
+    parser.add_argument("--limit", type=int, default=settings.STT_MAX_REQUEST_BYTES)
+    parser.add_argument("--recognize", metavar="LANG", help="Сравнить тексты распознавания, например ru-RU")
+    args = parser.parse_args()
+
+    sources: List[str] = [str(ensure_file("wav", int(d))) for d in args.durations.split(",") if d]
+    for source in sources + args.audio:
+        run_file(source, args.limit, args.recognize)
+
+
+if __name__ == "__main__":
+    main()
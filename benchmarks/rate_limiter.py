@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк накладных расходов лимитов клиентов
+
+Измеряет время check_request + release (горячий путь загрузки) для
+in-memory бэкенда при разном числе клиентов: время не должно зависеть
+от числа клиентов и должно быть пренебрежимо мало по сравнению с загрузкой.
+
+Запуск:
+    python -m benchmarks.rate_limiter --calls 200000 --tenants 1,1000,100000
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.services.rate_limiter import RateLimiter, RateLimitExceeded, Tenant
+
+
+async def bench(calls: int, tenants: int) -> float:
+    """Среднее время проверки в микросекундах"""
+    limiter = RateLimiter()
+    limiter.enabled = True
+    pool = [Tenant(f"bench:{i}", rps=1e9, burst=10**9, max_concurrent=0) for i in range(tenants)]
+
+    started = time.perf_counter()
+    for i in range(calls):
+        tenant = pool[i % tenants]
+        try:
+            await limiter.check_request(tenant)
+        except RateLimitExceeded:
+            pass
+        await limiter.release(tenant.name)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Бенчмарк лимитов клиентов")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--tenants", default="1,1000,100000", help="Число клиентов через запятую")
+    args = parser.parse_args()
+
+    for tenants in (int(t) for t in args.tenants.split(",")):
+        print(f"{tenants:>8} клиентов: {asyncio.run(bench(args.calls, tenants)):.2f} мкс на загрузку")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность SpeechKitClient.recognize_many против поочередного распознавания
+
+Поднимает мок SpeechKit с заданной задержкой и распознает N копий файла
+корпуса тремя способами:
+
+    sequential — await client.recognize(...) по одному файлу;
+    many       — recognize_many(concurrency=C), результаты по готовности;
+    ordered    — recognize_many(concurrency=C, ordered=True).
+
+Для каждого печатает файлы/сек и время до первого результата, для
+ordered дополнительно проверяет порядок. Код выхода 1, если recognize_many
+не быстрее поочередного или порядок нарушен.
+
+Запуск:
+    python -m benchmarks.recognize_many --duration 30 --files 16 --concurrency 8 --latency fixed:300
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.corpus import ensure_file
+from benchmarks.harness import _free_port, _wait_ready
+
+
+async def run_mode(mode: str, sources: List[str], url: str, concurrency: int) -> Dict:
+    """Распознает sources одним способом"""
+    from app.speechkit import SpeechKitClient
+
+    client = SpeechKitClient(iam_token="benchmark", folder_id="benchmark", endpoints=[url])
+    indexes = []
+    first = None
+    started = time.perf_counter()
+    if mode == "sequential":
+        for index, source in enumerate(sources):
+            await client.recognize(source)
+            indexes.append(index)
+            first = first or time.perf_counter() - started
+    else:
+        async for result in client.recognize_many(sources, concurrency=concurrency, ordered=mode == "ordered"):
+            if not result.ok:
+                raise RuntimeError(f"{result.source}: {result.error}")
+            indexes.append(result.index)
+            first = first or time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+    client.close()
+    return {
+        "files_per_s": round(len(sources) / elapsed, 2),
+        "first_result_ms": round(first * 1000),
+        "elapsed_s": round(elapsed, 2),
+        "in_order": indexes == sorted(indexes),
+    }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="recognize_many против поочередного распознавания")
+    parser.add_argument("--format", default="wav")
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", default="fixed:300", help="Задержка мока (см. benchmarks.mock_speechkit)")
+    args = parser.parse_args()
+
+    sources = [str(ensure_file(args.format, args.duration))] * args.files
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_speechkit", "--port", str(port), "--latency", args.latency],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        _wait_ready(f"{url}/_stats")
+        results = {
+            mode: asyncio.run(run_mode(mode, sources, f"{url}/speech/v1/stt:recognize", args.concurrency))
+            for mode in ("sequential", "many", "ordered")
+        }
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+
+    for mode, summary in results.items():
+        print(f"{mode:<11} {summary}")
+    ok = (
+        results["many"]["files_per_s"] > results["sequential"]["files_per_s"]
+        and results["ordered"]["in_order"]
+    )
+    print("✅ recognize_many работает" if ok else "❌ ожидания не выполнены")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
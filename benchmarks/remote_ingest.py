@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Проверка распознавания по ссылке против локального хранилища
+
+Поднимает мок SpeechKit, локальное хранилище (benchmarks.mock_storage)
+с проверкой подписи SigV4 и сервис, настроенный на него как на S3. Затем
+одновременно отправляет N ссылок в двух режимах:
+
+    http — обычные HTTP-ссылки на файлы хранилища;
+    s3   — ссылки s3://bucket/key (запросы подписываются).
+
+Для каждого режима проверяется, что все задачи завершились, и сколько
+байтов отдало хранилище: на задачу — один запрос с Range и одна потоковая
+загрузка файла, без повторного скачивания. Код выхода 1, если задачи
+не завершились или хранилище отклоняло подписи.
+
+Запуск:
+    python -m benchmarks.remote_ingest --duration 30 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.harness import _free_port, _wait_ready, running_service
+from benchmarks.dedup import _wait_results
+
+ACCESS_KEY = "benchmark"
+SECRET_KEY = "benchmark-secret"
+BUCKET = "calls"
+
+
+async def run_mode(service: Dict, storage_url: str, urls: List[str]) -> Dict:
+    """Отправляет ссылки, ждет задач и возвращает сводку"""
+    httpx.post(f"{storage_url}/_reset")
+    async with httpx.AsyncClient(base_url=service["service_url"], timeout=120.0) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/v1/transcribe/url", json={"url": url}) for url in urls
+        ])
+        for response in responses:
+            response.raise_for_status()
+        task_ids = [response.json()["task_id"] for response in responses]
+        results = await _wait_results(client, task_ids)
+        statuses = [(await client.get(f"/api/v1/transcribe/{task_id}")).json()["status"] for task_id in task_ids]
+        elapsed = time.perf_counter() - started
+
+    storage = httpx.get(f"{storage_url}/_stats").json()
+    return {
+        "completed": statuses.count("completed"),
+        "failed": statuses.count("failed"),
+        "errors": sorted({r for r, s in zip(results, statuses) if s != "completed"})[:3],
+        "storage_requests": storage["requests"],
+        "rejected": storage["rejected"],
+        "bytes_served": storage["bytes_served"],
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Проверка распознавания по ссылке")
+    parser.add_argument("--duration", type=int, default=30, help="Длительность файла корпуса, сек")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    source = ensure_file("wav", args.duration)
+    ok = True
+    with tempfile.TemporaryDirectory() as root:
+        # Разные файлы, чтобы одинаковые ссылки не объединялись в одну задачу
+        keys = [f"bench/{i}.wav" for i in range(args.concurrency)]
+        for key in keys:
+            target = Path(root) / BUCKET / key
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+
+        port = _free_port()
+        storage_url = f"http://127.0.0.1:{port}"
+        storage = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.mock_storage", "--root", root, "--port", str(port),
+            "--access-key", ACCESS_KEY, "--secret-key", SECRET_KEY,
+        ], stdout=subprocess.DEVNULL)
+        env = {
+            "REMOTE_ALLOW_PRIVATE": "true",
+            "S3_ENDPOINT_URL": storage_url,
+            "S3_ACCESS_KEY_ID": ACCESS_KEY,
+            "S3_SECRET_ACCESS_KEY": SECRET_KEY,
+        }
+        try:
+            _wait_ready(f"{storage_url}/_stats")
+            with running_service({"latency": "fixed:200"}, env) as service:
+                modes = {
+                    "http": [f"{storage_url}/{BUCKET}/{key}" for key in keys],
+                    "s3": [f"s3://{BUCKET}/{key}" for key in keys],
+                }
+                for mode, urls in modes.items():
+                    summary = asyncio.run(run_mode(service, storage_url, urls))
+                    passed = summary["completed"] == len(urls) and summary["rejected"] == 0
+                    ok = ok and passed
+                    per_task = summary["bytes_served"] / len(urls) / source.stat().st_size
+                    print(f"{'✅' if passed else '❌'} {mode:<5} {summary} (x{per_task:.2f} размера файла на задачу)")
+        finally:
+            storage.terminate()
+            storage.wait(timeout=10)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Проверка остановки с ожиданием задач и продолжения после перезапуска
+
+Поднимает мок SpeechKit и сервис с одним обработчиком, отправляет N задач
+и посылает сервису SIGTERM, затем запускает его снова с теми же каталогами
+и ждет завершения всех задач. Два режима:
+
+    drain      — ожидание при остановке дольше ответа SpeechKit: выполняющаяся
+                 задача успевает завершиться, остальные продолжаются после
+                 запуска; вызовов SpeechKit ровно N;
+    interrupt  — ожидание короче ответа: выполняющаяся задача прерывается и
+                 после запуска повторяется без повторной конвертации; вызовов N + 1.
+
+В обоих режимах все задачи должны завершиться под прежними ID, а повтор
+запроса с тем же Idempotency-Key — вернуть прежнюю задачу. Код выхода 1,
+если ожидания не выполнены.
+
+Запуск:
+    python -m benchmarks.restart --tasks 3
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.dedup import _wait_results
+from benchmarks.harness import _free_port, _wait_ready
+
+MODES = {
+    # задержка SpeechKit, мс; ожидание при остановке, сек; лишних вызовов SpeechKit
+    "drain": (2000, 10.0, 0),
+    "interrupt": (5000, 1.0, 1),
+}
+
+
+def _start_service(port: int, env: Dict[str, str], log) -> subprocess.Popen:
+    service = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    _wait_ready(f"http://127.0.0.1:{port}/health")
+    return service
+
+
+def run_mode(mode: str, tasks: int) -> Dict:
+    """Прогоняет остановку и перезапуск, возвращает сводку"""
+    latency, drain, extra_calls = MODES[mode]
+    audio = ensure_file("wav", 5).read_bytes()
+    mock_port, service_port = _free_port(), _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    service_url = f"http://127.0.0.1:{service_port}"
+
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_speechkit", "--port", str(mock_port), "--latency", f"fixed:{latency}"],
+        stdout=subprocess.DEVNULL
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "YANDEX_CLOUD_IAM_TOKEN": "benchmark",
+            "YANDEX_FOLDER_ID": "benchmark",
+            "YANDEX_STT_URL": f"{mock_url}/speech/v1/stt:recognize",
+            "UPLOAD_DIR": str(Path(workdir) / "uploads"),
+            "OUTPUT_DIR": str(Path(workdir) / "outputs"),
+            "CHECKPOINT_DIR": str(Path(workdir) / "checkpoints"),
+            "EXPORT_DIR": str(Path(workdir) / "exports"),
+            "RATE_LIMIT_ENABLED": "false",
+            "SCHED_WORKERS": "1",
+            "SCHED_MAX_WAIT_SECONDS": "0",
+            "SHUTDOWN_DRAIN_SECONDS": str(drain),
+        }
+        log_path = Path(workdir) / "service.log"
+        try:
+            _wait_ready(f"{mock_url}/_stats")
+            with open(log_path, "a") as log:
+                service = _start_service(service_port, env, log)
+                task_ids: List[str] = []
+                for i in range(tasks):
+                    response = httpx.post(
+                        f"{service_url}/api/v1/transcribe",
+                        files={"file": ("audio.wav", audio + bytes([i]))},
+                        headers={"Idempotency-Key": f"restart-{i}"}
+                    )
+                    response.raise_for_status()
+                    task_ids.append(response.json()["task_id"])
+
+                # Первая задача уже отправлена в SpeechKit
+                time.sleep(1.5)
+                stopping = time.perf_counter()
+                service.send_signal(signal.SIGTERM)
+                service.wait(timeout=drain + 30)
+                stop_seconds = time.perf_counter() - stopping
+
+                service = _start_service(service_port, env, log)
+                try:
+                    asyncio.run(_wait_all(service_url, task_ids))
+                    statuses = [httpx.get(f"{service_url}/api/v1/transcribe/{task_id}").json()["status"] for task_id in task_ids]
+                    replay = httpx.post(
+                        f"{service_url}/api/v1/transcribe",
+                        files={"file": ("audio.wav", audio + bytes([0]))},
+                        headers={"Idempotency-Key": "restart-0"}
+                    ).json()["task_id"]
+                finally:
+                    service.terminate()
+                    service.wait(timeout=30)
+            reused = log_path.read_text(encoding="utf-8").count("ранее сконвертированный")
+        finally:
+            upstream = httpx.get(f"{mock_url}/_stats").json()["recognize_calls"]
+            mock.terminate()
+            mock.wait(timeout=10)
+
+    return {
+        "completed": statuses.count("completed"),
+        "upstream_calls": upstream,
+        "expected_calls": tasks + extra_calls,
+        "conversions_reused": reused,
+        "replayed": replay == task_ids[0],
+        "stop_s": round(stop_seconds, 2),
+    }
+
+
+async def _wait_all(service_url: str, task_ids: List[str]) -> None:
+    async with httpx.AsyncClient(base_url=service_url, timeout=30.0) as client:
+        await _wait_results(client, task_ids)
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Проверка остановки и продолжения задач")
+    parser.add_argument("--tasks", type=int, default=3)
+    args = parser.parse_args()
+
+    ok = True
+    for mode in MODES:
+        summary = run_mode(mode, args.tasks)
+        passed = (
+            summary["completed"] == args.tasks
+            and summary["upstream_calls"] == summary["expected_calls"]
+            and summary["replayed"]
+            and (mode == "drain" or summary["conversions_reused"] >= 1)
+        )
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {mode:<10} {summary}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Возобновляемая загрузка частями против загрузки одним запросом
+
+Поднимает мок SpeechKit и сервис и передает файл корпуса с ограниченной
+скоростью (--mbps) двумя способами:
+
+    single    — POST /transcribe одним запросом;
+    resumable — POST /uploads, части PATCH-запросами с Upload-Checksum,
+                одна часть обрывается на середине (без контрольной суммы:
+                принятые байты сохраняются), клиент узнает смещение через
+                HEAD и продолжает, затем POST /uploads/{id}/finalize.
+
+Для каждого способа печатает полное время (первый байт — результат) и
+время от последнего байта до результата: при загрузке частями файл
+декодируется, пока передается, и к концу загрузки остается меньше работы.
+Код выхода 1, если задача не завершилась, после обрыва пришлось начинать
+сначала или задача получила не декодированный во время загрузки WAV
+(длительность из его заголовка точная, в отличие от оценки по размеру).
+
+Запуск:
+    python -m benchmarks.resumable_upload --format mp3 --duration 300 --mbps 8
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, List
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.dedup import _wait_results
+from benchmarks.harness import running_service
+
+PIECE_SIZE = 64 * 1024
+
+
+class Throttle:
+    """Ограничение скорости отправки и момент последнего байта"""
+
+    def __init__(self, mbps: float):
+        self.bytes_per_s = mbps * 1024 * 1024 / 8
+        self.sent = 0
+        self.started = 0.0
+        self.last_byte = 0.0
+
+    async def stream(self, data: bytes, fail_after: int = -1) -> AsyncIterator[bytes]:
+        """Отдает data кусками с заданной скоростью; обрывает после fail_after байт"""
+        for start in range(0, len(data), PIECE_SIZE):
+            if 0 <= fail_after <= start:
+                raise ConnectionResetError("Имитация обрыва соединения")
+            piece = data[start:start + PIECE_SIZE]
+            self.sent += len(piece)
+            delay = self.started + self.sent / self.bytes_per_s - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield piece
+        self.last_byte = time.perf_counter()
+
+
+async def run_single(client: httpx.AsyncClient, path: Path, mbps: float) -> Dict:
+    """Загрузка одним запросом"""
+    data = path.read_bytes()
+    throttle = Throttle(mbps)
+    boundary = "benchmark-boundary"
+    head = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{path.name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    async def body():
+        yield head
+        async for piece in throttle.stream(data):
+            yield piece
+        yield tail
+
+    throttle.started = time.perf_counter()
+    response = await client.post(
+        "/api/v1/transcribe",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    response.raise_for_status()
+    task_id = response.json()["task_id"]
+    return await _summary(client, task_id, throttle, resumed_from=None)
+
+
+async def run_resumable(client: httpx.AsyncClient, path: Path, mbps: float) -> Dict:
+    """Загрузка частями с обрывом одной из них"""
+    data = path.read_bytes()
+    throttle = Throttle(mbps)
+    throttle.started = time.perf_counter()
+    created = await client.post("/api/v1/uploads", json={
+        "filename": path.name,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    })
+    created.raise_for_status()
+    upload_url = created.headers["Location"]
+    chunk_size = created.json()["chunk_size"]
+
+    offset = 0
+    dropped = False
+    resumed_from = None
+    while offset < len(data):
+        chunk = data[offset:offset + chunk_size]
+        if not dropped and offset + len(chunk) >= len(data) // 2:
+            # Обрыв на середине части: без Upload-Checksum принятые байты сохраняются
+            dropped = True
+            try:
+                await client.patch(
+                    upload_url,
+                    content=throttle.stream(chunk, fail_after=len(chunk) // 2),
+                    headers={"Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"}
+                )
+            except (httpx.HTTPError, ConnectionResetError):
+                pass
+            head = await client.head(upload_url)
+            head.raise_for_status()
+            offset = resumed_from = int(head.headers["Upload-Offset"])
+            continue
+
+        checksum = base64.b64encode(hashlib.sha256(chunk).digest()).decode()
+        response = await client.patch(
+            upload_url,
+            content=throttle.stream(chunk),
+            headers={
+                "Upload-Offset": str(offset),
+                "Upload-Checksum": f"sha256 {checksum}",
+                "Content-Type": "application/offset+octet-stream",
+            }
+        )
+        response.raise_for_status()
+        offset = int(response.headers["Upload-Offset"])
+
+    response = await client.post(f"{upload_url}/finalize")
+    response.raise_for_status()
+    return await _summary(client, response.json()["task_id"], throttle, resumed_from)
+
+
+async def _summary(client: httpx.AsyncClient, task_id: str, throttle: Throttle, resumed_from) -> Dict:
+    result = (await _wait_results(client, [task_id], timeout=600.0))[0]
+    finished = time.perf_counter()
+    status = (await client.get(f"/api/v1/transcribe/{task_id}")).json()
+    return {
+        "status": status["status"],
+        "result": result,
+        "audio_duration": status["audio_duration"],
+        "total_s": round(finished - throttle.started, 2),
+        "after_last_byte_s": round(finished - throttle.last_byte, 2),
+        "resumed_from": resumed_from,
+    }
+
+
+async def run(service: Dict, path: Path, mbps: float) -> Dict[str, Dict]:
+    async with httpx.AsyncClient(base_url=service["service_url"], timeout=600.0) as client:
+        return {
+            "single": await run_single(client, path, mbps),
+            "resumable": await run_resumable(client, path, mbps),
+        }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Возобновляемая загрузка против загрузки одним запросом")
+    parser.add_argument("--format", default="mp3")
+    parser.add_argument("--duration", type=int, default=300)
+    parser.add_argument("--mbps", type=float, default=8.0, help="Скорость канала клиента, Мбит/с")
+    parser.add_argument("--chunk-mb", type=float, default=1.0, help="Размер части, МБ")
+    args = parser.parse_args()
+
+    path = ensure_file(args.format, args.duration)
+    with tempfile.TemporaryDirectory() as root:
+        env = {
+            "UPLOAD_RESUMABLE_DIR": str(Path(root) / "resumable"),
+            "UPLOAD_CHUNK_MAX_BYTES": str(int(args.chunk_mb * 1024 * 1024)),
+            # Загрузка одним запросом ограничена MAX_FILE_SIZE: для сравнения снимаем ограничение
+            "MAX_FILE_SIZE": str(path.stat().st_size + 1),
+        }
+        with running_service({"latency": "fixed:200"}, env) as service:
+            results = asyncio.run(run(service, path, args.mbps))
+
+    size_mb = path.stat().st_size / 1024 / 1024
+    print(f"{path.name}: {size_mb:.1f} МБ, канал {args.mbps} Мбит/с")
+    problems: List[str] = []
+    for mode, summary in results.items():
+        print(f"{mode:<10} {({k: v for k, v in summary.items() if k != 'result'})}")
+        if summary["status"] != "completed":
+            problems.append(f"{mode}: {summary['result']}")
+    if not results["resumable"]["resumed_from"]:
+        problems.append("после обрыва загрузка начата сначала")
+    if abs(results["resumable"]["audio_duration"] - args.duration) > 1:
+        problems.append("файл не декодирован во время загрузки (длительность не из WAV)")
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ загрузка частями продолжена после обрыва, файл проверен и распознан")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Время запуска сервиса
+
+Меряет в свежих процессах:
+
+    import          — импорт app.main (python -c "import app.main");
+    ready           — от запуска uvicorn до первого ответа 200 на /health;
+    first_result    — от запуска uvicorn до готового результата первой задачи
+                      (POST /transcribe с WAV и опрос статуса, SpeechKit — мок).
+
+Для сравнения с другой ревизией укажите ее рабочую копию через --tree
+(например, созданную git worktree add /tmp/base HEAD~1).
+
+Запуск:
+    python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.harness import _free_port, _wait_ready
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def _env(tree: Path, workdir: str, mock_url: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "PYTHONPATH": str(tree),
+        "YANDEX_CLOUD_IAM_TOKEN": "benchmark",
+        "YANDEX_FOLDER_ID": "benchmark",
+        "YANDEX_STT_URL": f"{mock_url}/speech/v1/stt:recognize",
+        "UPLOAD_DIR": str(Path(workdir) / "uploads"),
+        "OUTPUT_DIR": str(Path(workdir) / "outputs"),
+        "CHECKPOINT_DIR": str(Path(workdir) / "checkpoints"),
+        "EXPORT_DIR": str(Path(workdir) / "exports"),
+        "RATE_LIMIT_ENABLED": "false",
+        "SCHED_MAX_WAIT_SECONDS": "0",
+    }
+
+
+def measure_import(tree: Path, env: Dict[str, str]) -> float:
+    """Время импорта app.main в новом процессе, сек"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=tree, env=env, capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def measure_first_request(tree: Path, env: Dict[str, str], audio: bytes) -> Dict[str, float]:
+    """Время до готовности /health и до результата первой задачи, сек"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    service = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=url, timeout=30.0) as client:
+            while True:
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if service.poll() is not None or time.perf_counter() - started > 60:
+                    raise RuntimeError("Сервис не запустился")
+                time.sleep(0.01)
+            ready = time.perf_counter() - started
+
+            task_id = client.post("/api/v1/transcribe", files={"file": ("audio.wav", audio)}).json()["task_id"]
+            while client.get(f"/api/v1/transcribe/{task_id}").json()["status"] not in ("completed", "failed"):
+                time.sleep(0.01)
+            first_result = time.perf_counter() - started
+    finally:
+        service.terminate()
+        service.wait(timeout=30)
+    return {"ready": ready, "first_result": first_result}
+
+
+def _summary(values: List[float]) -> str:
+    return f"median {statistics.median(values) * 1000:7.0f} ms   min {min(values) * 1000:7.0f} ms"
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Время запуска сервиса")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tree", type=Path, default=ROOT, help="Рабочая копия для замера")
+    args = parser.parse_args()
+
+    tree = args.tree.resolve()
+    audio = ensure_file("wav", 5).read_bytes()
+    mock_port = _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_speechkit", "--port", str(mock_port), "--latency", "fixed:50"],
+        stdout=subprocess.DEVNULL
+    )
+    results: Dict[str, List[float]] = {"import": [], "ready": [], "first_result": []}
+    try:
+        _wait_ready(f"{mock_url}/_stats")
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as workdir:
+                env = _env(tree, workdir, mock_url)
+                results["import"].append(measure_import(tree, env))
+                for name, value in measure_first_request(tree, env, audio).items():
+                    results[name].append(value)
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+
+    print(f"Рабочая копия: {tree}")
+    for name, values in results.items():
+        print(f"{name:<13} {_summary(values)}")
+
+
+if __name__ == "__main__":
+    main()
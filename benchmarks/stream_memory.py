@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Пиковая память конвертации в зависимости от длительности файла
+
+Каждая конвертация выполняется в отдельном процессе, после нее снимается
+пиковый RSS процесса Python (VmHWM; у ffmpeg память от длительности не зависит):
+
+    pydub   — прежний путь: AudioSegment.from_file целиком, set_channels,
+              (VAD), set_frame_rate и export;
+    stream  — потоковый путь: окна NumPy из ffmpeg, VAD по энергии окон,
+              кодирование через stdin ffmpeg (audio_stream.encode_opus_stream).
+
+Потоковый путь должен держать память постоянной, прежний растет с длительностью.
+
+Запуск:
+    python -m benchmarks.stream_memory --durations 30,120,600,1800 --trim
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import ensure_file
+
+MODES = ["pydub", "stream"]
+
+
+def _convert(mode: str, source: str, trim: bool, output: str) -> None:
+    if mode == "pydub":
+        from pydub import AudioSegment
+        from app.services.audio_preprocess import trim_silence
+
+        audio = AudioSegment.from_file(source).set_channels(1)
+        if trim:
+            audio, _, _ = trim_silence(audio)
+        audio.set_frame_rate(48000).export(output, format="ogg", codec="libopus")
+    else:
+        from app.services.audio_stream import encode_opus_stream
+
+        encode_opus_stream(source, trim, output)
+
+
+def _peak_rss_mb() -> float:
+    """Пиковый RSS процесса (VmHWM; в отличие от ru_maxrss не наследуется через exec)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def child(mode: str, source: str, trim: bool) -> None:
+    """Конвертирует файл в этом процессе и печатает пиковую память"""
+    # Импорт до замера базовой памяти: сравниваются данные, а не модули
+    import numpy  # noqa: F401
+    import pydub  # noqa: F401
+    from app.services import audio_stream  # noqa: F401
+
+    baseline = _peak_rss_mb()
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        _convert(mode, source, trim, str(Path(workdir) / "out.ogg"))
+        elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "rss_peak_mb": _peak_rss_mb(),
+        "rss_baseline_mb": baseline,
+        "seconds": round(elapsed, 2),
+    }))
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Пиковая память конвертации")
+    parser.add_argument("--durations", default="30,120,600,1800")
+    parser.add_argument("--format", default="wav")
+    parser.add_argument("--trim", action="store_true", help="С вырезанием тишины")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.trim)
+        return
+
+    print(f"{'сек':>6} {'режим':<7} {'RSS пик':>9} {'база':>7} {'время':>7}")
+    for duration in map(int, args.durations.split(",")):
+        source = ensure_file(args.format, duration)
+        for mode in MODES:
+            command = [sys.executable, "-m", "benchmarks.stream_memory", "--child", mode, str(source)]
+            if args.trim:
+                command.append("--trim")
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{duration:>6} {mode:<7} {result['rss_peak_mb']:>7}MB {result['rss_baseline_mb']:>5}MB "
+                f"{result['seconds']:>6}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк представления задач: память на 100k задач и скорость опроса статуса
+
+Сравнивает прежний вариант (dict с datetime + pydantic-сериализация
+на каждый запрос) с TaskRecord и кэшем сериализованных ответов.
+
+Запуск:
+    python -m benchmarks.task_records --tasks 100000 --polls 200000
+"""
+
+import argparse
+import gc
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from app.core.config import settings
+from app.models.schemas import TaskStatus, TaskStatusResponse
+from app.models.task import TaskRecord
+from app.models.transcript import Segment, Transcript
+from app.services.task_service import TaskService
+from app.services.transcript_store import TranscriptStore
+
+
+WORDS = ["привет", "это", "тестовое", "сообщение", "распознавание", "речи", "звонок", "клиент"]
+
+
+def make_transcripts(count: int, seed: int = 42) -> List[str]:
+    """Генерирует транскрипты: в основном короткие, часть — длинные"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        length = rng.choice([20, 60, 150]) if rng.random() > 0.05 else 3000
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(length)))
+    return texts
+
+
+def build_legacy(texts: List[str]) -> Dict[str, Dict]:
+    """Прежнее представление: словарь на задачу (текст копируется, как после ответа API)"""
+    tasks = {}
+    for text in texts:
+        task_id = str(uuid.uuid4())
+        tasks[task_id] = {
+            "id": task_id,
+            "status": TaskStatus.COMPLETED,
+            "audio_path": f"temp/uploads/{task_id[:8]}.ogg",
+            "language": "ru-RU",
+            "created_at": datetime.utcnow(),
+            "completed_at": datetime.utcnow(),
+            "result": text.encode("utf-8").decode("utf-8"),
+            "error": None
+        }
+    return tasks
+
+
+def build_records(texts: List[str], output_dir: str) -> Dict[str, TaskRecord]:
+    """Новое представление: TaskRecord с вынесенными длинными транскриптами"""
+    store = TranscriptStore(output_dir)
+    tasks = {}
+    now = time.time()
+    for text in texts:
+        task_id = str(uuid.uuid4())
+        task = TaskRecord(task_id, f"temp/uploads/{task_id[:8]}.ogg", "ru-RU", now)
+        transcript = Transcript([Segment(0.0, 0.0, text.encode("utf-8").decode("utf-8"))])
+        store.save(task_id, transcript)
+        task.set_result(
+            transcript,
+            str(store.text_path(task_id)),
+            str(store.segments_path(task_id)),
+            keep_inline=len(text) <= settings.RESULT_INLINE_LIMIT
+        )
+        task.completed_at = now
+        task.status = TaskStatus.COMPLETED
+        tasks[task_id] = task
+    return tasks
+
+
+def measure_memory(builder: Callable[[], Dict]) -> Dict:
+    """Измеряет объем памяти, занятый построенными задачами"""
+    gc.collect()
+    tracemalloc.start()
+    tasks = builder()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"tasks": tasks, "bytes": current}
+
+
+def legacy_poll(tasks: Dict[str, Dict], task_id: str) -> bytes:
+    """Прежний путь ответа на опрос статуса"""
+    task = tasks[task_id]
+    response = TaskStatusResponse(
+        task_id=task["id"],
+        status=task["status"],
+        created_at=task["created_at"],
+        completed_at=task["completed_at"],
+        result=task["result"],
+        error=task["error"]
+    )
+    return response.model_dump_json().encode("utf-8")
+
+
+def measure_polls(poll: Callable[[str], bytes], task_ids: List[str], polls: int, seed: int = 7) -> float:
+    """Возвращает число опросов статуса в секунду"""
+    rng = random.Random(seed)
+    # Опросы сосредоточены на недавних задачах, как у реальных клиентов
+    hot = task_ids[-min(len(task_ids), 5000):]
+    sequence = [rng.choice(hot) for _ in range(polls)]
+    
+    started = time.perf_counter()
+    for task_id in sequence:
+        poll(task_id)
+    elapsed = time.perf_counter() - started
+    return polls / elapsed
+
+
+def main():
+    """Запуск бенчмарка"""
+    parser = argparse.ArgumentParser(description="Бенчмарк представления задач")
+    parser.add_argument("--tasks", type=int, default=100_000, help="Количество задач")
+    parser.add_argument("--polls", type=int, default=200_000, help="Количество опросов статуса")
+    args = parser.parse_args()
+    
+    texts = make_transcripts(args.tasks)
+    
+    with tempfile.TemporaryDirectory() as output_dir:
+        legacy = measure_memory(lambda: build_legacy(texts))
+        records = measure_memory(lambda: build_records(texts, output_dir))
+        
+        legacy_tasks = legacy["tasks"]
+        legacy_rate = measure_polls(
+            lambda task_id: legacy_poll(legacy_tasks, task_id),
+            list(legacy_tasks),
+            args.polls
+        )
+        
+        service = TaskService()
+        service.tasks = records["tasks"]
+        records_rate = measure_polls(service.get_status_payload, list(service.tasks), args.polls)
+        
+    scale = 100_000 / args.tasks
+    report = {
+        "tasks": args.tasks,
+        "before": {
+            "memory_per_100k_mb": round(legacy["bytes"] * scale / 2**20, 1),
+            "polls_per_sec": round(legacy_rate),
+        },
+        "after": {
+            "memory_per_100k_mb": round(records["bytes"] * scale / 2**20, 1),
+            "polls_per_sec": round(records_rate),
+        },
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
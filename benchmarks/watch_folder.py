@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Обработка папки (FolderWatcher) против мока SpeechKit
+
+Поднимает мок SpeechKit и имитирует программу записи: в папку входа с
+заданной частотой появляются N файлов, каждый пишется в два приема с
+паузой (недописанный файл не должен уйти в распознавание). Проверяется
+для inotify и для режима обхода:
+
+    files/h       — пропускная способность от первого файла до последнего транскрипта;
+    partial       — файлы, распознанные недописанными (размер в состоянии
+                    меньше итогового), должно быть 0;
+    restart_calls — запросы к SpeechKit после перезапуска без изменений (0);
+    changed_calls — после изменения одного файла распознается только он (1 файл).
+
+Код выхода 1, если ожидания не выполнены.
+
+Запуск:
+    python -m benchmarks.watch_folder --files 200 --rate 20 --concurrency 8 --latency fixed:300
+"""
+
+import argparse
+import asyncio
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+from benchmarks.corpus import ensure_file
+from benchmarks.harness import _free_port, _wait_ready
+
+
+async def _run_watcher(mock_url: str, root: Path, poll: bool, settle: float, concurrency: int, until) -> Dict:
+    """Запускает FolderWatcher, пока until() не вернет True"""
+    from app.speechkit import SpeechKitClient
+    from app.speechkit.watch import FolderWatcher
+
+    client = SpeechKitClient(
+        iam_token="benchmark", folder_id="benchmark",
+        endpoints=[f"{mock_url}/speech/v1/stt:recognize"], work_dir=str(root / "work")
+    )
+    watcher = FolderWatcher(
+        client, str(root / "input"), str(root / "output"),
+        concurrency=concurrency, settle=settle, poll=poll
+    )
+    task = asyncio.ensure_future(watcher.run())
+    try:
+        await until(watcher)
+    finally:
+        watcher.stop()
+        await task
+        client.close()
+    return watcher.stats
+
+
+async def _record(source: bytes, input_dir: Path, count: int, rate: float, pause: float) -> None:
+    """Пишет count файлов с частотой rate в секунду, каждый в два приема"""
+
+    async def write(index: int) -> None:
+        # Уникальный хвост: файлы различаются, WAV остается читаемым
+        data = source + index.to_bytes(4, "big")
+        with open(input_dir / f"call_{index:05d}.wav", "wb") as f:
+            f.write(data[:len(data) // 2])
+            f.flush()
+            await asyncio.sleep(pause)
+            f.write(data[len(data) // 2:])
+
+    writers = []
+    for index in range(count):
+        writers.append(asyncio.ensure_future(write(index)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*writers)
+
+
+async def run_mode(mock_url: str, source: bytes, args, poll: bool) -> Dict:
+    root = Path(tempfile.mkdtemp(prefix="watch_"))
+    try:
+        for name in ("input", "output", "work"):
+            (root / name).mkdir()
+        httpx.post(f"{mock_url}/_reset")
+
+        started = time.perf_counter()
+        recorder = None
+
+        async def all_done(watcher):
+            nonlocal recorder
+            recorder = asyncio.ensure_future(_record(source, root / "input", args.files, args.rate, args.settle / 2))
+            while watcher.stats["done"] + watcher.stats["failed"] < args.files:
+                await asyncio.sleep(0.1)
+            await recorder
+
+        stats = await _run_watcher(mock_url, root, poll, args.settle, args.concurrency, all_done)
+        elapsed = time.perf_counter() - started
+        calls = httpx.get(f"{mock_url}/_stats").json()["recognize_calls"]
+
+        with sqlite3.connect(str(root / "output" / ".watch_state.sqlite3")) as db:
+            sizes = dict(db.execute("SELECT name, size FROM files"))
+        partial = sum(1 for name, size in sizes.items() if size != (root / "input" / name).stat().st_size)
+
+        # Перезапуск без изменений: ничего не распознается
+        async def idle(watcher):
+            await asyncio.sleep(args.settle * 3)
+
+        await _run_watcher(mock_url, root, poll, args.settle, args.concurrency, idle)
+        restart_calls = httpx.get(f"{mock_url}/_stats").json()["recognize_calls"] - calls
+
+        # Изменился один файл: распознается только он
+        with open(root / "input" / "call_00000.wav", "ab") as f:
+            f.write(b"\0\0")
+
+        async def one(watcher):
+            while watcher.stats["done"] + watcher.stats["failed"] < 1:
+                await asyncio.sleep(0.1)
+            await asyncio.sleep(args.settle * 2)
+
+        changed = await _run_watcher(mock_url, root, poll, args.settle, args.concurrency, one)
+        return {
+            "done": stats["done"],
+            "failed": stats["failed"],
+            "files_per_h": round(args.files / elapsed * 3600),
+            "transcripts": len(list((root / "output").glob("*_transcript.txt"))),
+            "upstream_calls": calls,
+            "partial": partial,
+            "restart_calls": restart_calls,
+            "changed_files": changed["done"] + changed["failed"],
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Обработка папки против мока SpeechKit")
+    parser.add_argument("--duration", type=int, default=5, help="Длительность файла корпуса, сек")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=20.0, help="Новых файлов в секунду")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--settle", type=float, default=1.0)
+    parser.add_argument("--latency", default="fixed:300", help="Задержка мока (см. benchmarks.mock_speechkit)")
+    args = parser.parse_args()
+
+    source = ensure_file("wav", args.duration).read_bytes()
+    port = _free_port()
+    mock_url = f"http://127.0.0.1:{port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_speechkit", "--port", str(port), "--latency", args.latency],
+        stdout=subprocess.DEVNULL
+    )
+    ok = True
+    try:
+        _wait_ready(f"{mock_url}/_stats")
+        for mode, poll in (("inotify", False), ("poll", True)):
+            summary = asyncio.run(run_mode(mock_url, source, args, poll))
+            passed = (
+                summary["done"] == args.files
+                and summary["transcripts"] == args.files
+                and summary["partial"] == 0
+                and summary["restart_calls"] == 0
+                and summary["changed_files"] == 1
+            )
+            ok = ok and passed
+            print(f"{'✅' if passed else '❌'} {mode:<8} {summary}")
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
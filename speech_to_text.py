@@ -5,338 +5,102 @@ Yandex SpeechKit Speech-to-Text проект
 """
 
 import os
+import re
 import sys
-import json
-import base64
-import requests
 from pathlib import Path
-from pydub import AudioSegment
-from typing import Optional, Dict, Any
+from typing import List
 
+# Endpoint'ы синхронного распознавания: перебираются, пока один не примет запрос
+API_URLS = [
+    "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize",
+    "https://transcribe.api.cloud.yandex.net/speech/v1/stt:recognize",
+    "https://stt.api.cloud.yandex.net/stt/v1/recognize",
+    "https://speechkit.api.cloud.yandex.net/speech/v1/stt:recognize"
+]
 
-class YandexSpeechKit:
-    """Класс для работы с Yandex SpeechKit API"""
+# Код языка в последнем аргументе (ru-RU, en-US, auto)
+LANGUAGE_PATTERN = re.compile(r"^([a-z]{2}-[A-Z]{2}|auto)$")
+
+# Файлов в обработке одновременно, когда их несколько
+CONCURRENCY = 4
+
+
+def watch_folder(speechkit_options: dict, input_dir: str, output_dir: str, language: str) -> None:
+    """Распознает файлы, появляющиеся в input_dir, до Ctrl+C или SIGTERM"""
+    import asyncio
+    import signal
+    from app.speechkit import SpeechKitClient
+    from app.speechkit.watch import FolderWatcher
     
-    def __init__(self, iam_token: str, folder_id: str):
-        self.iam_token = iam_token
-        self.folder_id = folder_id
-        # Попробуем разные API endpoints
-        self.api_urls = [
-            "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize",
-            "https://transcribe.api.cloud.yandex.net/speech/v1/stt:recognize", 
-            "https://stt.api.cloud.yandex.net/stt/v1/recognize",
-            "https://speechkit.api.cloud.yandex.net/speech/v1/stt:recognize"
-        ]
-        
-    def convert_audio_to_supported_format(self, audio_path: str) -> str:
-        """Конвертирует аудио в поддерживаемый формат (WAV PCM)"""
-        audio = AudioSegment.from_file(audio_path)
-        
-        # Конвертируем в моно, 16kHz для уменьшения размера файла
-        audio = audio.set_channels(1).set_frame_rate(16000)
-        
-        # Создаем временный файл в формате WAV с 16-битным кодированием
-        output_path = "temp_audio.wav"
-        audio.export(output_path, format="wav", parameters=["-acodec", "pcm_s16le"])
-        
-        return output_path
+    def report(result, output):
+        if not result.ok:
+            print(f"❌ {result.source}: {result.error}")
+        elif output:
+            print(f"✅ {result.source} → {output} ({result.seconds:.1f} сек)")
+        else:
+            print(f"⚠️ {result.source}: речь не распознана")
     
-    def recognize_audio(self, audio_path: str, language: str = "ru-RU") -> Dict[str, Any]:
-        """Распознает речь из аудиофайла"""
-        
-        print("🔄 Конвертирую аудио в OGG Opus формат...")
-        
-        # Конвертируем в OGG Opus
-        audio = AudioSegment.from_file(audio_path)
-        audio = audio.set_channels(1).set_frame_rate(48000)
-        temp_file = "temp_audio.ogg"
-        audio.export(temp_file, format="ogg", codec="libopus")
-        
+    async def run():
+        client = SpeechKitClient(**speechkit_options)
+        watcher = FolderWatcher(
+            client,
+            input_dir,
+            output_dir,
+            language,
+            concurrency=int(os.getenv('STT_WATCH_CONCURRENCY', 8)),
+            settle=float(os.getenv('STT_WATCH_SETTLE', 2.0)),
+            poll=os.getenv('STT_WATCH_POLL', '').lower() in ('1', 'true'),
+            on_result=report
+        )
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            # Новые файлы больше не берутся, начатые дораспознаются
+            loop.add_signal_handler(signum, watcher.stop)
         try:
-            with open(temp_file, 'rb') as f:
-                audio_data = f.read()
-            
-            # Проверяем размер файла
-            if len(audio_data) > 1024 * 1024:
-                raise Exception("Файл слишком большой (>1MB). Уменьшите качество или длительность.")
-            
-            print(f"📊 Размер OGG файла: {len(audio_data)} байт")
-            
-            # Правильные заголовки для бинарных данных
-            headers = {
-                'Authorization': f'Bearer {self.iam_token}',
-                'Content-Type': 'audio/ogg',
-            }
-            
-            # Параметры в URL
-            params = {
-                'topic': 'general',
-                'folderId': self.folder_id,
-                'lang': language,
-                'format': 'oggopus'
-            }
-            
-            print("🚀 Отправляю запрос на распознавание...")
-            
-            # Отправляем бинарные данные
-            response = requests.post(
-                self.api_urls[0],
-                headers=headers,
-                params=params,
-                data=audio_data,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise Exception(f"Ошибка API: {response.status_code} - {response.text}")
-                
+            await watcher.run()
         finally:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+            client.close()
+        print(f"⏹ Остановлено: {watcher.stats}")
     
-    def _try_multipart_approach(self, audio_path: str, language: str) -> Dict[str, Any]:
-        """Подход 1: Multipart/form-data с WAV файлом"""
-        print("🔄 Конвертирую в WAV и отправляю как multipart...")
-        temp_file = self.convert_audio_to_supported_format(audio_path)
-        
-        try:
-            with open(temp_file, 'rb') as f:
-                audio_data = f.read()
-            
-            if len(audio_data) > 1024 * 1024:
-                raise Exception("Файл слишком большой (>1MB)")
-            
-            print(f"📊 Размер WAV файла: {len(audio_data)} байт")
-            
-            # Пробуем разные API endpoints
-            for i, api_url in enumerate(self.api_urls, 1):
-                print(f"🌐 Пробую endpoint {i}: {api_url}")
-                
-                headers = {'Authorization': f'Bearer {self.iam_token}'}
-                
-                config = {
-                    'specification': {
-                        'languageCode': language,
-                        'model': 'general',
-                        'profanityFilter': False,
-                        'partialResults': False,
-                        'sampleRateHertz': 16000,
-                        'audioEncoding': 'LINEAR16_PCM'
-                    }
-                }
-                
-                files = {
-                    'config': (None, json.dumps(config), 'application/json'),
-                    'audio': ('audio.wav', audio_data, 'audio/wav')
-                }
-                
-                try:
-                    response = requests.post(
-                        f"{api_url}?folderId={self.folder_id}",
-                        headers=headers,
-                        files=files,
-                        timeout=60
-                    )
-                    
-                    if response.status_code == 200:
-                        print(f"✅ Успех с endpoint {i}!")
-                        return response.json()
-                    else:
-                        print(f"❌ Endpoint {i} ошибка: {response.status_code} - {response.text[:100]}...")
-                        
-                except Exception as e:
-                    print(f"❌ Endpoint {i} исключение: {e}")
-                    continue
-            
-            raise Exception("Все multipart endpoints не сработали")
-                
-        finally:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+    print(f"👀 Слежу за {input_dir}/ → {output_dir}/ (Ctrl+C — остановка)")
+    asyncio.run(run())
+
+
+def follow_recording(speechkit_options: dict, audio_path: str, language: str) -> None:
+    """Распознает файл, который еще записывается, дописывая транскрипт по репликам"""
+    import asyncio
+    from app.speechkit import SpeechKitClient
+    from app.speechkit.tail import follow_file
     
-    def _try_ogg_approach(self, audio_path: str, language: str) -> Dict[str, Any]:
-        """Подход 2: Конвертация в OGG и отправка как OGG_OPUS"""
-        print("🔄 Конвертирую в OGG Opus...")
-        
-        # Конвертируем в OGG
-        audio = AudioSegment.from_file(audio_path)
-        audio = audio.set_channels(1).set_frame_rate(48000)
-        temp_file = "temp_audio.ogg"
-        audio.export(temp_file, format="ogg", codec="libopus")
-        
-        try:
-            with open(temp_file, 'rb') as f:
-                audio_data = f.read()
-            
-            if len(audio_data) > 1024 * 1024:
-                raise Exception("Файл слишком большой (>1MB)")
-            
-            print(f"📊 Размер OGG файла: {len(audio_data)} байт")
-            
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-            headers = {
-                'Authorization': f'Bearer {self.iam_token}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'config': {
-                    'specification': {
-                        'languageCode': language,
-                        'model': 'general',
-                        'profanityFilter': False,
-                        'partialResults': False,
-                        'sampleRateHertz': 48000,
-                        'audioEncoding': 'OGG_OPUS'
-                    }
-                },
-                'audio': {
-                    'content': audio_base64
-                }
-            }
-            
-            response = requests.post(
-                f"{self.api_urls[0]}?folderId={self.folder_id}",
-                headers=headers,
-                json=data,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise Exception(f"OGG ошибка: {response.status_code} - {response.text}")
-                
-        finally:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+    output_file = f"output/{Path(audio_path).stem}_transcript.txt"
     
-    def _try_wav_approach(self, audio_path: str, language: str) -> Dict[str, Any]:
-        """Подход 3: WAV с разными параметрами"""
-        print("🔄 Пробую WAV с 8kHz...")
-        
-        # Конвертируем в WAV с 8kHz
-        audio = AudioSegment.from_file(audio_path)
-        audio = audio.set_channels(1).set_frame_rate(8000)
-        temp_file = "temp_audio_8k.wav"
-        audio.export(temp_file, format="wav")
-        
+    async def run():
+        client = SpeechKitClient(**speechkit_options)
+        texts = 0
         try:
-            with open(temp_file, 'rb') as f:
-                audio_data = f.read()
-            
-            if len(audio_data) > 1024 * 1024:
-                raise Exception("Файл слишком большой (>1MB)")
-            
-            print(f"📊 Размер WAV 8kHz файла: {len(audio_data)} байт")
-            
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-            headers = {
-                'Authorization': f'Bearer {self.iam_token}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'config': {
-                    'specification': {
-                        'languageCode': language,
-                        'model': 'general',
-                        'profanityFilter': False,
-                        'partialResults': False,
-                        'sampleRateHertz': 8000,
-                        'audioEncoding': 'LINEAR16_PCM'
-                    }
-                },
-                'audio': {
-                    'content': audio_base64
-                }
-            }
-            
-            response = requests.post(
-                f"{self.api_urls[0]}?folderId={self.folder_id}",
-                headers=headers,
-                json=data,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise Exception(f"WAV 8kHz ошибка: {response.status_code} - {response.text}")
-                
+            with open(output_file, 'w', encoding='utf-8') as f:
+                async for transcript in follow_file(client, audio_path, language):
+                    for segment in transcript:
+                        if not segment.text:
+                            continue
+                        print(f"[{segment.start:7.1f}–{segment.end:7.1f}] {segment.text}")
+                        f.write(("\n" if texts else "") + segment.text)
+                        f.flush()
+                        texts += 1
         finally:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+            client.close()
+        return texts
     
-    def wait_for_operation(self, operation: Dict[str, Any]) -> Dict[str, Any]:
-        """Ожидает завершения асинхронной операции"""
-        import time
-        
-        operation_id = operation.get('id')
-        if not operation_id:
-            raise Exception("Не получен ID операции")
-        
-        print(f"⏳ Ожидаю завершения операции {operation_id}...")
-        
-        headers = {
-            'Authorization': f'Bearer {self.iam_token}',
-            'Content-Type': 'application/json'
-        }
-        
-        # Проверяем статус операции
-        max_attempts = 30  # Максимум 5 минут ожидания
-        for attempt in range(max_attempts):
-            try:
-                response = requests.get(
-                    f"https://operation.api.cloud.yandex.net/operations/{operation_id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    op_status = response.json()
-                    
-                    if op_status.get('done', False):
-                        if 'error' in op_status:
-                            raise Exception(f"Ошибка операции: {op_status['error']}")
-                        
-                        print("✅ Операция завершена успешно!")
-                        return op_status.get('response', {})
-                    else:
-                        print(f"⏳ Операция в процессе... ({attempt + 1}/{max_attempts})")
-                        time.sleep(10)  # Ждем 10 секунд
-                else:
-                    print(f"⚠️ Ошибка проверки статуса: {response.status_code}")
-                    time.sleep(10)
-                    
-            except Exception as e:
-                print(f"⚠️ Ошибка при проверке статуса: {e}")
-                time.sleep(10)
-        
-        raise Exception("Превышено время ожидания операции")
-    
-    def extract_text_from_response(self, response: Dict[str, Any]) -> str:
-        """Извлекает текст из ответа API"""
-        # Новый API возвращает результат напрямую в поле 'result'
-        if 'result' in response:
-            if isinstance(response['result'], str):
-                return response['result']
-            elif isinstance(response['result'], dict) and 'chunks' in response['result']:
-                # Старый формат с chunks
-                chunks = response['result']['chunks']
-                text_parts = []
-                
-                for chunk in chunks:
-                    if 'alternatives' in chunk and chunk['alternatives']:
-                        text_parts.append(chunk['alternatives'][0]['text'])
-                
-                return ' '.join(text_parts)
-        
-        return ""
+    print(f"📼 Слежу за записью {audio_path} (до конца записи, Ctrl+C — остановка)")
+    try:
+        texts = asyncio.run(run())
+    except KeyboardInterrupt:
+        print(f"⏹ Остановлено, транскрипт: {output_file}")
+        return
+    if texts:
+        print(f"✅ Запись закончилась, результат сохранен в: {output_file}")
+    else:
+        print("⚠️ Текст не был распознан или файл не содержит речи")
 
 
 def load_env_file():
@@ -351,6 +115,14 @@ def load_env_file():
                     os.environ[key.strip()] = value.strip()
 
 
+def save_transcript(audio_path: str, text: str) -> str:
+    """Сохраняет текст в output/{имя}_transcript.txt и возвращает путь"""
+    output_file = f"output/{Path(audio_path).stem}_transcript.txt"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return output_file
+
+
 def main():
     """Основная функция"""
     print("🎤 Yandex SpeechKit - Распознавание речи из аудио")
@@ -361,17 +133,33 @@ def main():
     
     # Получаем параметры
     if len(sys.argv) < 2:
-        print("Использование: python speech_to_text.py <путь_к_аудиофайлу> [язык]")
+        print("Использование: python speech_to_text.py <путь_к_аудиофайлу> [...] [язык]")
+        print("       python speech_to_text.py --watch [папка_входа] [папка_выхода] [язык]")
+        print("       python speech_to_text.py --follow <записываемый_файл> [язык]")
         print("Пример: python speech_to_text.py audio.ogg ru-RU")
         sys.exit(1)
     
-    audio_path = sys.argv[1]
-    language = sys.argv[2] if len(sys.argv) > 2 else "ru-RU"
+    args = sys.argv[1:]
+    watch = args[0] == "--watch"
+    follow = args[0] == "--follow"
+    if watch or follow:
+        args.pop(0)
+    language = args.pop() if (watch or len(args) > 1) and args and LANGUAGE_PATTERN.match(args[-1]) else "ru-RU"
+    audio_paths: List[str] = [] if watch else args
+    if follow and len(audio_paths) != 1:
+        print("❌ Для --follow укажите один файл записи")
+        sys.exit(1)
+    input_dir = args[0] if watch and args else "input"
+    output_dir = args[1] if watch and len(args) > 1 else "output"
     
-    # Проверяем существование файла
-    if not os.path.exists(audio_path):
-        print(f"❌ Файл {audio_path} не найден!")
+    # Проверяем существование файлов
+    if watch and not os.path.isdir(input_dir):
+        print(f"❌ Папка {input_dir} не найдена!")
         sys.exit(1)
+    for audio_path in audio_paths:
+        if not os.path.exists(audio_path):
+            print(f"❌ Файл {audio_path} не найден!")
+            sys.exit(1)
     
     # Получаем токен и folder_id
     iam_token = os.getenv('YANDEX_CLOUD_IAM_TOKEN')
@@ -385,42 +173,67 @@ def main():
         print("❌ Не найден Folder ID! Установите YANDEX_FOLDER_ID в .env файле")
         sys.exit(1)
     
-    try:
-        # Создаем экземпляр SpeechKit
-        speechkit = YandexSpeechKit(iam_token, folder_id)
-        
-        print(f"📁 Обрабатываю файл: {audio_path}")
-        print(f"🌍 Язык: {language}")
-        
-        # Распознаем речь
-        response = speechkit.recognize_audio(audio_path, language)
-        
-        # Извлекаем текст
-        recognized_text = speechkit.extract_text_from_response(response)
-        
-        if recognized_text:
-            # Создаем имя выходного файла
-            audio_name = Path(audio_path).stem
-            output_file = f"output/{audio_name}_transcript.txt"
-            
-            # Сохраняем результат
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(recognized_text)
-            
-            print(f"✅ Распознавание завершено!")
-            print(f"📝 Результат сохранен в: {output_file}")
-            print(f"📄 Распознанный текст:")
-            print("-" * 30)
-            print(recognized_text)
-            print("-" * 30)
-            
-        else:
-            print("⚠️ Текст не был распознан или файл не содержит речи")
-            
-    except Exception as e:
-        print(f"❌ Ошибка: {e}")
+    from app.speechkit import ENCODINGS, CapabilityCache, SyncSpeechKitClient
+    
+    # Удачная пара endpoint/кодировка запоминается между запусками
+    capabilities = CapabilityCache(
+        Path(os.getenv('STT_CAPABILITY_CACHE', Path.home() / '.cache' / 'yandex-speechkit' / 'capabilities.json')),
+        float(os.getenv('STT_CAPABILITY_TTL', 24 * 3600))
+    )
+    
+    speechkit_options = dict(
+        iam_token=iam_token,
+        folder_id=folder_id,
+        endpoints=API_URLS,
+        encodings=list(ENCODINGS),
+        capabilities=capabilities
+    )
+    
+    print(f"🌍 Язык: {language}")
+    if watch:
+        watch_folder(speechkit_options, input_dir, output_dir, language)
+        return
+    if follow:
+        follow_recording(speechkit_options, audio_paths[0], language)
+        return
+    
+    failed = 0
+    with SyncSpeechKitClient(**speechkit_options) as speechkit:
+        if len(audio_paths) == 1:
+            audio_path = audio_paths[0]
+            print(f"📁 Обрабатываю файл: {audio_path}")
+            try:
+                recognized_text = speechkit.recognize(audio_path, language).text
+            except Exception as e:
+                print(f"❌ Ошибка: {e}")
+                sys.exit(1)
+            
+            if recognized_text:
+                output_file = save_transcript(audio_path, recognized_text)
+                print("✅ Распознавание завершено!")
+                print(f"📝 Результат сохранен в: {output_file}")
+                print("📄 Распознанный текст:")
+                print("-" * 30)
+                print(recognized_text)
+                print("-" * 30)
+            else:
+                print("⚠️ Текст не был распознан или файл не содержит речи")
+            return
+        
+        # Несколько файлов: результаты по мере готовности
+        print(f"📁 Обрабатываю файлов: {len(audio_paths)}")
+        for result in speechkit.recognize_many(audio_paths, language, concurrency=CONCURRENCY):
+            if not result.ok:
+                failed += 1
+                print(f"❌ {result.source}: {result.error}")
+            elif result.transcript.text:
+                print(f"✅ {result.source} → {save_transcript(result.source, result.transcript.text)} ({result.seconds:.1f} сек)")
+            else:
+                print(f"⚠️ {result.source}: речь не распознана")
+    
+    if failed:
         sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()